@@ -0,0 +1,387 @@
+# coding=utf-8
+
+"""
+Microbenchmarks of the hot paths of gspider.
+
+    python benchmarks/microbench.py run -o result.json
+    python benchmarks/microbench.py compare base.json result.json --threshold 0.1
+"""
+
+import sys
+import json
+import time
+import platform
+import argparse
+from os.path import join, dirname, abspath
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+import gspider
+from gspider.http import HttpRequest, HttpResponse
+from gspider.queue import FifoQueue, PriorityQueue
+from gspider.dupefilter import HashDupeFilter
+from gspider.extension import ExtensionManager, Extension
+from gspider.extensions import RetryMiddleware, DepthMiddleware
+from gspider.utils import request_fingerprint, get_encoding_from_content
+
+FIXTURES_DIR = join(dirname(abspath(__file__)), 'fixtures')
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def decorator(setup):
+        BENCHMARKS[name] = setup
+        return setup
+
+    return decorator
+
+
+def _read_fixture(name, mode='r'):
+    with open(join(FIXTURES_DIR, name), mode) as f:
+        return f.read()
+
+
+def _load_requests():
+    urls = _read_fixture('urls.txt').split()
+    return [HttpRequest(u, priority=i % 5) for i, u in enumerate(urls)]
+
+
+# Each benchmark returns a function to be timed, which runs a fixed batch of operations,
+# together with the number of operations in the batch.
+
+@benchmark('queue.fifo.push_pop')
+def bench_fifo_queue():
+    requests = _load_requests()
+    q = FifoQueue()
+
+    def run():
+        for r in requests:
+            q.push(r)
+        for _ in requests:
+            q.pop()
+
+    return run, len(requests)
+
+
+@benchmark('queue.priority.push_pop')
+def bench_priority_queue():
+    requests = _load_requests()
+    q = PriorityQueue()
+
+    def run():
+        for r in requests:
+            q.push(r)
+        for _ in requests:
+            q.pop()
+
+    return run, len(requests)
+
+
+@benchmark('dupefilter.hash.is_duplicated')
+def bench_hash_dupe_filter():
+    requests = _load_requests()
+    requests = requests + requests
+    f = HashDupeFilter()
+
+    def run():
+        f.clear()
+        for r in requests:
+            f.is_duplicated(r)
+
+    return run, len(requests)
+
+
+@benchmark('utils.request_fingerprint')
+def bench_request_fingerprint():
+    requests = _load_requests()
+
+    def run():
+        for r in requests:
+            request_fingerprint(r)
+
+    return run, len(requests)
+
+
+@benchmark('utils.get_encoding_from_content')
+def bench_get_encoding_from_content():
+    content = _read_fixture('news.html', 'rb')
+
+    def run():
+        get_encoding_from_content(content)
+
+    return run, 1
+
+
+@benchmark('http.request.replace')
+def bench_request_replace():
+    requests = _load_requests()
+    for r in requests:
+        r.meta.update(depth=1, referer=r.url, tags=['news', 'fixture'])
+
+    def run():
+        for r in requests:
+            r.replace(dont_filter=True)
+
+    return run, len(requests)
+
+
+@benchmark('http.request.replace_meta')
+def bench_request_replace_meta():
+    requests = _load_requests()
+    for r in requests:
+        r.meta.update(depth=1, referer=r.url, tags=['news', 'fixture'])
+
+    def run():
+        # the extensions read the meta of the derived requests
+        for r in requests:
+            r.replace(dont_filter=True).meta.get('depth')
+
+    return run, len(requests)
+
+
+@benchmark('codec.encode_decode')
+def bench_codec():
+    from gspider.codec import RequestCodec
+
+    requests = _load_requests()
+    for r in requests:
+        r.meta.update(depth=1, referer=r.url, tags=['news', 'fixture'])
+    codec = RequestCodec()
+
+    def run():
+        for r in requests:
+            codec.decode(codec.encode(r))
+
+    return run, len(requests)
+
+
+@benchmark('canonicalize.url')
+def bench_canonicalize_url():
+    from gspider.canonicalize import UrlCanonicalizer
+
+    urls = _read_fixture('urls.txt').split()
+    c = UrlCanonicalizer(host_rules={'*.example.org': {'trailing_slash': 'remove'}})
+
+    def run():
+        for u in urls:
+            c.canonicalize(u)
+
+    return run, len(urls)
+
+
+@benchmark('simhash.html')
+def bench_simhash():
+    from gspider.simhash import simhash, shingles, html_to_text
+
+    text = _read_fixture('news.html')
+
+    def run():
+        simhash(shingles(html_to_text(text)))
+
+    return run, 1
+
+
+@benchmark('selector.css')
+def bench_selector_css():
+    from gspider.selector import Selector
+
+    text = _read_fixture('news.html')
+
+    def run():
+        Selector(text).css('ul.hotnews a').attr('href')
+
+    return run, 1
+
+
+@benchmark('selector.xpath')
+def bench_selector_xpath():
+    from gspider.selector import Selector
+
+    text = _read_fixture('news.html')
+
+    def run():
+        Selector(text).xpath('//ul[@class="hotnews"]//a/@href')
+
+    return run, 1
+
+
+@benchmark('linkextractor.extract_links')
+def bench_link_extractor():
+    from gspider.linkextractor import LinkExtractor
+
+    text = _read_fixture('news.html')
+    extractor = LinkExtractor()
+
+    def run():
+        extractor.extract_links_from_text(text, 'http://news.example.com/')
+
+    return run, 1
+
+
+@benchmark('selector.extract_links')
+def bench_selector_extract_links():
+    from urllib.parse import urljoin
+    from gspider.selector import Selector
+
+    text = _read_fixture('news.html')
+
+    def run():
+        for a in Selector(text).css('a'):
+            href = a.attr('href')
+            if href:
+                urljoin('http://news.example.com/', href)
+
+    return run, 1
+
+
+@benchmark('extension.dispatch')
+def bench_extension_dispatch():
+    class NoopExtension(Extension):
+        pass
+
+    manager = ExtensionManager(*([NoopExtension() for _ in range(5)] + [RetryMiddleware(), DepthMiddleware()]))
+    requests = _load_requests()
+    response = HttpResponse(request=requests[0])
+
+    class _Response:
+        status_code = 200
+
+    response.response = _Response()
+
+    def run():
+        for r in requests:
+            manager.handle_request(r)
+            manager.handle_response(r, response)
+        list(manager.handle_spider_output(response, requests))
+
+    return run, len(requests)
+
+
+def _time_benchmark(run, min_time, repeat):
+    # calibrate the number of loops so that each repetition takes at least min_time
+    loops = 1
+    while True:
+        t = time.perf_counter()
+        for _ in range(loops):
+            run()
+        elapsed = time.perf_counter() - t
+        if elapsed >= min_time:
+            break
+        loops *= 2 if elapsed <= 0 else max(2, int(min_time / elapsed * 1.2))
+    timings = [elapsed / loops]
+    for _ in range(repeat - 1):
+        t = time.perf_counter()
+        for _ in range(loops):
+            run()
+        timings.append((time.perf_counter() - t) / loops)
+    return timings
+
+
+def run_benchmarks(names=None, min_time=0.2, repeat=5):
+    results = {}
+    for name in sorted(BENCHMARKS):
+        if names and not any(n in name for n in names):
+            continue
+        try:
+            run, ops = BENCHMARKS[name]()
+        except ImportError as e:
+            print('{:<36} skipped: {}'.format(name, e), file=sys.stderr)
+            continue
+        timings = sorted(t / ops for t in _time_benchmark(run, min_time, repeat))
+        results[name] = {
+            'min': timings[0],
+            'median': timings[len(timings) // 2],
+            'max': timings[-1],
+            'repeat': repeat,
+        }
+        print('{:<36} {:>12.3f} us/op'.format(name, results[name]['median'] * 1e6), file=sys.stderr)
+    return {
+        'meta': {
+            'gspider': gspider.__version__,
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        },
+        'results': results,
+    }
+
+
+def compare_results(base, current, threshold=0.1):
+    """
+    Compare the median timings of two runs, return the rows of the report and the names of slowdowns.
+    """
+    rows = []
+    slowdowns = []
+    for name in sorted(set(base['results']) | set(current['results'])):
+        b = base['results'].get(name)
+        c = current['results'].get(name)
+        if b is None or c is None:
+            rows.append((name, b and b['median'], c and c['median'], None, 'missing'))
+            continue
+        change = c['median'] / b['median'] - 1
+        if change > threshold:
+            status = 'SLOWER'
+            slowdowns.append(name)
+        elif change < -threshold:
+            status = 'faster'
+        else:
+            status = ''
+        rows.append((name, b['median'], c['median'], change, status))
+    return rows, slowdowns
+
+
+def _format_time(t):
+    return '-' if t is None else '{:.3f}'.format(t * 1e6)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Microbenchmarks of gspider')
+    subparsers = parser.add_subparsers(dest='command')
+    run_parser = subparsers.add_parser('run', help='run benchmarks')
+    run_parser.add_argument('-o', '--output', dest='output', metavar='FILE', help='write JSON results to FILE')
+    run_parser.add_argument('-k', dest='names', action='append', metavar='NAME',
+                            help='only run benchmarks whose name contains NAME (can be repeated)')
+    run_parser.add_argument('--min-time', dest='min_time', type=float, default=0.2, metavar='SECONDS',
+                            help='minimal time of each repetition (default: 0.2)')
+    run_parser.add_argument('--repeat', dest='repeat', type=int, default=5, metavar='NUM',
+                            help='number of repetitions (default: 5)')
+    compare_parser = subparsers.add_parser('compare', help='compare two runs')
+    compare_parser.add_argument('base', metavar='BASE', help='JSON results of the base run')
+    compare_parser.add_argument('current', metavar='CURRENT', help='JSON results of the current run')
+    compare_parser.add_argument('--threshold', dest='threshold', type=float, default=0.1, metavar='RATIO',
+                                help='report a slowdown if the median is slower than RATIO (default: 0.1)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        result = run_benchmarks(names=args.names, min_time=args.min_time, repeat=args.repeat)
+        data = json.dumps(result, indent=2, sort_keys=True)
+        if args.output:
+            with open(args.output, 'w') as f:
+                f.write(data)
+        else:
+            print(data)
+    elif args.command == 'compare':
+        with open(args.base) as f:
+            base = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        rows, slowdowns = compare_results(base, current, threshold=args.threshold)
+        print('{:<36} {:>12} {:>12} {:>8}'.format('benchmark', 'base us/op', 'current', 'change'))
+        for name, b, c, change, status in rows:
+            print('{:<36} {:>12} {:>12} {:>8} {}'.format(name, _format_time(b), _format_time(c),
+                                                        '-' if change is None else '{:+.1%}'.format(change),
+                                                        status))
+        if slowdowns:
+            print('\n{} benchmark(s) slower than {:.0%}: {}'.format(len(slowdowns), args.threshold,
+                                                                   ', '.join(slowdowns)))
+            return 1
+    else:
+        parser.print_help()
+        return 2
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
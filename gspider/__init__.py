@@ -1,20 +1,49 @@
 # coding=utf-8
 
-from . import _patch
-from .http import HttpRequest, HttpResponse
-from .fetcher import Fetcher
-from .spider import Spider
-from .selector import Selector
-from .run import run_spider, make_requests
-from .errors import StopCrawler
+import sys
+from types import ModuleType
+from importlib import import_module
 
 __all__ = ['HttpRequest', 'HttpResponse',
            'Fetcher',
-           'Spider',
+           'Spider', 'SitemapSpider',
            'Selector',
-           'run_spider', 'make_requests',
+           'LinkExtractor',
+           'run_spider', 'run_spiders', 'make_requests', 'iter_requests',
+           'Client',
            'StopCrawler']
 
 __version__ = '0.1.1'
 
-del _patch
+# the objects are imported on first use, so that importing a light module like gspider.http
+# does not import requests and lxml
+_lazy_objects = {
+    'HttpRequest': 'gspider.http',
+    'HttpResponse': 'gspider.http',
+    'Fetcher': 'gspider.fetcher',
+    'Spider': 'gspider.spider',
+    'SitemapSpider': 'gspider.sitemap',
+    'Selector': 'gspider.selector',
+    'LinkExtractor': 'gspider.linkextractor',
+    'run_spider': 'gspider.run',
+    'run_spiders': 'gspider.run',
+    'make_requests': 'gspider.run',
+    'iter_requests': 'gspider.run',
+    'Client': 'gspider.client',
+    'StopCrawler': 'gspider.errors',
+}
+
+
+class _LazyModule(ModuleType):
+    def __getattr__(self, name):
+        if name in _lazy_objects:
+            value = getattr(import_module(_lazy_objects[name]), name)
+            setattr(self, name, value)
+            return value
+        raise AttributeError("module '{}' has no attribute '{}'".format(self.__name__, name))
+
+    def __dir__(self):
+        return sorted(set(super().__dir__()) | set(_lazy_objects))
+
+
+sys.modules[__name__].__class__ = _LazyModule
@@ -1,5 +1,8 @@
 # coding=utf-8
 
+# imported by the modules relying on gevent, e.g. the crawler and the fetcher, before importing requests and other
+# I/O libraries, thus the standard library is patched once a crawler is used rather than when importing gspider
+
 from gevent import monkey
 
 monkey.patch_all()
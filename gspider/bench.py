@@ -0,0 +1,193 @@
+# coding=utf-8
+
+import os
+import re
+import time
+import signal
+import socket
+import logging
+import resource
+from urllib.parse import urljoin
+
+from . import _patch
+
+import gevent
+from gevent.pywsgi import WSGIServer
+
+from .http import HttpRequest
+from .spider import Spider
+from .extension import Extension
+from .run import run_spider
+
+log = logging.getLogger(__name__)
+
+
+class BenchServer:
+    """
+    A local HTTP server generating a synthetic link graph, page ``n`` links to the pages
+    ``n * links + 1`` to ``n * links + links`` so that every page is reachable from page ``0``.
+    """
+
+    def __init__(self, pages=1000, links=10, latency=0, page_size=10240, host='127.0.0.1', port=0):
+        self.pages = pages
+        self.links = links
+        self.latency = latency
+        self.page_size = page_size
+        self.host = host
+        self.port = port
+        self._pid = None
+
+    @property
+    def url(self):
+        return 'http://{}:{}/page/0'.format(self.host, self.port)
+
+    def start(self):
+        """
+        Serve in a forked process, so that the crawler's CPU and memory usage are not affected.
+        """
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind((self.host, self.port))
+        listener.listen(1024)
+        self.port = listener.getsockname()[1]
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _NoDelayWSGIServer(listener, self.application, log=None, error_log=None).serve_forever()
+            finally:
+                os._exit(0)
+        listener.close()
+        self._pid = pid
+
+    def stop(self):
+        if self._pid is not None:
+            os.kill(self._pid, signal.SIGTERM)
+            os.waitpid(self._pid, 0)
+            self._pid = None
+
+    def application(self, environ, start_response):
+        try:
+            n = int(environ['PATH_INFO'].rsplit('/', 1)[-1])
+        except ValueError:
+            n = -1
+        if n < 0 or n >= self.pages:
+            start_response('404 Not Found', [('Content-Type', 'text/plain')])
+            return [b'Not Found']
+        if self.latency > 0:
+            gevent.sleep(self.latency)
+        body = self.make_page(n)
+        start_response('200 OK', [('Content-Type', 'text/html; charset=utf-8'),
+                                  ('Content-Length', str(len(body)))])
+        return [body]
+
+    def make_page(self, n):
+        links = []
+        for i in range(self.links):
+            k = n * self.links + i + 1
+            if k < self.pages:
+                links.append('<a href="/page/{}">page {}</a>'.format(k, k))
+        head = '<html><head><title>page {}</title></head><body>{}'.format(n, ''.join(links))
+        tail = '</body></html>'
+        padding = max(0, self.page_size - len(head) - len(tail) - 7)
+        return (head + '<p>' + 'x' * padding + '</p>' + tail).encode('utf-8')
+
+
+class _NoDelayWSGIServer(WSGIServer):
+    def handle(self, sock, address):
+        # avoid the delay of Nagle's algorithm when headers and body are written separately
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        super().handle(sock, address)
+
+
+class BenchSpider(Spider):
+    link_pattern = re.compile(r'<a href="([^"]+)"')
+
+    def start_requests(self):
+        yield HttpRequest(self.config.get('bench_url'))
+
+    def parse(self, response):
+        for href in self.link_pattern.findall(response.text):
+            yield HttpRequest(urljoin(response.url, href))
+
+
+class BenchStats(Extension):
+    def __init__(self, stats):
+        self.stats = stats
+        self.stats.setdefault('latencies', [])
+        self.stats.setdefault('errors', 0)
+        self._start_time = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.config.get('bench_stats'))
+
+    def open(self):
+        self.stats['start_time'] = time.time()
+
+    def close(self):
+        self.stats['end_time'] = time.time()
+
+    def handle_request(self, request):
+        self._start_time[request] = time.time()
+
+    def handle_response(self, request, response):
+        t = self._start_time.pop(request, None)
+        if t is not None:
+            self.stats['latencies'].append(time.time() - t)
+
+    def handle_error(self, request, error):
+        self._start_time.pop(request, None)
+        self.stats['errors'] += 1
+
+
+def _percentile(values, p):
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def run_bench(pages=1000, links=10, latency=0, page_size=10240, **kwargs):
+    """
+    Run the reference spider against a local bench server and return the report.
+    """
+    server = BenchServer(pages=pages, links=links, latency=latency, page_size=page_size)
+    server.start()
+    stats = {}
+    kwargs.setdefault('log_level', 'WARNING')
+    extensions = list(kwargs.pop('extensions', None) or [])
+    extensions.append(BenchStats)
+    usage_start = resource.getrusage(resource.RUSAGE_SELF)
+    try:
+        run_spider(BenchSpider, bench_url=server.url, bench_stats=stats, extensions=extensions, **kwargs)
+    finally:
+        server.stop()
+    usage_end = resource.getrusage(resource.RUSAGE_SELF)
+    latencies = sorted(stats['latencies'])
+    elapsed = stats['end_time'] - stats['start_time']
+    cpu_time = (usage_end.ru_utime - usage_start.ru_utime) + (usage_end.ru_stime - usage_start.ru_stime)
+    return {
+        'pages': pages,
+        'responses': len(latencies),
+        'errors': stats['errors'],
+        'elapsed': elapsed,
+        'requests_per_second': len(latencies) / elapsed if elapsed > 0 else 0,
+        'latency_p50': _percentile(latencies, 0.5),
+        'latency_p99': _percentile(latencies, 0.99),
+        'cpu_time': cpu_time,
+        'cpu_percent': 100 * cpu_time / elapsed if elapsed > 0 else 0,
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss': usage_end.ru_maxrss * 1024,
+    }
+
+
+def format_report(report):
+    lines = [
+        'Responses:      {} / {} pages ({} errors)'.format(report['responses'], report['pages'], report['errors']),
+        'Elapsed:        {:.2f} s'.format(report['elapsed']),
+        'Throughput:     {:.1f} requests/s'.format(report['requests_per_second']),
+        'Latency p50:    {:.1f} ms'.format(report['latency_p50'] * 1000),
+        'Latency p99:    {:.1f} ms'.format(report['latency_p99'] * 1000),
+        'CPU time:       {:.2f} s ({:.1f}%)'.format(report['cpu_time'], report['cpu_percent']),
+        'Peak RSS:       {:.1f} MB'.format(report['peak_rss'] / 1024 / 1024),
+    ]
+    return '\n'.join(lines)
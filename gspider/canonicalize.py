@@ -0,0 +1,212 @@
+# coding=utf-8
+
+import re
+from fnmatch import fnmatch, translate
+from urllib.parse import urlsplit, urlunsplit, quote, unquote_plus
+
+# the tracking parameters which never change the content of pages
+DEFAULT_STRIP_PARAMS = ['utm_*', 'fbclid', 'gclid', 'dclid', 'msclkid', 'yclid', 'mc_cid', 'mc_eid', '_ga', '_hsenc',
+                        '_hsmi', 'mkt_tok']
+
+_PERCENT_RE = re.compile(r'%([0-9a-fA-F]{2})')
+_UNRESERVED = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~')
+_PATH_SAFE = "/:@!$&'()*+,;=-._~%"
+_QUERY_SAFE = "/?:@!$'()*+,;=-._~%"
+
+
+def _normalize_percent(m):
+    c = chr(int(m.group(1), 16))
+    if c in _UNRESERVED:
+        return c
+    return '%' + m.group(1).upper()
+
+
+def normalize_path(path):
+    """
+    Decode the percent-encoded unreserved characters, uppercase the other escapes, quote the unsafe characters
+    and remove the dot segments.
+    """
+    if not path:
+        return '/'
+    if '%' in path:
+        path = _PERCENT_RE.sub(_normalize_percent, path)
+    path = quote(path, safe=_PATH_SAFE)
+    if '.' in path:
+        segments = []
+        for s in path.split('/'):
+            if s == '..':
+                if len(segments) > 1:
+                    segments.pop()
+            elif s != '.':
+                segments.append(s)
+        if path.endswith(('/.', '/..')):
+            segments.append('')
+        path = '/'.join(segments)
+        if not path.startswith('/'):
+            path = '/' + path
+    return path
+
+
+def normalize_host(host):
+    """
+    Lowercase the host and convert the internationalized domain name to ASCII.
+    """
+    host = host.lower()
+    try:
+        host.encode('ascii')
+    except UnicodeEncodeError:
+        try:
+            host = host.encode('idna').decode('ascii')
+        except UnicodeError:
+            pass
+    return host.rstrip('.')
+
+
+def normalize_netloc(res, host=None):
+    """
+    Normalize the host, remove the default port and keep the user info of the result of ``urlsplit``.
+    ``host`` is the normalized host if it is known.
+    """
+    if host is None:
+        host = normalize_host(res.hostname or '')
+    scheme = res.scheme.lower()
+    netloc = '[{}]'.format(host) if ':' in host else host
+    port = res.port
+    if port is not None and not (scheme == 'http' and port == 80 or scheme == 'https' and port == 443):
+        netloc = '{}:{}'.format(netloc, port)
+    if res.username is not None:
+        userinfo = res.username if res.password is None else '{}:{}'.format(res.username, res.password)
+        netloc = '{}@{}'.format(userinfo, netloc)
+    return netloc
+
+
+def normalize_query(query, keep_param=None):
+    """
+    Normalize the percent-encoding of the query and sort the parameters by their names.
+
+    The sort is stable, thus the values of the same parameter stay in order, and the parameters without values,
+    e.g. ``?x``, are kept as they are. ``keep_param`` tells whether to keep the parameter of the given name.
+    """
+    queries = []
+    for q in query.split('&'):
+        if not q:
+            continue
+        name = q.split('=', 1)[0]
+        if '%' in name or '+' in name:
+            name = unquote_plus(name)
+        if keep_param is None or keep_param(name):
+            if '%' in q:
+                q = _PERCENT_RE.sub(_normalize_percent, q)
+            queries.append((name, quote(q, safe=_QUERY_SAFE)))
+    queries.sort(key=lambda x: x[0])
+    return '&'.join(q for _, q in queries)
+
+
+class _HostRules:
+    __slots__ = ('strip_params', 'keep_params', 'keep_fragment', 'lowercase_path', 'trailing_slash')
+
+    def __init__(self, strip_params, keep_params, keep_fragment, lowercase_path, trailing_slash):
+        self.strip_params = self._compile(strip_params)
+        self.keep_params = self._compile(keep_params) if keep_params is not None else None
+        self.keep_fragment = keep_fragment
+        self.lowercase_path = lowercase_path
+        self.trailing_slash = trailing_slash
+
+    @staticmethod
+    def _compile(patterns):
+        if not patterns:
+            return None
+        return re.compile('|'.join(translate(p) for p in patterns))
+
+    def keep_param(self, name):
+        if self.keep_params is not None and not self.keep_params.match(name):
+            return False
+        return self.strip_params is None or not self.strip_params.match(name)
+
+
+class UrlCanonicalizer:
+    """
+    Canonicalize the URLs of requests before they are checked by the dupe filter.
+
+    The scheme and host are lowercased, IDNs are converted to ASCII, default ports and fragments are removed,
+    percent-encoding and dot segments of paths are normalized, the query parameters matching ``strip_params``
+    are removed and the rest are sorted by their names. The canonical URLs are the ones fetched, thus they stay
+    equivalent to the original ones, e.g. the values of the same parameter are kept in order.
+
+    ``host_rules`` maps the patterns of hosts, e.g. ``*.example.com``, to the rules of them, including
+    ``strip_params`` which are removed in addition, ``keep_params`` which are the only parameters kept,
+    ``keep_fragment``, ``lowercase_path``, and ``trailing_slash`` which can be ``add`` or ``remove``, the slash
+    is not added to the paths ending with file names, e.g. ``/index.html``.
+    The first matched pattern is applied, and the matched rules are cached for each host.
+    """
+
+    TRAILING_SLASH_CHOICES = (None, 'add', 'remove')
+
+    def __init__(self, strip_params=None, host_rules=None, max_cached_hosts=10000):
+        self.strip_params = list(DEFAULT_STRIP_PARAMS if strip_params is None else strip_params)
+        self.host_rules = {k.lower(): v for k, v in (host_rules or {}).items()}
+        for pattern, rules in self.host_rules.items():
+            assert rules.get('trailing_slash') in self.TRAILING_SLASH_CHOICES, \
+                'trailing slash of {} should be one of {}'.format(pattern, self.TRAILING_SLASH_CHOICES)
+        self.max_cached_hosts = max_cached_hosts
+        self._default_rules = self._compile_rules({})
+        self._compiled_rules = [(k, self._compile_rules(v)) for k, v in self.host_rules.items()]
+        self._cache = {}
+
+    def __repr__(self):
+        cls_name = self.__class__.__name__
+        return '{}(strip_params={}, host_rules={})'.format(cls_name, repr(self.strip_params),
+                                                           repr(list(self.host_rules)))
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        config = crawler.config
+        kwargs = {}
+        strip_params = config.getlist('canonicalize_strip_params')
+        if strip_params is not None:
+            kwargs['strip_params'] = strip_params
+        host_rules = config.get('canonicalize_host_rules')
+        if host_rules is not None:
+            kwargs['host_rules'] = host_rules
+        return cls(**kwargs)
+
+    def canonicalize(self, url):
+        res = urlsplit(url)
+        scheme = res.scheme.lower()
+        host = normalize_host(res.hostname or '')
+        rules = self._get_rules(host)
+        netloc = normalize_netloc(res, host)
+        path = normalize_path(res.path)
+        if rules.lowercase_path:
+            path = path.lower()
+        if rules.trailing_slash == 'remove':
+            if len(path) > 1 and path.endswith('/'):
+                path = path.rstrip('/') or '/'
+        elif rules.trailing_slash == 'add':
+            if not path.endswith('/') and '.' not in path.rsplit('/', 1)[-1]:
+                path += '/'
+        query = res.query
+        if query:
+            query = normalize_query(query, rules.keep_param)
+        fragment = res.fragment if rules.keep_fragment else ''
+        return urlunsplit((scheme, netloc, path, query, fragment))
+
+    def _get_rules(self, host):
+        rules = self._cache.get(host)
+        if rules is None:
+            rules = self._default_rules
+            for pattern, r in self._compiled_rules:
+                if fnmatch(host, pattern):
+                    rules = r
+                    break
+            if len(self._cache) >= self.max_cached_hosts:
+                self._cache.clear()
+            self._cache[host] = rules
+        return rules
+
+    def _compile_rules(self, rules):
+        return _HostRules(self.strip_params + list(rules.get('strip_params') or []),
+                          rules.get('keep_params'),
+                          rules.get('keep_fragment', False),
+                          rules.get('lowercase_path', False),
+                          rules.get('trailing_slash'))
@@ -0,0 +1,144 @@
+# coding=utf-8
+
+import logging
+
+from . import _patch
+
+import gevent
+from gevent.queue import Queue
+from gevent.lock import Semaphore
+
+from . import events
+from .http import HttpRequest
+from .errors import StopCrawler
+from .crawler import CrawlerRunner, Crawler
+from .spider import ClientSpider
+from .run import _make_config, _configure_logger
+
+log = logging.getLogger(__name__)
+
+
+class Client:
+    """
+    A long-lived crawler for making requests in batches.
+
+    The crawler, including the HTTP sessions of the fetcher and the extensions, is kept between batches.
+    If the crawler stops, the requests of the pending batches which are not completed get ``StopCrawler``
+    as their results, and the rest of the requests are not made.
+    """
+
+    def __init__(self, **kwargs):
+        if 'log_level' not in kwargs:
+            kwargs['log_level'] = 'WARNING'
+        config = _make_config(None, kwargs)
+        self._request_feed = Queue()
+        config['spider'] = ClientSpider
+        config['request_feed'] = self._request_feed
+        config['result_callback'] = self._set_result
+        _configure_logger(config)
+        self.config = config
+        # the queues of the pending batches keyed by the batch ID in meta, so that the meta keeps plain values
+        self._batches = {}
+        self._next_batch_id = 0
+        crawler = Crawler(config)
+        crawler.event_bus.subscribe(self._handle_request_ignored, events.request_ignored)
+        crawler.event_bus.subscribe(self._handle_crawler_shutdown, events.crawler_shutdown)
+        self.crawler_runner = CrawlerRunner(crawler)
+        self._runner = gevent.spawn(self.crawler_runner.run)
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def make_requests(self, requests):
+        requests = [r for r in requests]
+        results = [None] * len(requests)
+        for index, result in self.iter_requests(requests):
+            results[index] = result
+        return results
+
+    def iter_requests(self, requests, max_pending=None):
+        if self._closed:
+            raise RuntimeError('Client is closed')
+        if self._runner.ready():
+            raise RuntimeError('Crawler is stopped')
+        if max_pending is None:
+            max_pending = 2 * self.config.getint('max_workers')
+        assert max_pending > 0, 'max pending should > 0'
+        batch_id = self._next_batch_id
+        self._next_batch_id += 1
+        batch = self._batches[batch_id] = Queue()
+        semaphore = Semaphore(max_pending)
+        pending = set()
+        feeder = gevent.spawn(self._feed_requests, requests, batch_id, pending, semaphore)
+        total = None
+        received = 0
+        try:
+            while total is None or received < total:
+                index, result = batch.get()
+                if index is None:
+                    if result is StopCrawler:
+                        for i in sorted(pending):
+                            yield i, StopCrawler('Crawler is stopped')
+                        break
+                    total = result
+                    continue
+                # a request may be reported by both the error callback and the ignored event
+                if index not in pending:
+                    continue
+                pending.discard(index)
+                received += 1
+                semaphore.release()
+                yield index, result
+        finally:
+            feeder.kill(block=False)
+            self._batches.pop(batch_id, None)
+
+    def _feed_requests(self, requests, batch_id, pending, semaphore):
+        n = 0
+        try:
+            i = 0
+            for r in requests:
+                if isinstance(r, str):
+                    r = HttpRequest(r)
+                if isinstance(r, HttpRequest):
+                    r.meta['request_index'] = i
+                    r.meta['request_batch'] = batch_id
+                    r.dont_filter = True
+                    r.callback = 'parse'
+                    r.errback = 'handle_error'
+                    semaphore.acquire()
+                    pending.add(i)
+                    self._request_feed.put(r)
+                    n += 1
+                else:
+                    log.warning('Requests must be str or HttpRequest, got %s', type(r).__name__)
+                i += 1
+        finally:
+            # tell the consumer how many results to expect
+            batch = self._batches.get(batch_id)
+            if batch is not None:
+                batch.put((None, n))
+
+    def _set_result(self, request, result):
+        batch = self._batches.get(request.meta.get('request_batch'))
+        if batch is not None:
+            batch.put((request.meta['request_index'], result))
+
+    def _handle_request_ignored(self, request, error):
+        self._set_result(request, error)
+
+    def _handle_crawler_shutdown(self):
+        for batch in self._batches.values():
+            batch.put((None, StopCrawler))
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._request_feed.put(None)
+        self.crawler_runner.stop()
+        self._runner.join()
@@ -0,0 +1,166 @@
+# coding=utf-8
+
+import zlib
+import marshal
+from types import MethodType
+
+from .http import HttpRequest
+
+MAGIC = b'GR'
+VERSION = 2
+
+FLAG_ZLIB = 0x01
+
+# the format of marshal which is supported by all the Python versions we support
+MARSHAL_VERSION = 4
+
+# the default limit of the size of encoded requests, before and after decompression
+MAX_SIZE = 1024 * 1024
+
+_FIELDS = ('url', 'method', 'params', 'body', 'json', 'headers', 'proxies',
+           'timeout', 'verify_ssl', 'allow_redirects', 'auth',
+           'priority', 'dont_filter', 'callback', 'errback')
+_INTERNAL_ATTRS = frozenset(_FIELDS) | {'_meta'}
+
+_HEADER_SIZE = len(MAGIC) + 2
+
+# marshal always decodes to the exact types
+_PLAIN_TYPES = frozenset((type(None), bool, int, float, complex, str, bytes))
+_CONTAINER_TYPES = frozenset((tuple, list, set, frozenset))
+
+
+def _check_value(value):
+    """
+    Make sure the decoded value only consists of plain data, e.g. not code objects.
+    """
+    t = type(value)
+    if t in _PLAIN_TYPES:
+        return
+    if t is dict:
+        for k, v in value.items():
+            if type(k) not in _PLAIN_TYPES:
+                _check_value(k)
+            if type(v) not in _PLAIN_TYPES:
+                _check_value(v)
+    elif t in _CONTAINER_TYPES:
+        for v in value:
+            if type(v) not in _PLAIN_TYPES:
+                _check_value(v)
+    else:
+        raise ValueError('Unsupported type in encoded request: {}'.format(t.__name__))
+
+
+class RequestCodec:
+    """
+    Encode requests into compact bytes and decode them back.
+
+    The data starts with the magic bytes, the version and the flags, followed by the marshalled tuple of the
+    class name, the fields, the meta and the other attributes of the request. Only plain data, i.e. None,
+    numbers, strings, bytes, tuples, lists, sets and dicts of them, can be encoded, and the decoded values
+    are checked to be plain data. Callbacks are stored by the names of the spider methods.
+
+    ``marshal`` is not designed to be secure against erroneous or maliciously constructed data, so only decode
+    data written by a trusted party, e.g. the queue of the crawler. Data larger than ``max_size`` bytes, before
+    or after decompression, is rejected before being unmarshalled.
+
+    The requests are decoded as ``HttpRequest`` or the subclasses given by ``request_classes``, the attributes
+    of the requests are restored without calling ``__init__`` of the subclasses.
+    """
+
+    def __init__(self, spider=None, compress=False, compress_level=6, request_classes=None, max_size=MAX_SIZE):
+        self.spider = spider
+        self.compress = compress
+        self.compress_level = compress_level
+        self.max_size = max_size
+        self._classes = {self._class_name(HttpRequest): HttpRequest}
+        for cls in request_classes or ():
+            assert issubclass(cls, HttpRequest), '{} is not a subclass of HttpRequest'.format(cls)
+            self._classes[self._class_name(cls)] = cls
+        self._class_names = {v: k for k, v in self._classes.items()}
+
+    def __repr__(self):
+        cls_name = self.__class__.__name__
+        return '{}(compress={})'.format(cls_name, repr(self.compress))
+
+    def encode(self, request):
+        cls_name = self._class_names.get(type(request))
+        if cls_name is None:
+            raise ValueError('Request class is not registered: {}'.format(self._class_name(type(request))))
+        d = request.__dict__
+        fields = [d[k] for k in _FIELDS]
+        fields[-2] = self._callback_name(fields[-2])
+        fields[-1] = self._callback_name(fields[-1])
+        attrs = None
+        if len(d) > len(_INTERNAL_ATTRS):
+            attrs = {k: v for k, v in d.items() if k not in _INTERNAL_ATTRS}
+        try:
+            data = marshal.dumps((cls_name, tuple(fields), request.meta, attrs), MARSHAL_VERSION)
+        except ValueError as e:
+            raise ValueError('Request cannot be encoded: {}'.format(e))
+        flags = 0
+        if self.compress:
+            data = zlib.compress(data, self.compress_level)
+            flags |= FLAG_ZLIB
+        return MAGIC + bytes((VERSION, flags)) + data
+
+    def decode(self, data):
+        if data[:len(MAGIC)] != MAGIC or len(data) < _HEADER_SIZE:
+            raise ValueError('Not an encoded request')
+        version = data[len(MAGIC)]
+        if version != VERSION:
+            raise ValueError('Unsupported version of encoded request: {}'.format(version))
+        if len(data) - _HEADER_SIZE > self.max_size:
+            raise ValueError('Encoded request is larger than {} bytes'.format(self.max_size))
+        flags = data[len(MAGIC) + 1]
+        data = data[_HEADER_SIZE:]
+        try:
+            if flags & FLAG_ZLIB:
+                d = zlib.decompressobj()
+                data = d.decompress(data, self.max_size)
+                if d.unconsumed_tail:
+                    raise ValueError('Decompressed request is larger than {} bytes'.format(self.max_size))
+            cls_name, fields, meta, attrs = marshal.loads(data)
+        except (zlib.error, EOFError, ValueError, TypeError) as e:
+            raise ValueError('Invalid encoded request: {}'.format(e))
+        cls = self._classes.get(cls_name)
+        if cls is None:
+            raise ValueError('Request class is not registered: {}'.format(cls_name))
+        if not isinstance(fields, tuple) or len(fields) != len(_FIELDS) or not isinstance(meta, dict) \
+                or not (attrs is None or isinstance(attrs, dict)):
+            raise ValueError('Invalid encoded request')
+        try:
+            _check_value(fields)
+            _check_value(meta)
+            if attrs:
+                _check_value(attrs)
+        except RecursionError:
+            raise ValueError('Encoded request is nested too deeply')
+        r = object.__new__(cls)
+        HttpRequest.__init__(r, meta=meta, **dict(zip(_FIELDS, fields)))
+        if attrs:
+            r.__dict__.update(attrs)
+        if self.spider is not None:
+            r.callback = self._resolve_callback(r.callback)
+            r.errback = self._resolve_callback(r.errback)
+        return r
+
+    @staticmethod
+    def _class_name(cls):
+        return '{}.{}'.format(cls.__module__, cls.__qualname__)
+
+    def _callback_name(self, callback):
+        if callback is None or isinstance(callback, str):
+            return callback
+        if isinstance(callback, MethodType):
+            name = callback.__name__
+            if self.spider is None or getattr(self.spider, name, None) == callback:
+                return name
+        raise ValueError('Callback must be a method of the spider: {}'.format(callback))
+
+    def _resolve_callback(self, name):
+        if name is None:
+            return None
+        callback = getattr(self.spider, name, None)
+        if callback is None:
+            raise ValueError('Spider has no method: {}'.format(name))
+        return callback
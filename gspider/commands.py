@@ -96,7 +96,9 @@ class CrawlCommand(Command):
             Option(name='daemon', cli=['-d', '--daemon'], action='store_true', short_desc='run in daemon mode'),
             Option(name='log_level', cli=['-l', '--log-level'], metavar='LEVEL', short_desc='log level'),
             Option(name='log_file', cli=['--log-file'], metavar='FILE', short_desc='log file'),
-            Option(name='pid_file', cli=['--pid-file'], metavar='FILE', short_desc='PID file')]
+            Option(name='pid_file', cli=['--pid-file'], metavar='FILE', short_desc='PID file'),
+            Option(name='control_socket', cli=['--control-socket'], metavar='FILE',
+                   short_desc='Unix socket for controlling the crawler')]
 
     @property
     def syntax(self):
@@ -156,3 +158,135 @@ class VersionCommand(Command):
 
     def run(self, args):
         print("gspider version {}".format(__version__))
+
+
+class BenchCommand(Command):
+    def __init__(self):
+        super().__init__()
+        self.config = {}
+
+    @property
+    def name(self):
+        return "bench"
+
+    @property
+    def syntax(self):
+        return "[options]"
+
+    @property
+    def short_desc(self):
+        return "Run a quick benchmark against a local server"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', dest='pages', type=int, default=1000, metavar='NUM',
+                            help='number of pages in the link graph (default: 1000)')
+        parser.add_argument('--links', dest='links', type=int, default=10, metavar='NUM',
+                            help='number of links per page (default: 10)')
+        parser.add_argument('--latency', dest='latency', type=float, default=0, metavar='MS',
+                            help='response latency of the server in milliseconds (default: 0)')
+        parser.add_argument('--page-size', dest='page_size', type=int, default=10240, metavar='BYTES',
+                            help='size of each page in bytes (default: 10240)')
+        parser.add_argument('--max-workers', dest='max_workers', type=int, metavar='NUM',
+                            help='maximum number of workers')
+        parser.add_argument("-s", "--set", dest="set", action="append", default=[], metavar="NAME=VALUE",
+                            help="set/override setting (can be repeated)")
+
+    def process_arguments(self, args):
+        if args.pages <= 0 or args.links <= 0:
+            raise UsageError('The number of pages and links should > 0')
+        try:
+            self.config.update(dict(x.split("=", 1) for x in args.set))
+        except ValueError:
+            raise UsageError("Invalid -s value, use -s NAME=VALUE")
+        if args.max_workers is not None:
+            self.config['max_workers'] = args.max_workers
+
+    def run(self, args):
+        from .bench import run_bench, format_report
+
+        report = run_bench(pages=args.pages, links=args.links, latency=args.latency / 1000,
+                           page_size=args.page_size, **self.config)
+        print(format_report(report))
+
+
+class StatusCommand(Command):
+    @property
+    def name(self):
+        return "status"
+
+    @property
+    def syntax(self):
+        return "[options] <SOCKET>"
+
+    @property
+    def short_desc(self):
+        return "Show the status of a running crawler"
+
+    def add_arguments(self, parser):
+        parser.add_argument('socket', metavar='SOCKET', nargs=1, help='control socket of the crawler')
+        parser.add_argument('--hosts', dest='hosts', type=int, default=10, metavar='NUM',
+                            help='number of hosts to show (default: 10)')
+        parser.add_argument('--json', dest='json', action='store_true', help='print the status in JSON')
+
+    def process_arguments(self, args):
+        args.socket = args.socket[0]
+
+    def run(self, args):
+        import json
+        from .control import format_status
+
+        status = _send_command(args.socket, 'status', hosts=args.hosts)
+        if args.json:
+            print(json.dumps(status, indent=2))
+        else:
+            print(format_status(status))
+
+
+class CtlCommand(Command):
+    @property
+    def name(self):
+        return "ctl"
+
+    @property
+    def syntax(self):
+        return "<SOCKET> <COMMAND> [ARGS]"
+
+    @property
+    def short_desc(self):
+        return "Control a running crawler"
+
+    @property
+    def long_desc(self):
+        return "Control a running crawler, COMMAND is one of pause, resume, drain, stop and resize <WORKERS>"
+
+    def add_arguments(self, parser):
+        parser.add_argument('socket', metavar='SOCKET', nargs=1, help='control socket of the crawler')
+        parser.add_argument('command', metavar='COMMAND', nargs=1,
+                            choices=['pause', 'resume', 'drain', 'stop', 'resize'], help='command')
+        parser.add_argument('args', metavar='ARGS', nargs='*', help='arguments of the command')
+
+    def process_arguments(self, args):
+        args.socket = args.socket[0]
+        args.command = args.command[0]
+        kwargs = {}
+        if args.command == 'resize':
+            if len(args.args) != 1 or not args.args[0].isdigit() or int(args.args[0]) <= 0:
+                raise UsageError('Invalid number of workers, use: resize <WORKERS>')
+            kwargs['workers'] = int(args.args[0])
+        elif args.args:
+            raise UsageError('Command {} has no arguments'.format(args.command))
+        args.kwargs = kwargs
+
+    def run(self, args):
+        result = _send_command(args.socket, args.command, **args.kwargs)
+        state = 'draining' if result['draining'] else ('paused' if result['paused'] else 'running')
+        print('{}: {} workers, {}'.format(args.command, result['workers'], state))
+
+
+def _send_command(path, command, **kwargs):
+    from .control import send_command, ControlError
+
+    try:
+        return send_command(path, command, **kwargs)
+    except (OSError, ControlError) as e:
+        raise UsageError('Failed to send {} to {}: {}'.format(command, path, e))
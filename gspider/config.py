@@ -114,17 +114,74 @@ DEFAULT_CONFIG = {
     'daemon': False,
     'log_level': 'info',
     'log_file': None,
+    'log_buffered': False,
+    'log_json': False,
     'fetcher': 'gspider.fetcher.Fetcher',
     'queue': 'gspider.queue.PriorityQueue',
     'dupe_filter': 'gspider.dupefilter.HashDupeFilter',
+    'url_canonicalizer': None,
     'default_extensions': [
+        'gspider.extensions.RecordMiddleware',
+        'gspider.extensions.ProxyPoolMiddleware',
+        'gspider.extensions.ControlServer',
+        'gspider.extensions.CircuitBreakerMiddleware',
         'gspider.extensions.RetryMiddleware',
         'gspider.extensions.DepthMiddleware',
+        'gspider.extensions.BlockingMonitor',
+        'gspider.extensions.RobotsTxtMiddleware',
+        'gspider.extensions.RateLimitMiddleware',
+        'gspider.extensions.DnsCacheMiddleware',
+        'gspider.extensions.IncrementalMiddleware',
+        'gspider.extensions.NearDupeMiddleware',
     ],
     'max_workers': 100,
+    'resize_step': None,
+    'spider_weight': None,
     'default_headers': None,
     'verify_ssl': None,
     'proxies': None,
+    'stream_response': False,
+    'max_body_size': None,
+    'allowed_content_types': None,
+    'spool_body_size': None,
     'max_retry_times': None,
     'max_depth': None,
+    'trace_file': None,
+    'trace_sample_rate': None,
+    'trace_max_traces': None,
+    'max_blocking_time': None,
+    'robots_obey': False,
+    'robots_user_agent': None,
+    'robots_cache_ttl': None,
+    'robots_unreachable_ttl': None,
+    'dns_cache': False,
+    'dns_cache_ttl': None,
+    'dns_negative_ttl': None,
+    'dns_prefetch': False,
+    'circuit_breaker': False,
+    'circuit_failure_threshold': None,
+    'circuit_recovery_time': None,
+    'circuit_max_recovery_time': None,
+    'circuit_park': False,
+    'control_socket': None,
+    'rate_limit': None,
+    'rate_limit_per_host': None,
+    'rate_limit_hosts': None,
+    'rate_limit_tags': None,
+    'rate_limit_burst': None,
+    'proxy_pool': None,
+    'proxy_pool_sticky': False,
+    'proxy_pool_max_failures': None,
+    'proxy_pool_retest_time': None,
+    'incremental_store': None,
+    'incremental_priority': None,
+    'near_dupe': False,
+    'near_dupe_distance': None,
+    'near_dupe_max_pages': None,
+    'canonicalize_strip_params': None,
+    'canonicalize_host_rules': None,
+    'record_file': None,
+    'replay_file': None,
+    'replay_latency': None,
+    'replay_recorded_latency': False,
 }
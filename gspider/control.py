@@ -0,0 +1,96 @@
+# coding=utf-8
+
+"""
+The protocol of the control socket of crawlers.
+
+Each request is a line of JSON object with ``command`` and the arguments, e.g. ``{"command": "resize",
+"workers": 10}``, and each response is a line of JSON object with ``ok`` and ``result`` or ``error``.
+"""
+
+import json
+import socket
+
+COMMANDS = ('status', 'pause', 'resume', 'drain', 'stop', 'resize')
+
+
+class ControlError(Exception):
+    """
+    The command failed.
+    """
+
+
+def send_command(path, command, timeout=10, **kwargs):
+    """
+    Send a command to the control socket of a crawler and return the result.
+    """
+    kwargs['command'] = command
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(path)
+        sock.sendall(json.dumps(kwargs).encode('utf-8') + b'\n')
+        data = b''
+        while not data.endswith(b'\n'):
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+    finally:
+        sock.close()
+    if not data:
+        raise ControlError('No response')
+    resp = json.loads(data.decode('utf-8'))
+    if not resp.get('ok'):
+        raise ControlError(resp.get('error'))
+    return resp.get('result')
+
+
+def _format_bytes(n):
+    if n is None:
+        return '-'
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if n < 1024:
+            return '{:.1f}{}'.format(n, unit)
+        n /= 1024
+    return '{:.1f}TB'.format(n)
+
+
+def format_status(status):
+    if status['draining']:
+        state = 'draining'
+    elif status['paused']:
+        state = 'paused'
+    else:
+        state = 'running'
+    lines = [
+        'state:          {}'.format(state),
+        'uptime:         {:.0f}s'.format(status['uptime']),
+        'workers:        {} ({} active)'.format(status['workers'], status['in_flight']),
+        'queue:          {} ({} deferred)'.format(status['queue'], status['deferred']),
+        'requests:       {}'.format(status['requests']),
+        'responses:      {}'.format(status['responses']),
+        'errors:         {}'.format(status['errors']),
+        'throughput:     {:.1f}/s (1m), {:.1f}/s (all)'.format(status['throughput_1m'], status['throughput']),
+        'memory:         {} (max {})'.format(_format_bytes(status['memory']['rss']),
+                                            _format_bytes(status['memory']['max_rss'])),
+    ]
+    spiders = status.get('spiders')
+    if spiders:
+        lines.append('')
+        lines.append('{:<30} {:>8} {:>10} {:>10} {:>8} {:>8} {:>8}'.format('spider', 'queue', 'requests',
+                                                                          'responses', 'errors', 'ignored',
+                                                                          'active'))
+        for s in spiders:
+            name = s['spider'] + (' (finished)' if s['finished'] else '')
+            lines.append('{:<30} {:>8} {:>10} {:>10} {:>8} {:>8} {:>8}'.format(name, s['queue'], s['requests'],
+                                                                              s['responses'], s['errors'],
+                                                                              s['ignored'], s['in_flight']))
+    hosts = status.get('hosts')
+    if hosts:
+        lines.append('')
+        lines.append('{:<40} {:>10} {:>10} {:>8} {:>8}'.format('host', 'requests', 'responses', 'errors',
+                                                              'active'))
+        for h in hosts:
+            lines.append('{:<40} {:>10} {:>10} {:>8} {:>8}'.format(h['host'], h['requests'], h['responses'],
+                                                                  h['errors'], h['in_flight']))
+    return '\n'.join(lines)
@@ -3,78 +3,142 @@
 import logging
 import inspect
 
+from . import _patch
+
 import gevent
+from gevent.pool import Group
+from gevent.event import Event
+from gevent.lock import Semaphore
 
 from .http import HttpRequest, HttpResponse
-from .errors import IgnoreRequest, StopCrawler, ClientError, HttpError
+from .errors import IgnoreRequest, StopCrawler, ClientError, HttpError, NotEnabled, DeferRequest
 from .spider import Spider
 from .eventbus import EventBus
 from . import events
 from .extension import ExtensionManager
-from .utils import load_object, iterable_to_list, isiterable
+from .trace import RequestTracer
+from .utils import load_object, isiterable
 
 log = logging.getLogger(__name__)
 
 
 class Crawler:
-    def __init__(self, config):
+    def __init__(self, config, fetcher=None):
         self.config = config
+        self.runner = None
+        self.draining = False
         self.event_bus = EventBus()
         self.queue = self._instance_from_crawler(self.config.get('queue'))
         self.dupe_filter = self._instance_from_crawler(self.config.get('dupe_filter'))
-        self.fetcher = self._instance_from_crawler(self.config.get('fetcher'))
+        self.url_canonicalizer = self._instance_from_crawler(self.config.get('url_canonicalizer'))
+        if fetcher is None:
+            fetcher = self._instance_from_crawler(self.config.get('fetcher'))
+        self.fetcher = fetcher
         self.spider = self._instance_from_crawler(self.config.get('spider'))
         assert isinstance(self.spider, Spider), 'spider must inherit from the Spider class'
         log.info('Spider class: %s', self.spider.__class__.__name__)
         self.extension = ExtensionManager.from_crawler(self)
         log.info('Extensions: %s', self._log_objects(self.extension.extensions))
+        if self.url_canonicalizer is not None:
+            log.info('URL canonicalizer: %s', self.url_canonicalizer)
+        try:
+            self.tracer = RequestTracer.from_crawler(self)
+        except NotEnabled:
+            self.tracer = None
+        else:
+            log.info('Tracer: %s', self.tracer)
+        self._deferred = set()
+        self.event_bus.subscribe(self._cancel_deferred, events.crawler_shutdown)
 
     def start_requests(self):
+        # start requests are generated lazily, so that the spider can produce a large number of them
         try:
             res = self.spider.start_requests()
             assert res is None or isiterable(res), \
                 "Start requests must be None or an iterable object, got {}".format(type(res).__name__)
-            result = iterable_to_list(res)
-            if result:
-                res = self.extension.handle_start_requests(result)
-                result = iterable_to_list(res)
+            if res is not None:
+                for r in self.extension.handle_start_requests(res):
+                    yield r
         except StopCrawler:
             raise
         except Exception:
             log.error("Failed to get start requests", exc_info=True)
-        else:
-            return result
 
     def schedule(self, request):
         try:
+            if self.url_canonicalizer is not None:
+                request.url = self.url_canonicalizer.canonicalize(request.url)
             res = self.dupe_filter.is_duplicated(request)
             if not res:
                 self.event_bus.send(events.request_scheduled, request=request)
+                if self.tracer is not None:
+                    self.tracer.stamp(request, 'enqueue')
                 self.queue.push(request)
         except StopCrawler:
             raise
         except Exception:
             log.error('Failed to schedule %s', request, exc_info=True)
 
+    def defer(self, request, delay):
+        """
+        Put the request back to the queue after the delay, the dupe filter is bypassed.
+
+        If the request is deferred by an extension, its request handlers are resumed from that extension.
+        """
+        self._deferred.add(gevent.spawn_later(delay, self._push_deferred, request))
+
+    @property
+    def deferred_count(self):
+        return len(self._deferred)
+
+    def _push_deferred(self, request):
+        self._deferred.discard(gevent.getcurrent())
+        self.queue.push(request)
+
+    def _cancel_deferred(self):
+        if self._deferred:
+            log.info('Drop %s deferred requests', len(self._deferred))
+            for g in self._deferred:
+                g.kill(block=False)
+            self._deferred.clear()
+
     def next_request(self):
         req = self.queue.pop()
+        if self.tracer is not None:
+            self.tracer.stamp(req, 'dequeue')
         return req
 
     def fetch(self, req):
+        self.event_bus.send(events.request_started, request=req)
+        deferred = False
         try:
             resp = self._fetch(req)
         except StopCrawler:
             raise
+        except DeferRequest as e:
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug('Defer %s for %.3fs: %s', req, e.delay, e)
+            self.defer(req, e.delay)
+            deferred = True
+            self.event_bus.send(events.request_deferred, request=req, delay=e.delay)
         except Exception as e:
             if isinstance(e, IgnoreRequest):
                 self.event_bus.send(events.request_ignored, request=req, error=e)
-            elif isinstance(e, (ClientError, HttpError)):
-                log.info('Failed to make %s: %s', req, e)
             else:
-                log.warning("Failed to request %s", req, exc_info=True)
+                if isinstance(e, (ClientError, HttpError)):
+                    log.info('Failed to make %s: %s', req, e)
+                else:
+                    log.warning("Failed to request %s", req, exc_info=True)
+                self.event_bus.send(events.request_failed, request=req, error=e)
             self.spider.handle_error(req, e)
+            if isinstance(e, HttpError) and e.response is not None:
+                e.response.close()
         else:
             self._handle_response(resp)
+        finally:
+            # the trace of a deferred request goes on when it is fetched again
+            if self.tracer is not None and not deferred:
+                self.tracer.finish(req)
 
     def _fetch(self, req):
         try:
@@ -82,13 +146,23 @@ class Crawler:
             if isinstance(res, HttpRequest):
                 return res
             if res is None:
-                res = self.fetcher.fetch(req)
-        except StopCrawler:
+                if self.tracer is not None:
+                    self.tracer.stamp(req, 'fetch_start')
+                    try:
+                        res = self.fetcher.fetch(req)
+                    finally:
+                        self.tracer.stamp(req, 'fetch_end')
+                else:
+                    res = self.fetcher.fetch(req)
+        except (StopCrawler, DeferRequest):
             raise
         except Exception as e:
             res = self.extension.handle_error(req, e)
             if isinstance(res, Exception):
                 raise res
+            # the error response is replaced, e.g. by a retry
+            if isinstance(e, HttpError) and e.response is not None and e.response is not res:
+                e.response.close()
         if isinstance(res, HttpResponse):
             _res = self.extension.handle_response(req, res)
             if _res:
@@ -102,8 +176,12 @@ class Crawler:
             self.schedule(resp)
         elif isinstance(resp, HttpResponse):
             self.event_bus.send(events.response_received, response=resp)
+            if self.tracer is not None:
+                self.tracer.stamp(resp.request, 'parse_start')
             try:
-                result = self._parse(resp)
+                # the results are handled as soon as the spider yields them
+                for r in self._parse(resp):
+                    self._handle_parsing_result(r)
             except StopCrawler:
                 raise
             except Exception as e:
@@ -111,9 +189,11 @@ class Crawler:
                     self.event_bus.send(events.request_ignored, request=resp.request, error=e)
                 else:
                     log.warning("Failed to parse %s", resp, exc_info=True)
-            else:
-                for r in result:
-                    self._handle_parsing_result(r)
+            finally:
+                # the spooled body is released once the response is parsed
+                resp.close()
+                if self.tracer is not None:
+                    self.tracer.stamp(resp.request, 'parse_end')
 
     def _parse(self, response):
         request = response.request
@@ -123,22 +203,41 @@ class Crawler:
             except Exception as e:
                 self.spider.handle_error(request, e)
                 raise e
-            res = self.spider.handle_response(response)
-            assert res is None or isiterable(res), \
-                "Parsing result must be None or an iterable object, got {}".format(type(res).__name__)
-            result = iterable_to_list(res)
+            if request.meta.get('not_modified'):
+                # the page is not changed since the last crawl, the results come from the extensions only
+                res = ()
+            else:
+                res = self.spider.handle_response(response)
+                assert res is None or isiterable(res), \
+                    "Parsing result must be None or an iterable object, got {}".format(type(res).__name__)
         except Exception as e:
             res = self.extension.handle_spider_error(response, e)
             if isinstance(res, Exception):
                 raise res
-            result = iterable_to_list(res)
-        if result:
-            res = self.extension.handle_spider_output(response, result)
-            result = iterable_to_list(res)
-        return result
+        if res is None:
+            return ()
+        return self.extension.handle_spider_output(response, self._iter_parsing_result(response, res))
+
+    def _iter_parsing_result(self, response, result):
+        try:
+            for r in result:
+                yield r
+        except StopCrawler:
+            raise
+        except Exception as e:
+            res = self.extension.handle_spider_error(response, e)
+            if isinstance(res, Exception):
+                raise res
+            if res is not None:
+                for r in res:
+                    yield r
 
     def _handle_parsing_result(self, result):
         if isinstance(result, HttpRequest):
+            if self.draining:
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug('Drop %s while draining', result)
+                return
             self.schedule(result)
 
     def _instance_from_crawler(self, cls_path):
@@ -162,11 +261,24 @@ class Crawler:
 class CrawlerRunner:
     def __init__(self, crawler):
         self.crawler = crawler
+        if crawler is not None:
+            crawler.runner = self
 
         self._workers = None
         self._req_in_worker = None
+        self._retiring = None
+        self._group = None
+        self._next_worker_id = 0
         self._start_requests_generator = None
         self._is_running = False
+        self._unpaused = Event()
+        self._unpaused.set()
+
+    @property
+    def num_workers(self):
+        if self._workers is None:
+            return 0
+        return len(self._workers) - len(self._retiring)
 
     def run(self):
         if self._is_running:
@@ -179,37 +291,119 @@ class CrawlerRunner:
         log.info("The maximum number of workers: %s", max_workers)
 
         self._start_requests_generator = gevent.spawn(self._schedule_start_requests)
-        self._workers = []
-        for i in range(max_workers):
-            self._workers.append(gevent.spawn(self._fetch, i))
-        self._req_in_worker = [None] * max_workers
+        self._workers = {}
+        self._req_in_worker = {}
+        self._retiring = set()
+        self._group = Group()
+        self._spawn_workers(max_workers)
 
         log.info('Crawler is running')
-        gevent.joinall([self._start_requests_generator] + self._workers)
+        self._start_requests_generator.join()
+        self._group.join()
         self.crawler.event_bus.send(events.crawler_shutdown)
         log.info('Crawler is stopped')
 
         self._start_requests_generator = None
         self._workers = None
         self._req_in_worker = None
+        self._retiring = None
+        self._group = None
+
+    def resize(self, num_workers):
+        """
+        Change the number of workers while running.
+
+        The extra workers exit after finishing their current requests.
+        """
+        assert num_workers > 0, 'the number of workers should > 0'
+        if not self._is_running:
+            return
+        old = self.num_workers
+        if num_workers > old:
+            n = num_workers - old
+            # keep the retiring workers rather than spawning new ones
+            while n > 0 and self._retiring:
+                self._retiring.pop()
+                n -= 1
+            self._spawn_workers(n)
+        elif num_workers < old:
+            # idle workers go first
+            active = [i for i in self._workers if i not in self._retiring]
+            active.sort(key=lambda i: self._req_in_worker.get(i) is not None)
+            self._retiring.update(active[:old - num_workers])
+        if num_workers != old:
+            log.info('Resize workers: %s -> %s', old, num_workers)
+
+    @property
+    def active_requests(self):
+        if self._req_in_worker is None:
+            return []
+        return [req for req in self._req_in_worker.values() if req]
+
+    @property
+    def is_running(self):
+        return self._is_running
+
+    @property
+    def is_paused(self):
+        return not self._unpaused.is_set()
+
+    def pause(self):
+        """
+        Stop taking requests from the queue, the requests being fetched are finished.
+        """
+        if self._unpaused.is_set():
+            self._unpaused.clear()
+            log.info('Crawler is paused')
+
+    def resume(self):
+        if not self._unpaused.is_set():
+            self._unpaused.set()
+            log.info('Crawler is resumed')
+
+    def drain(self):
+        """
+        Stop generating new requests, and stop the crawler after the scheduled requests are finished.
+        """
+        if not self._is_running or self.crawler.draining:
+            return
+        log.info('Drain the crawler, %s requests in queue', len(self.crawler.queue))
+        self.crawler.draining = True
+        self._start_requests_generator.kill(exception=StopCrawler, block=False)
+        self.resume()
+        # the crawler may be idle, otherwise it's stopped by the worker finishing the last request
+        gevent.spawn(self._stop_if_done)
+
+    def _stop_if_done(self):
+        self._start_requests_generator.join()
+        if self._all_done():
+            self.stop()
 
     def stop(self):
         if not self._is_running:
             return
         self._is_running = False
+        self._unpaused.set()
         self._shutdown()
 
+    def _spawn_workers(self, n):
+        for _ in range(n):
+            coro_id = self._next_worker_id
+            self._next_worker_id += 1
+            self._workers[coro_id] = self._group.spawn(self._fetch, coro_id)
+
     def _shutdown(self):
         log.info("Shutdown now")
         self._start_requests_generator.kill(exception=StopCrawler, block=False)
-        for w in self._workers:
+        for w in list(self._workers.values()):
             w.kill(exception=StopCrawler, block=False)
 
     def _all_done(self):
-        if self._start_requests_generator.ready() and len(self.crawler.queue) <= 0:
+        if self._start_requests_generator.ready() and len(self.crawler.queue) <= 0 \
+                and self.crawler.deferred_count <= 0:
             no_active = True
-            for i in range(len(self._workers)):
-                if self._req_in_worker[i]:
+            for req in self._req_in_worker.values():
+                if req:
                     no_active = False
                     break
             return no_active
@@ -225,9 +419,17 @@ class CrawlerRunner:
 
     def _fetch(self, coro_id):
         try:
-            while True:
+            while coro_id not in self._retiring:
+                self._unpaused.wait()
                 req = self.crawler.next_request()
-                log.debug("%s -> worker[%s]", req, coro_id)
+                # paused while waiting for the queue
+                self._unpaused.wait()
+                if coro_id in self._retiring:
+                    # retired while waiting, hand the request over to the other workers
+                    self.crawler.queue.push(req)
+                    break
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug("%s -> worker[%s]", req, coro_id)
                 self._req_in_worker[coro_id] = req
                 try:
                     self.crawler.fetch(req)
@@ -240,3 +442,252 @@ class CrawlerRunner:
                     self.stop()
         except StopCrawler:
             pass
+        finally:
+            if self._workers is not None:
+                self._workers.pop(coro_id, None)
+                self._req_in_worker.pop(coro_id, None)
+                self._retiring.discard(coro_id)
+
+
+class _NotifyingQueue:
+    """
+    Count the requests pushed to the queue of a crawler by the shared semaphore.
+    """
+
+    def __init__(self, queue, semaphore):
+        self._queue = queue
+        self._semaphore = semaphore
+
+    def __len__(self):
+        return len(self._queue)
+
+    def push(self, request):
+        self._queue.push(request)
+        self._semaphore.release()
+
+    def pop(self):
+        return self._queue.pop()
+
+
+class _CrawlerStats:
+    """
+    The stats of a crawler run by MultiCrawlerRunner.
+    """
+
+    def __init__(self, crawler):
+        self.scheduled = 0
+        self.requests = 0
+        self.responses = 0
+        self.errors = 0
+        self.ignored = 0
+        crawler.event_bus.subscribe(self._handle_request_scheduled, events.request_scheduled)
+        crawler.event_bus.subscribe(self._handle_request_started, events.request_started)
+        crawler.event_bus.subscribe(self._handle_request_deferred, events.request_deferred)
+        crawler.event_bus.subscribe(self._handle_response_received, events.response_received)
+        crawler.event_bus.subscribe(self._handle_request_failed, events.request_failed)
+        crawler.event_bus.subscribe(self._handle_request_ignored, events.request_ignored)
+
+    def _handle_request_scheduled(self, request):
+        self.scheduled += 1
+
+    def _handle_request_started(self, request):
+        self.requests += 1
+
+    def _handle_request_deferred(self, request, delay):
+        # counted again when the request is fetched
+        self.requests -= 1
+
+    def _handle_response_received(self, response):
+        self.responses += 1
+
+    def _handle_request_failed(self, request, error):
+        self.errors += 1
+
+    def _handle_request_ignored(self, request, error):
+        self.ignored += 1
+
+
+class MultiCrawlerRunner(CrawlerRunner):
+    """
+    Run multiple crawlers in one process, the workers are shared by the crawlers.
+
+    The workers take requests from the crawlers by smooth weighted round-robin, the weight of each crawler is
+    configured by ``spider_weight``. Each crawler is closed as soon as it is finished.
+    """
+
+    def __init__(self, crawlers, max_workers=100):
+        super().__init__(None)
+        self.crawlers = list(crawlers)
+        assert len(self.crawlers) > 0, 'no crawler to run'
+        self.max_workers = max_workers
+        # the number of requests in the queues of all crawlers
+        self._available = Semaphore(0)
+        self._weights = {}
+        self._current_weights = {}
+        self._in_flight = {}
+        self._stats = {}
+        self._finished = set()
+        self._generators = {}
+        for c in self.crawlers:
+            c.runner = self
+            c.queue = _NotifyingQueue(c.queue, self._available)
+            weight = c.config.getint('spider_weight') or 1
+            assert weight > 0, 'spider weight should > 0'
+            self._weights[c] = weight
+            self._current_weights[c] = 0
+            self._in_flight[c] = 0
+            self._stats[c] = _CrawlerStats(c)
+
+    def get_stats(self):
+        """
+        Return the stats of each spider, in the order of the crawlers.
+        """
+        res = []
+        for c in self.crawlers:
+            s = self._stats[c]
+            res.append({
+                'spider': c.spider.__class__.__name__,
+                'weight': self._weights[c],
+                'finished': c in self._finished,
+                'draining': c.draining,
+                'scheduled': s.scheduled,
+                'requests': s.requests,
+                'responses': s.responses,
+                'errors': s.errors,
+                'ignored': s.ignored,
+                'queue': len(c.queue),
+                'in_flight': self._in_flight[c],
+                'deferred': c.deferred_count,
+            })
+        return res
+
+    def run(self):
+        if self._is_running:
+            return
+        self._is_running = True
+
+        assert self.max_workers > 0, 'max workers should > 0'
+        log.info('Run %s crawlers, the maximum number of workers: %s', len(self.crawlers), self.max_workers)
+        for c in self.crawlers:
+            c.event_bus.send(events.crawler_start)
+            g = self._generators[c] = gevent.spawn(self._schedule_crawler_start_requests, c)
+            # the crawler may have no request at all
+            g.link(lambda _, c=c: self._check_done(c))
+        self._workers = {}
+        self._req_in_worker = {}
+        self._retiring = set()
+        self._group = Group()
+        self._spawn_workers(self.max_workers)
+
+        log.info('Crawlers are running')
+        gevent.joinall(list(self._generators.values()))
+        self._group.join()
+        for c in self.crawlers:
+            self._close_crawler(c)
+        log.info('Crawlers are stopped')
+
+        self._workers = None
+        self._req_in_worker = None
+        self._retiring = None
+        self._group = None
+
+    def drain(self):
+        if not self._is_running:
+            return
+        log.info('Drain the crawlers')
+        for c in self.crawlers:
+            c.draining = True
+            self._generators[c].kill(exception=StopCrawler, block=False)
+        self.resume()
+
+    def _shutdown(self):
+        log.info("Shutdown now")
+        for g in self._generators.values():
+            g.kill(exception=StopCrawler, block=False)
+        for w in list(self._workers.values()):
+            w.kill(exception=StopCrawler, block=False)
+
+    def _all_done(self):
+        return len(self._finished) >= len(self.crawlers)
+
+    def _schedule_crawler_start_requests(self, crawler):
+        try:
+            for r in crawler.start_requests():
+                crawler.schedule(r)
+        except StopCrawler:
+            pass
+
+    def _select_crawler(self):
+        # smooth weighted round-robin among the crawlers having requests in queue
+        best = None
+        total = 0
+        for c in self.crawlers:
+            if len(c.queue) > 0:
+                w = self._weights[c]
+                self._current_weights[c] += w
+                total += w
+                if best is None or self._current_weights[c] > self._current_weights[best]:
+                    best = c
+        self._current_weights[best] -= total
+        return best
+
+    def _fetch(self, coro_id):
+        try:
+            while coro_id not in self._retiring:
+                self._unpaused.wait()
+                self._available.acquire()
+                self._unpaused.wait()
+                if coro_id in self._retiring:
+                    self._available.release()
+                    break
+                crawler = self._select_crawler()
+                req = crawler.next_request()
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug("%s -> worker[%s]", req, coro_id)
+                self._req_in_worker[coro_id] = req
+                self._in_flight[crawler] += 1
+                try:
+                    crawler.fetch(req)
+                except StopCrawler:
+                    if not self._is_running:
+                        raise
+                    # only the crawler raising the exception is stopped
+                    self._stop_crawler(crawler)
+                finally:
+                    self._in_flight[crawler] -= 1
+                    self._req_in_worker[coro_id] = None
+                self._check_done(crawler)
+        except StopCrawler:
+            pass
+        finally:
+            if self._workers is not None:
+                self._workers.pop(coro_id, None)
+                self._req_in_worker.pop(coro_id, None)
+                self._retiring.discard(coro_id)
+
+    def _stop_crawler(self, crawler):
+        log.info('Stop %s', crawler.spider.__class__.__name__)
+        crawler.draining = True
+        self._generators[crawler].kill(exception=StopCrawler, block=False)
+        crawler._cancel_deferred()
+        while len(crawler.queue) > 0:
+            self._available.acquire()
+            crawler.queue.pop()
+
+    def _check_done(self, crawler):
+        if crawler in self._finished:
+            return
+        if self._generators[crawler].ready() and len(crawler.queue) <= 0 and crawler.deferred_count <= 0 \
+                and self._in_flight[crawler] <= 0:
+            self._close_crawler(crawler)
+            if self._all_done():
+                self.stop()
+
+    def _close_crawler(self, crawler):
+        if crawler in self._finished:
+            return
+        self._finished.add(crawler)
+        crawler.event_bus.send(events.crawler_shutdown)
+        s = self._stats[crawler]
+        log.info('%s is finished: %s requests, %s responses, %s errors, %s ignored',
+                 crawler.spider.__class__.__name__, s.requests, s.responses, s.errors, s.ignored)
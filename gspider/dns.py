@@ -0,0 +1,160 @@
+# coding=utf-8
+
+import time
+import socket
+import logging
+
+from . import _patch
+
+import gevent
+from gevent.event import AsyncResult
+
+log = logging.getLogger(__name__)
+
+
+class DnsCache:
+    """
+    Cache the results of ``getaddrinfo``, including the failures.
+
+    The system resolver does not tell the TTL of DNS records, thus the entries expire after ``ttl`` seconds,
+    and failures expire after ``negative_ttl`` seconds.
+    """
+
+    def __init__(self, resolver=None, ttl=300, negative_ttl=30, max_size=10000):
+        self._resolver = resolver
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.prefetches = 0
+        self._cache = {}
+        self._pending = {}
+        self._original = None
+        self._installs = 0
+
+    def __repr__(self):
+        cls_name = self.__class__.__name__
+        return '{}(ttl={}, negative_ttl={})'.format(cls_name, repr(self.ttl), repr(self.negative_ttl))
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.negative_hits + self.misses
+        if total == 0:
+            return 0.0
+        return (self.hits + self.negative_hits) / total
+
+    @property
+    def installed(self):
+        return self._installs > 0
+
+    def install(self):
+        """
+        Replace ``socket.getaddrinfo``, which is used by urllib3 to resolve the hosts of new connections.
+
+        The installs are counted, so that the cache shared by several crawlers is only uninstalled by the last one.
+        """
+        self._installs += 1
+        if self._installs > 1:
+            return
+        self._original = socket.getaddrinfo
+        if self._resolver is None:
+            self._resolver = self._original
+        socket.getaddrinfo = self.getaddrinfo
+
+    def uninstall(self):
+        if self._installs == 0:
+            return
+        self._installs -= 1
+        if self._installs > 0:
+            return
+        if socket.getaddrinfo == self.getaddrinfo:
+            socket.getaddrinfo = self._original
+        else:
+            log.warning('socket.getaddrinfo has been replaced by others, DNS cache cannot be uninstalled')
+        self._original = None
+
+    def getaddrinfo(self, host, port, family=0, type=0, proto=0, flags=0):
+        if host is None or (isinstance(port, str) and not port.isdigit()):
+            return self._get_resolver()(host, port, family, type, proto, flags)
+        # the port is not a part of the key, the cached addresses are shared by the ports of a host
+        key = (host, family, type, proto, flags)
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            result = entry[1]
+            if isinstance(result, Exception):
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+        else:
+            # waiting for the pending resolution also saves a query
+            if key in self._pending:
+                self.hits += 1
+            else:
+                self.misses += 1
+            result = self._resolve(key)
+        if isinstance(result, Exception):
+            raise socket.gaierror(*result.args)
+        if port is None:
+            return list(result)
+        port = int(port)
+        return [(f, t, p, c, (sa[0], port) + sa[2:]) for f, t, p, c, sa in result]
+
+    def prefetch(self, host, family=0, type=socket.SOCK_STREAM, proto=0, flags=0):
+        """
+        Resolve the host in background if it is not cached.
+        """
+        key = (host, family, type, proto, flags)
+        entry = self._cache.get(key)
+        if (entry is not None and entry[0] > time.monotonic()) or key in self._pending:
+            return None
+        self.prefetches += 1
+        pending = self._pending[key] = AsyncResult()
+        return gevent.spawn(self._do_resolve, key, pending)
+
+    def is_cached(self, host, family=0, type=socket.SOCK_STREAM, proto=0, flags=0):
+        entry = self._cache.get((host, family, type, proto, flags))
+        return entry is not None and entry[0] > time.monotonic()
+
+    def clear(self):
+        self._cache.clear()
+
+    def _get_resolver(self):
+        return self._resolver or socket.getaddrinfo
+
+    def _resolve(self, key):
+        pending = self._pending.get(key)
+        if pending is not None:
+            result = pending.get()
+            if result is None:
+                # the resolution failed unexpectedly, try again
+                return self._resolve(key)
+            return result
+        pending = self._pending[key] = AsyncResult()
+        return self._do_resolve(key, pending)
+
+    def _do_resolve(self, key, pending):
+        host, family, type, proto, flags = key
+        result = None
+        try:
+            try:
+                result = tuple(self._get_resolver()(host, 0, family, type, proto, flags))
+                expire_time = time.monotonic() + self.ttl
+            except socket.gaierror as e:
+                result = e
+                expire_time = time.monotonic() + self.negative_ttl
+            self._set(key, expire_time, result)
+        finally:
+            del self._pending[key]
+            pending.set(result)
+        return result
+
+    def _set(self, key, expire_time, result):
+        if key not in self._cache and len(self._cache) >= self.max_size:
+            now = time.monotonic()
+            for k in [k for k, v in self._cache.items() if v[0] <= now]:
+                del self._cache[k]
+            if len(self._cache) >= self.max_size:
+                del self._cache[next(iter(self._cache))]
+        self._cache[key] = (expire_time, result)
@@ -29,6 +29,16 @@ class IgnoreRequest(Exception):
     """
 
 
+class DeferRequest(Exception):
+    """
+    Put the request back to the queue after a delay.
+    """
+
+    def __init__(self, *args, delay=0, **kwargs):
+        self.delay = delay
+        super().__init__(*args, **kwargs)
+
+
 class HttpError(Exception):
     """
     HTTP status is not 2xx.
@@ -5,5 +5,8 @@ crawler_start = object()
 crawler_shutdown = object()
 
 request_scheduled = object()
+request_started = object()
+request_deferred = object()
 request_ignored = object()
+request_failed = object()
 response_received = object()
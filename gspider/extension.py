@@ -4,7 +4,7 @@ import logging
 
 from .utils import load_object, isiterable
 from . import events
-from .errors import NotEnabled
+from .errors import NotEnabled, DeferRequest
 from .http import HttpRequest, HttpResponse
 
 log = logging.getLogger(__name__)
@@ -68,12 +68,22 @@ class ExtensionManager:
             ext.close()
 
     def handle_request(self, request):
-        for ext in self.extensions:
-            res = ext.handle_request(request)
-            assert res is None or isinstance(res, (HttpRequest, HttpResponse)), \
-                "Request handler must return None, HttpRequest or HttpResponse, got {}".format(type(res).__name__)
-            if res:
-                return res
+        extensions = self.extensions
+        # a deferred request goes on from the extension which deferred it, so that the others are not run twice
+        start = request.meta.pop('deferred_extension', None)
+        if start is not None:
+            extensions = extensions[start:]
+        ext = None
+        try:
+            for ext in extensions:
+                res = ext.handle_request(request)
+                assert res is None or isinstance(res, (HttpRequest, HttpResponse)), \
+                    "Request handler must return None, HttpRequest or HttpResponse, got {}".format(type(res).__name__)
+                if res:
+                    return res
+        except DeferRequest:
+            request.meta['deferred_extension'] = self.extensions.index(ext)
+            raise
 
     def handle_response(self, request, response):
         for ext in self.extensions:
@@ -1,7 +1,29 @@
 # coding=utf-8
 
+from gspider import _patch
+
 from .depth import *
 from .retry import *
+from .blocking import *
+from .robots import *
+from .dnscache import *
+from .circuitbreaker import *
+from .control import *
+from .ratelimit import *
+from .proxypool import *
+from .incremental import *
+from .neardupe import *
+from .record import *
 
 __all__ = (depth.__all__ +
-           retry.__all__)
+           retry.__all__ +
+           blocking.__all__ +
+           robots.__all__ +
+           dnscache.__all__ +
+           circuitbreaker.__all__ +
+           control.__all__ +
+           ratelimit.__all__ +
+           proxypool.__all__ +
+           incremental.__all__ +
+           neardupe.__all__ +
+           record.__all__)
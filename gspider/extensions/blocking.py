@@ -0,0 +1,112 @@
+# coding=utf-8
+
+import sys
+import time
+import logging
+import traceback
+
+import gevent
+from gevent import monkey
+
+from gspider.errors import NotEnabled
+from gspider.extension import Extension
+from gspider.spider import Spider
+
+log = logging.getLogger(__name__)
+
+__all__ = ['BlockingMonitor']
+
+
+class BlockingMonitor(Extension):
+    """
+    Detect that the gevent hub is blocked by spider callbacks or extensions.
+
+    A heartbeat greenlet measures how late it is woken up, and a native thread samples the stack of the hub
+    thread while the heartbeat is late, so that we know what is blocking the hub.
+    """
+
+    def __init__(self, max_blocking_time=0.1):
+        self.max_blocking_time = max_blocking_time
+        self.interval = max_blocking_time / 2
+        self.blocked_count = 0
+        self.blocked_time = 0.0
+        self.culprits = {}
+        self._last_beat = None
+        self._sample = None
+        self._heartbeat = None
+        self._hub_thread_id = None
+        self._running = False
+
+    def __repr__(self):
+        cls_name = self.__class__.__name__
+        return '{}(max_blocking_time={})'.format(cls_name, repr(self.max_blocking_time))
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        config = crawler.config
+        max_blocking_time = config.getfloat('max_blocking_time')
+        if not max_blocking_time:
+            raise NotEnabled
+        assert max_blocking_time > 0, 'max blocking time should > 0'
+        return cls(max_blocking_time=max_blocking_time)
+
+    def open(self):
+        self._running = True
+        self._hub_thread_id = monkey.get_original('_thread', 'get_ident')()
+        self._last_beat = time.perf_counter()
+        self._heartbeat = gevent.spawn(self._beat)
+        monkey.get_original('_thread', 'start_new_thread')(self._watch, ())
+
+    def close(self):
+        self._running = False
+        if self._heartbeat is not None:
+            self._heartbeat.kill(block=False)
+            self._heartbeat = None
+        if self.blocked_count > 0:
+            log.warning('The event loop was blocked %s times, %.3fs in total', self.blocked_count, self.blocked_time)
+            for name, (count, t) in sorted(self.culprits.items(), key=lambda x: x[1][1], reverse=True):
+                log.warning('Blocked by %s: %s times, %.3fs in total', name, count, t)
+
+    def _beat(self):
+        while True:
+            gevent.sleep(self.interval)
+            now = time.perf_counter()
+            lag = now - self._last_beat - self.interval
+            self._last_beat = now
+            if lag > self.max_blocking_time:
+                self._record(lag)
+
+    def _record(self, lag):
+        sample, self._sample = self._sample, None
+        culprit, stack = sample if sample else (None, None)
+        self.blocked_count += 1
+        self.blocked_time += lag
+        name = culprit or 'unknown'
+        c = self.culprits.setdefault(name, [0, 0.0])
+        c[0] += 1
+        c[1] += lag
+        if stack:
+            log.warning('The event loop was blocked for %.3fs by %s:\n%s', lag, name, stack)
+        else:
+            log.warning('The event loop was blocked for %.3fs', lag)
+
+    def _watch(self):
+        # runs in a native thread, so that it keeps running while the hub is blocked
+        sleep = monkey.get_original('time', 'sleep')
+        reported = None
+        while self._running:
+            sleep(self.interval)
+            beat = self._last_beat
+            if beat != reported and time.perf_counter() - beat > self.interval + self.max_blocking_time:
+                reported = beat
+                frame = sys._current_frames().get(self._hub_thread_id)
+                if frame is not None:
+                    self._sample = (self._find_culprit(frame), ''.join(traceback.format_stack(frame)))
+
+    @staticmethod
+    def _find_culprit(frame):
+        while frame is not None:
+            obj = frame.f_locals.get('self')
+            if isinstance(obj, (Spider, Extension)):
+                return '{}.{}'.format(obj.__class__.__name__, frame.f_code.co_name)
+            frame = frame.f_back
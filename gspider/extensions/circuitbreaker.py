@@ -0,0 +1,163 @@
+# coding=utf-8
+
+import time
+import logging
+from urllib.parse import urlsplit
+
+from gspider.errors import NotEnabled, ClientError, HttpError, IgnoreRequest, DeferRequest
+from gspider.extension import Extension
+
+log = logging.getLogger(__name__)
+
+__all__ = ['CircuitBreakerMiddleware']
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class _Circuit:
+    __slots__ = ('state', 'failures', 'open_until', 'recovery_time', 'probes')
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.open_until = 0
+        self.recovery_time = 0
+        # probe request -> the time it is regarded as lost
+        self.probes = {}
+
+
+class CircuitBreakerMiddleware(Extension):
+    """
+    Stop sending requests to the hosts failing continuously.
+
+    The circuit of a host is opened after ``failure_threshold`` consecutive client errors (e.g. timeouts and
+    refused connections), then its requests are ignored, or parked if ``park`` is set, until ``recovery_time``
+    has passed. After that ``max_probes`` requests are allowed to probe the host, the circuit is closed if any
+    of them succeeds, otherwise it is opened again with doubled recovery time. Parked requests are ignored at
+    last if the host is not recovered in ``max_recovery_time``.
+    """
+
+    def __init__(self, failure_threshold=5, recovery_time=30, max_recovery_time=600, max_probes=1, park=False):
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.max_recovery_time = max(max_recovery_time, recovery_time)
+        self.max_probes = max_probes
+        self.park = park
+        self.opened_count = 0
+        self.rejected_count = 0
+        self._circuits = {}
+
+    def __repr__(self):
+        cls_name = self.__class__.__name__
+        return '{}(failure_threshold={}, recovery_time={}, park={})' \
+            .format(cls_name, repr(self.failure_threshold), repr(self.recovery_time), repr(self.park))
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        config = crawler.config
+        if not config.getbool('circuit_breaker'):
+            raise NotEnabled
+        kwargs = {}
+        failure_threshold = config.getint('circuit_failure_threshold')
+        if failure_threshold is not None:
+            assert failure_threshold > 0, 'circuit failure threshold should > 0'
+            kwargs['failure_threshold'] = failure_threshold
+        recovery_time = config.getfloat('circuit_recovery_time')
+        if recovery_time is not None:
+            kwargs['recovery_time'] = recovery_time
+        max_recovery_time = config.getfloat('circuit_max_recovery_time')
+        if max_recovery_time is not None:
+            kwargs['max_recovery_time'] = max_recovery_time
+        kwargs['park'] = config.getbool('circuit_park')
+        return cls(**kwargs)
+
+    def close(self):
+        if self.opened_count > 0:
+            log.info('Circuits opened %s times, %s requests rejected', self.opened_count, self.rejected_count)
+
+    def get_state(self, host):
+        c = self._circuits.get(host)
+        if c is None:
+            return CLOSED
+        if c.state == OPEN and time.monotonic() >= c.open_until:
+            return HALF_OPEN
+        return c.state
+
+    def handle_request(self, request):
+        host = self._get_host(request)
+        c = self._circuits.get(host)
+        if c is None or c.state == CLOSED:
+            return
+        now = time.monotonic()
+        if c.state == OPEN:
+            if now < c.open_until:
+                self._reject(request, host, c, now)
+            c.state = HALF_OPEN
+            log.info('Circuit of %s is half-open', host)
+        if len(c.probes) >= self.max_probes:
+            # the probes which never report back must not block the host forever
+            for r in [r for r, t in c.probes.items() if t <= now]:
+                del c.probes[r]
+            if len(c.probes) >= self.max_probes:
+                self._reject(request, host, c, now)
+        c.probes[request] = now + max(self.recovery_time, 2 * (request.timeout or 0))
+
+    def handle_response(self, request, response):
+        self._record_success(request)
+
+    def handle_error(self, request, error):
+        if isinstance(error, ClientError):
+            self._record_failure(request)
+        elif isinstance(error, HttpError):
+            self._record_success(request)
+        elif isinstance(error, IgnoreRequest):
+            c = self._circuits.get(self._get_host(request))
+            if c is not None:
+                c.probes.pop(request, None)
+
+    def _record_success(self, request):
+        # any response shows that the host is alive
+        host = self._get_host(request)
+        c = self._circuits.get(host)
+        if c is not None:
+            if c.state != CLOSED:
+                log.info('Circuit of %s is closed', host)
+            del self._circuits[host]
+
+    def _record_failure(self, request):
+        host = self._get_host(request)
+        c = self._circuits.get(host)
+        if c is None:
+            c = self._circuits[host] = _Circuit()
+        c.failures += 1
+        is_probe = c.probes.pop(request, None) is not None
+        if c.state == HALF_OPEN and is_probe:
+            self._open(host, c, min(c.recovery_time * 2, self.max_recovery_time))
+        elif c.state == CLOSED and c.failures >= self.failure_threshold:
+            self._open(host, c, self.recovery_time)
+
+    def _open(self, host, c, recovery_time):
+        c.state = OPEN
+        c.recovery_time = recovery_time
+        c.open_until = time.monotonic() + recovery_time
+        c.probes.clear()
+        self.opened_count += 1
+        log.warning('Circuit of %s is open for %.1fs after %s consecutive failures', host, recovery_time,
+                    c.failures)
+
+    def _reject(self, request, host, c, now):
+        self.rejected_count += 1
+        reason = 'Circuit of {} is {}'.format(host, c.state)
+        if self.park:
+            # give up the requests of the hosts which do not recover for a long time
+            parked_time = request.meta.setdefault('circuit_parked_time', now)
+            if now - parked_time < self.max_recovery_time:
+                # wait for the circuit to be half-open, or for the probes to report back
+                raise DeferRequest(reason, delay=max(c.open_until - now, 1.0))
+        raise IgnoreRequest(reason)
+
+    @staticmethod
+    def _get_host(request):
+        return urlsplit(request.url).netloc.lower()
@@ -0,0 +1,290 @@
+# coding=utf-8
+
+import os
+import sys
+import json
+import time
+import socket
+import logging
+from collections import deque, OrderedDict
+from urllib.parse import urlsplit
+
+from gevent.server import StreamServer
+
+from gspider import events
+from gspider.errors import NotEnabled
+from gspider.extension import Extension
+from gspider.control import COMMANDS
+
+log = logging.getLogger(__name__)
+
+__all__ = ['ControlServer', 'MultiControlServer']
+
+
+class _HostStats:
+    __slots__ = ('requests', 'responses', 'errors')
+
+    def __init__(self):
+        self.requests = 0
+        self.responses = 0
+        self.errors = 0
+
+
+class ControlServer(Extension):
+    """
+    Serve the status and the control commands of the crawler on a Unix socket.
+
+    The stats are collected from the events of the crawler, so that each request is counted once no matter how
+    the other extensions handle it. The stats of at most ``max_stats_hosts`` hosts are kept, the least recently
+    active ones are dropped first, and the busiest ``max_hosts`` of them are reported by default.
+    """
+
+    def __init__(self, crawler, path, max_hosts=20, max_stats_hosts=10000):
+        self.crawler = crawler
+        self.path = path
+        self.max_hosts = max_hosts
+        self.max_stats_hosts = max_stats_hosts
+        self.requests = 0
+        self.responses = 0
+        self.errors = 0
+        self.hosts = OrderedDict()
+        self._start_time = None
+        # the number of responses per second in the last minute
+        self._seconds = deque(maxlen=61)
+        self._server = None
+        if crawler is not None:
+            event_bus = crawler.event_bus
+            event_bus.subscribe(self._handle_request_started, events.request_started)
+            event_bus.subscribe(self._handle_request_deferred, events.request_deferred)
+            event_bus.subscribe(self._handle_response_received, events.response_received)
+            event_bus.subscribe(self._handle_request_failed, events.request_failed)
+
+    def __repr__(self):
+        cls_name = self.__class__.__name__
+        return '{}(path={})'.format(cls_name, repr(self.path))
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        config = crawler.config
+        path = config.get('control_socket')
+        if not path:
+            raise NotEnabled
+        return cls(crawler, path)
+
+    def open(self):
+        self._start_time = time.time()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(self.path)
+        os.chmod(self.path, 0o600)
+        sock.listen(16)
+        self._server = StreamServer(sock, self._handle)
+        self._server.start()
+        log.info('Control socket: %s', self.path)
+
+    def close(self):
+        if self._server is not None:
+            self._server.stop(timeout=1)
+            self._server = None
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def _handle_request_started(self, request):
+        self.requests += 1
+        self._get_host_stats(request).requests += 1
+
+    def _handle_request_deferred(self, request, delay):
+        # counted again when the request is fetched
+        self.requests -= 1
+        h = self.hosts.get(self._get_host(request))
+        if h is not None:
+            h.requests -= 1
+
+    def _handle_response_received(self, response):
+        self.responses += 1
+        self._get_host_stats(response.request).responses += 1
+        self._count_response()
+
+    def _handle_request_failed(self, request, error):
+        self.errors += 1
+        self._get_host_stats(request).errors += 1
+
+    def _count_response(self):
+        now = int(time.time())
+        if self._seconds and self._seconds[-1][0] == now:
+            self._seconds[-1][1] += 1
+        else:
+            self._seconds.append([now, 1])
+
+    @property
+    def runner(self):
+        return self.crawler.runner
+
+    @property
+    def draining(self):
+        return self.crawler.draining
+
+    def _get_throughput(self, responses, now):
+        uptime = now - self._start_time
+        recent = sum(n for t, n in self._seconds if t >= now - 60)
+        return responses / uptime if uptime > 0 else 0.0, recent / min(60, max(uptime, 1))
+
+    def get_status(self, max_hosts=None):
+        runner = self.runner
+        now = time.time()
+        uptime = now - self._start_time
+        throughput, throughput_1m = self._get_throughput(self.responses, now)
+        if max_hosts is None:
+            max_hosts = self.max_hosts
+        hosts = sorted(self.hosts.items(), key=lambda x: x[1].requests, reverse=True)[:max_hosts]
+        in_flight = {}
+        for req in runner.active_requests:
+            host = self._get_host(req)
+            in_flight[host] = in_flight.get(host, 0) + 1
+        return {
+            'pid': os.getpid(),
+            'spider': self.crawler.spider.__class__.__name__,
+            'uptime': uptime,
+            'paused': runner.is_paused,
+            'draining': self.crawler.draining,
+            'workers': runner.num_workers,
+            'in_flight': sum(in_flight.values()),
+            'queue': len(self.crawler.queue),
+            'deferred': self.crawler.deferred_count,
+            'requests': self.requests,
+            'responses': self.responses,
+            'errors': self.errors,
+            'throughput': throughput,
+            'throughput_1m': throughput_1m,
+            'memory': self._get_memory(),
+            'hosts': [{'host': k, 'requests': v.requests, 'responses': v.responses, 'errors': v.errors,
+                       'in_flight': in_flight.get(k, 0)} for k, v in hosts],
+        }
+
+    def execute(self, command, **kwargs):
+        runner = self.runner
+        if command not in COMMANDS:
+            raise ValueError('Unknown command: {}'.format(command))
+        log.info('Control command: %s %s', command, kwargs or '')
+        if command == 'status':
+            return self.get_status(max_hosts=kwargs.get('hosts'))
+        if command == 'pause':
+            runner.pause()
+        elif command == 'resume':
+            runner.resume()
+        elif command == 'drain':
+            runner.drain()
+        elif command == 'stop':
+            runner.stop()
+        elif command == 'resize':
+            workers = int(kwargs['workers'])
+            if workers <= 0:
+                raise ValueError('The number of workers should > 0')
+            runner.resize(workers)
+        return {'workers': runner.num_workers, 'paused': runner.is_paused, 'draining': self.draining}
+
+    def _handle(self, sock, address):
+        f = sock.makefile('rwb')
+        try:
+            for line in f:
+                try:
+                    req = json.loads(line.decode('utf-8'))
+                    command = req.pop('command')
+                    resp = {'ok': True, 'result': self.execute(command, **req)}
+                except Exception as e:
+                    resp = {'ok': False, 'error': '{}: {}'.format(type(e).__name__, e)}
+                f.write(json.dumps(resp).encode('utf-8') + b'\n')
+                f.flush()
+        except OSError:
+            pass
+        finally:
+            f.close()
+            sock.close()
+
+    @staticmethod
+    def _get_host(request):
+        return urlsplit(request.url).netloc
+
+    def _get_host_stats(self, request):
+        host = self._get_host(request)
+        h = self.hosts.get(host)
+        if h is None:
+            h = self.hosts[host] = _HostStats()
+            if len(self.hosts) > self.max_stats_hosts:
+                self.hosts.popitem(last=False)
+        else:
+            self.hosts.move_to_end(host)
+        return h
+
+    @staticmethod
+    def _get_memory():
+        rss = max_rss = None
+        try:
+            import resource
+            max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # in kilobytes on Linux and in bytes on macOS
+            if sys.platform != 'darwin':
+                max_rss *= 1024
+        except ImportError:
+            pass
+        try:
+            with open('/proc/self/statm') as f:
+                rss = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError):
+            pass
+        return {'rss': rss, 'max_rss': max_rss}
+
+
+class MultiControlServer(ControlServer):
+    """
+    Serve the control socket of ``MultiCrawlerRunner``, which is bound once for all the crawlers.
+
+    The status includes the stats of each spider, and the commands apply to all the crawlers.
+    The stats of hosts are not collected.
+    """
+
+    def __init__(self, runner, path):
+        super().__init__(None, path)
+        self._runner = runner
+        for c in runner.crawlers:
+            c.event_bus.subscribe(self._handle_response_received, events.response_received)
+
+    @property
+    def runner(self):
+        return self._runner
+
+    @property
+    def draining(self):
+        return all(c.draining for c in self._runner.crawlers)
+
+    def _handle_response_received(self, response):
+        self._count_response()
+
+    def get_status(self, max_hosts=None):
+        runner = self._runner
+        now = time.time()
+        spiders = runner.get_stats()
+        responses = sum(s['responses'] for s in spiders)
+        throughput, throughput_1m = self._get_throughput(responses, now)
+        return {
+            'pid': os.getpid(),
+            'spider': ', '.join(s['spider'] for s in spiders),
+            'uptime': now - self._start_time,
+            'paused': runner.is_paused,
+            'draining': self.draining,
+            'workers': runner.num_workers,
+            'in_flight': len(runner.active_requests),
+            'queue': sum(s['queue'] for s in spiders),
+            'deferred': sum(s['deferred'] for s in spiders),
+            'requests': sum(s['requests'] for s in spiders),
+            'responses': responses,
+            'errors': sum(s['errors'] for s in spiders),
+            'throughput': throughput,
+            'throughput_1m': throughput_1m,
+            'memory': self._get_memory(),
+            'hosts': [],
+            'spiders': spiders,
+        }
@@ -0,0 +1,84 @@
+# coding=utf-8
+
+import socket
+import logging
+from urllib.parse import urlsplit
+
+from gevent.pool import Pool
+from urllib3.util.connection import allowed_gai_family
+
+from gspider.errors import NotEnabled
+from gspider.extension import Extension
+from gspider.dns import DnsCache
+from gspider import events
+
+log = logging.getLogger(__name__)
+
+__all__ = ['DnsCacheMiddleware']
+
+
+class DnsCacheMiddleware(Extension):
+    """
+    Cache DNS resolutions in the process.
+
+    ``socket.getaddrinfo`` is replaced for the whole process, thus the crawlers sharing a fetcher, e.g. the ones
+    run by ``run_spiders``, share one cache, which is configured by the first crawler.
+    """
+
+    def __init__(self, dns_cache, prefetch=False, max_prefetches=10):
+        self.dns_cache = dns_cache
+        self.prefetch = prefetch
+        self._pool = Pool(max_prefetches) if prefetch else None
+
+    def __repr__(self):
+        cls_name = self.__class__.__name__
+        return '{}(dns_cache={}, prefetch={})'.format(cls_name, repr(self.dns_cache), repr(self.prefetch))
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        config = crawler.config
+        if not config.getbool('dns_cache'):
+            raise NotEnabled
+        kwargs = {}
+        ttl = config.getfloat('dns_cache_ttl')
+        if ttl is not None:
+            kwargs['ttl'] = ttl
+        negative_ttl = config.getfloat('dns_negative_ttl')
+        if negative_ttl is not None:
+            kwargs['negative_ttl'] = negative_ttl
+        # the hosts are resolved by the proxies if any
+        prefetch = config.getbool('dns_prefetch') and not config.get('proxies') and not config.get('proxy_pool')
+        dns_cache = getattr(crawler.fetcher, 'dns_cache', None)
+        if dns_cache is None:
+            dns_cache = crawler.fetcher.dns_cache = DnsCache(**kwargs)
+        obj = cls(dns_cache, prefetch=prefetch)
+        if prefetch:
+            crawler.event_bus.subscribe(obj.handle_request_scheduled, events.request_scheduled)
+        return obj
+
+    def open(self):
+        self.dns_cache.install()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.kill(block=False)
+        self.dns_cache.uninstall()
+        c = self.dns_cache
+        if c.installed:
+            # the stats are logged by the last crawler sharing the cache
+            return
+        log.info('DNS cache: %s hits, %s negative hits, %s misses, %s prefetches, hit rate %.1f%%',
+                 c.hits, c.negative_hits, c.misses, c.prefetches, c.hit_rate * 100)
+
+    def handle_request_scheduled(self, request):
+        if request.proxies:
+            return
+        host = urlsplit(request.url).hostname
+        if not host or self._pool.full():
+            return
+        family = allowed_gai_family()
+        if self.dns_cache.is_cached(host, family, socket.SOCK_STREAM):
+            return
+        g = self.dns_cache.prefetch(host, family, socket.SOCK_STREAM)
+        if g is not None:
+            self._pool.add(g)
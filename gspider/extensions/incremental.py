@@ -0,0 +1,181 @@
+# coding=utf-8
+
+import os
+import json
+import time
+import hashlib
+import logging
+
+from gspider.errors import NotEnabled
+from gspider.extension import Extension
+from gspider.http import HttpRequest
+from gspider.utils import request_fingerprint
+from gspider import events
+
+log = logging.getLogger(__name__)
+
+__all__ = ['IncrementalMiddleware']
+
+
+class IncrementalMiddleware(Extension):
+    """
+    Recrawl incrementally.
+
+    The ``ETag``, ``Last-Modified`` and the digest of the body of each page are stored in the file ``path``
+    between runs. The requests of the known pages are made conditionally, and if the server returns
+    ``304 Not Modified`` or the body is unchanged, ``meta['not_modified']`` is set and the crawler does not pass
+    the response to the spider. The requests yielded by the spider from each page are stored as well, and they
+    are scheduled again when the page is not modified, so that the pages linked from it are still crawled.
+
+    The requests are prioritized by the change rates of the pages, up to ``priority`` higher, and the new pages
+    are regarded as always changed.
+    """
+
+    CONDITIONAL_METHODS = ('GET', 'HEAD')
+
+    def __init__(self, path, priority=10):
+        self.path = path
+        self.priority = priority
+        self.records = {}
+        self._loaded = False
+        self.stats = {'new': 0, 'changed': 0, 'unchanged': 0, 'not_modified': 0}
+
+    def __repr__(self):
+        cls_name = self.__class__.__name__
+        return '{}(path={}, priority={})'.format(cls_name, repr(self.path), repr(self.priority))
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        config = crawler.config
+        path = config.get('incremental_store')
+        if not path:
+            raise NotEnabled
+        kwargs = {}
+        priority = config.getint('incremental_priority')
+        if priority is not None:
+            kwargs['priority'] = priority
+        obj = cls(path, **kwargs)
+        if obj.priority:
+            crawler.event_bus.subscribe(obj.handle_request_scheduled, events.request_scheduled)
+        return obj
+
+    def open(self):
+        if os.path.isfile(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.records = json.load(f)
+            log.info('Loaded %s records of incremental crawl from %s', len(self.records), self.path)
+        self._loaded = True
+
+    def close(self):
+        # do not overwrite the records which failed to be loaded
+        if not self._loaded:
+            log.warning('Records of incremental crawl are not saved to %s since they were not loaded', self.path)
+            return
+        tmp_path = '{}.tmp'.format(self.path)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.records, f, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+        log.info('Incremental crawl: %s new, %s changed, %s unchanged, %s not modified', self.stats['new'],
+                 self.stats['changed'], self.stats['unchanged'], self.stats['not_modified'])
+
+    def get_change_rate(self, request):
+        """
+        The estimated probability that the page has changed since the last crawl.
+        """
+        r = self.records.get(request_fingerprint(request))
+        if r is None:
+            return 1.0
+        return (r['changes'] + 1) / (r['checks'] + 1)
+
+    def handle_request_scheduled(self, request):
+        # the retried requests are not prioritized again
+        if request.method not in self.CONDITIONAL_METHODS or 'incremental_priority' in request.meta:
+            return
+        boost = int(round(self.get_change_rate(request) * self.priority))
+        request.meta['incremental_priority'] = boost
+        request.priority = (request.priority or 0) + boost
+
+    def handle_request(self, request):
+        if request.method not in self.CONDITIONAL_METHODS:
+            return
+        r = self.records.get(request_fingerprint(request))
+        if r is None:
+            return
+        headers = {}
+        if r.get('etag'):
+            headers['If-None-Match'] = r['etag']
+        if r.get('last_modified'):
+            headers['If-Modified-Since'] = r['last_modified']
+        if headers:
+            if request.headers:
+                headers.update(request.headers)
+            request.headers = headers
+
+    def handle_response(self, request, response):
+        if request.method not in self.CONDITIONAL_METHODS:
+            return
+        status = response.status
+        if status != 304 and not (200 <= status < 300):
+            return
+        fp = request_fingerprint(request)
+        r = self.records.get(fp)
+        if status == 304:
+            if r is None:
+                return
+            changed = False
+            self.stats['not_modified'] += 1
+        else:
+            digest = hashlib.sha1(response.body or b'').hexdigest()
+            if r is None:
+                r = self.records[fp] = {'checks': 0, 'changes': 0}
+                self.stats['new'] += 1
+                changed = False
+            else:
+                changed = r.get('digest') != digest
+                self.stats['changed' if changed else 'unchanged'] += 1
+            r['digest'] = digest
+            headers = response.response.headers
+            r['etag'] = headers.get('ETag')
+            r['last_modified'] = headers.get('Last-Modified')
+        r['checks'] += 1
+        now = int(time.time())
+        r['checked'] = now
+        if changed:
+            r['changes'] += 1
+            r['changed'] = now
+        if r['checks'] > 1 and not changed:
+            request.meta['not_modified'] = True
+        else:
+            # the links are stored again after the page is parsed
+            r.pop('links', None)
+
+    def handle_spider_output(self, response, result):
+        request = response.request
+        if request.method not in self.CONDITIONAL_METHODS:
+            return result
+        r = self.records.get(request_fingerprint(request))
+        if r is None:
+            return result
+        if request.meta.get('not_modified'):
+            return self._load_links(r, result)
+        return self._store_links(r, result)
+
+    def _load_links(self, record, result):
+        for i in result:
+            yield i
+        for d in record.get('links') or ():
+            yield HttpRequest.from_dict(d)
+
+    def _store_links(self, record, result):
+        links = []
+        for i in result:
+            if isinstance(i, HttpRequest):
+                d = i.to_dict()
+                try:
+                    json.dumps(d)
+                except (TypeError, ValueError):
+                    log.debug('Cannot store %s of incremental crawl', i)
+                else:
+                    links.append(d)
+            yield i
+        record['links'] = links
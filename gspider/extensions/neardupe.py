@@ -0,0 +1,75 @@
+# coding=utf-8
+
+import logging
+
+from gspider.errors import NotEnabled, IgnoreRequest
+from gspider.extension import Extension
+from gspider.simhash import SimHashIndex, simhash, shingles, html_to_text, hamming_distance
+
+log = logging.getLogger(__name__)
+
+__all__ = ['NearDupeMiddleware']
+
+
+class NearDupeMiddleware(Extension):
+    """
+    Ignore the responses whose text is nearly the same as a former one, before they are parsed by the spider.
+
+    The SimHash of the shingles of ``shingle_size`` words is computed for each text response, and it is
+    regarded as a near-duplicate if it differs in at most ``max_distance`` bits from a fingerprint in the index.
+    The pages having fewer than ``min_shingles`` shingles and the requests with ``dont_filter`` are not checked.
+    The fingerprint of each checked response is set in ``meta['simhash']``.
+    """
+
+    def __init__(self, max_distance=3, shingle_size=4, min_shingles=10, max_size=None):
+        self.index = SimHashIndex(max_distance=max_distance, max_size=max_size)
+        self.max_distance = max_distance
+        self.shingle_size = shingle_size
+        self.min_shingles = min_shingles
+        self.duplicates = 0
+
+    def __repr__(self):
+        cls_name = self.__class__.__name__
+        return '{}(max_distance={}, shingle_size={})' \
+            .format(cls_name, repr(self.max_distance), repr(self.shingle_size))
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        config = crawler.config
+        if not config.getbool('near_dupe'):
+            raise NotEnabled
+        kwargs = {}
+        max_distance = config.getint('near_dupe_distance')
+        if max_distance is not None:
+            assert 0 <= max_distance < 64, 'near dupe distance should be in [0, 64)'
+            kwargs['max_distance'] = max_distance
+        max_size = config.getint('near_dupe_max_pages')
+        if max_size is not None:
+            kwargs['max_size'] = max_size
+        return cls(**kwargs)
+
+    def close(self):
+        log.info('Near-duplicate pages: %s ignored, %s indexed', self.duplicates, len(self.index))
+
+    def handle_response(self, request, response):
+        if request.dont_filter or response.status != 200 or not response.body:
+            return
+        content_type = response.response.headers.get('Content-Type', '').lower()
+        if content_type and 'text' not in content_type and 'html' not in content_type \
+                and 'xml' not in content_type:
+            return
+        text = response.text
+        if 'html' in content_type or not content_type:
+            text = html_to_text(text)
+        features = shingles(text, self.shingle_size)
+        if len(features) < self.min_shingles:
+            return
+        fp = simhash(features)
+        request.meta['simhash'] = fp
+        dup = self.index.find(fp)
+        if dup is not None:
+            self.duplicates += 1
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug('%s is a near-duplicate, distance: %s', request, hamming_distance(fp, dup))
+            raise IgnoreRequest('Near-duplicate page')
+        self.index.add(fp)
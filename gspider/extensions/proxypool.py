@@ -0,0 +1,191 @@
+# coding=utf-8
+
+import time
+import random
+import logging
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+from gspider.errors import NotEnabled, ClientError, HttpError, DeferRequest
+from gspider.extension import Extension
+
+log = logging.getLogger(__name__)
+
+__all__ = ['ProxyPoolMiddleware']
+
+
+class _Proxy:
+    __slots__ = ('url', 'score', 'latency', 'failures', 'evicted_until', 'evict_time', 'requests', 'errors')
+
+    def __init__(self, url):
+        self.url = url
+        # the moving averages of success and latency
+        self.score = 1.0
+        self.latency = None
+        self.failures = 0
+        self.evicted_until = 0
+        self.evict_time = 0
+        self.requests = 0
+        self.errors = 0
+
+    def is_available(self, now):
+        return self.evicted_until <= now
+
+
+class ProxyPoolMiddleware(Extension):
+    """
+    Assign the proxies in the pool to requests.
+
+    The proxies are chosen at random, weighted by the moving averages of their success rates and inversely by
+    their latencies, so that the fast and healthy proxies are used more. A proxy is evicted after
+    ``max_failures`` consecutive client errors, and it is re-tested by a request after ``retest_time``, which
+    doubles each time the proxy fails again, up to ``max_retest_time``. If ``sticky`` is set, the requests to the
+    same host go through the same proxy as long as the proxy is available.
+
+    The proxy of a request can be given by ``meta['proxy']``, the requests having their own ``proxies`` are
+    left alone. Only the retries, told by ``meta['retry_times']``, move away from the proxies assigned before,
+    the requests derived from an assigned request by ``replace()`` are assigned afresh.
+    """
+
+    FAILURE_HTTP_STATUS = (407,)
+
+    def __init__(self, proxies, sticky=False, max_failures=3, retest_time=60, max_retest_time=1800,
+                 smoothing=0.3, max_sticky_hosts=10000):
+        assert len(proxies) > 0, 'no proxy in the pool'
+        self.proxies = OrderedDict((url, _Proxy(url)) for url in proxies)
+        self.sticky = sticky
+        self.max_failures = max_failures
+        self.retest_time = retest_time
+        self.max_retest_time = max(max_retest_time, retest_time)
+        self.smoothing = smoothing
+        self.max_sticky_hosts = max_sticky_hosts
+        self._sticky_hosts = OrderedDict()
+
+    def __repr__(self):
+        cls_name = self.__class__.__name__
+        return '{}(proxies={}, sticky={})'.format(cls_name, repr(len(self.proxies)), repr(self.sticky))
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        config = crawler.config
+        proxies = config.getlist('proxy_pool')
+        if not proxies:
+            raise NotEnabled
+        kwargs = {'sticky': config.getbool('proxy_pool_sticky')}
+        max_failures = config.getint('proxy_pool_max_failures')
+        if max_failures is not None:
+            assert max_failures > 0, 'max failures of proxies should > 0'
+            kwargs['max_failures'] = max_failures
+        retest_time = config.getfloat('proxy_pool_retest_time')
+        if retest_time is not None:
+            kwargs['retest_time'] = retest_time
+        return cls(proxies, **kwargs)
+
+    def close(self):
+        for p in self.proxies.values():
+            log.info('Proxy %s: %s requests, %s errors, score %.2f, latency %s', p.url, p.requests, p.errors,
+                     p.score, '-' if p.latency is None else '{:.3f}s'.format(p.latency))
+
+    def get_stats(self):
+        now = time.monotonic()
+        return [{'proxy': p.url, 'requests': p.requests, 'errors': p.errors, 'score': p.score,
+                 'latency': p.latency, 'available': p.is_available(now)} for p in self.proxies.values()]
+
+    def handle_request(self, request):
+        meta = request.meta
+        url = meta.get('proxy')
+        if url is None:
+            last_url = meta.get('assigned_proxy')
+            retry_times = meta.get('retry_times', 0)
+            if last_url is None:
+                if request.proxies is not None:
+                    return
+            elif meta.get('assigned_proxy_retry_times', 0) == retry_times:
+                # derived from a request assigned by the pool rather than retried
+                last_url = None
+            url = self._choose(request, last_url)
+            meta['assigned_proxy'] = url
+            meta['assigned_proxy_retry_times'] = retry_times
+        request.proxies = {'http': url, 'https': url}
+        p = self.proxies.get(url)
+        if p is not None:
+            p.requests += 1
+
+    def handle_response(self, request, response):
+        p = self._get_proxy(request)
+        if p is not None:
+            self._record_success(p, response)
+
+    def handle_error(self, request, error):
+        p = self._get_proxy(request)
+        if p is None:
+            return
+        if isinstance(error, ClientError):
+            self._record_failure(p)
+        elif isinstance(error, HttpError):
+            if error.response.status in self.FAILURE_HTTP_STATUS:
+                self._record_failure(p)
+            else:
+                self._record_success(p, error.response)
+
+    def _get_proxy(self, request):
+        url = request.meta.get('proxy') or request.meta.get('assigned_proxy')
+        if url is not None:
+            return self.proxies.get(url)
+
+    def _choose(self, request, last_url):
+        now = time.monotonic()
+        host = None
+        if self.sticky:
+            host = urlsplit(request.url).netloc.lower()
+            url = self._sticky_hosts.get(host)
+            if url is not None and url != last_url and self.proxies[url].is_available(now):
+                self._sticky_hosts.move_to_end(host)
+                return url
+        candidates = [p for p in self.proxies.values() if p.is_available(now)]
+        if not candidates:
+            delay = min(p.evicted_until for p in self.proxies.values()) - now
+            raise DeferRequest('No available proxy', delay=max(delay, 1.0))
+        if last_url is not None and len(candidates) > 1:
+            # try another proxy after failure
+            candidates = [p for p in candidates if p.url != last_url]
+        known = [p.latency for p in candidates if p.latency is not None]
+        # the new proxies are regarded as average ones
+        default_latency = sum(known) / len(known) if known else 1.0
+        weights = [p.score / max(p.latency if p.latency is not None else default_latency, 0.001)
+                   for p in candidates]
+        if sum(weights) > 0:
+            url = random.choices(candidates, weights=weights)[0].url
+        else:
+            url = random.choice(candidates).url
+        if host is not None:
+            self._sticky_hosts[host] = url
+            self._sticky_hosts.move_to_end(host)
+            if len(self._sticky_hosts) > self.max_sticky_hosts:
+                self._sticky_hosts.popitem(last=False)
+        return url
+
+    def _record_success(self, p, response):
+        a = self.smoothing
+        p.score = (1 - a) * p.score + a
+        p.failures = 0
+        p.evict_time = 0
+        elapsed = getattr(response.response, 'elapsed', None)
+        if elapsed is not None:
+            latency = elapsed.total_seconds()
+            p.latency = latency if p.latency is None else (1 - a) * p.latency + a * latency
+
+    def _record_failure(self, p):
+        a = self.smoothing
+        p.score = (1 - a) * p.score
+        p.errors += 1
+        p.failures += 1
+        now = time.monotonic()
+        if p.failures >= self.max_failures and p.is_available(now):
+            # a re-tested proxy is evicted again at the first failure with doubled time
+            p.evict_time = min(p.evict_time * 2, self.max_retest_time) if p.evict_time else self.retest_time
+            p.evicted_until = now + p.evict_time
+            p.failures = self.max_failures - 1
+            # give the proxy a fair chance to be re-tested
+            p.score = max(p.score, 0.5)
+            log.warning('Evict proxy %s for %.1fs', p.url, p.evict_time)
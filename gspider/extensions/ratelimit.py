@@ -0,0 +1,234 @@
+# coding=utf-8
+
+import time
+import logging
+from collections import deque
+from urllib.parse import urlsplit
+
+import gevent
+
+from gspider.errors import NotEnabled, DeferRequest
+from gspider.extension import Extension
+
+log = logging.getLogger(__name__)
+
+__all__ = ['RateLimitMiddleware']
+
+
+class TokenBucket:
+    """
+    A token bucket allowing ``rate`` requests per second with bursts of at most ``burst`` requests.
+
+    Tokens may be reserved in advance, thus the tokens can be negative, and the requests holding the
+    reservations are let through one after another at exactly the rate.
+    """
+
+    __slots__ = ('rate', 'burst', 'tokens', 'last_time', 'count', 'crawl_delay', '_recent')
+
+    def __init__(self, rate, burst=1, window=100, crawl_delay=None):
+        assert rate > 0, 'rate should > 0'
+        self.rate = rate
+        self.crawl_delay = crawl_delay
+        self.burst = burst
+        self.tokens = burst
+        self.last_time = time.monotonic()
+        self.count = 0
+        self._recent = deque(maxlen=window)
+
+    def delay(self, now):
+        """
+        The time to wait before a token is available.
+        """
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def record(self, now):
+        self.count += 1
+        self._recent.append(now)
+
+    @property
+    def is_idle(self):
+        return self.tokens >= self.burst
+
+    @property
+    def observed_rate(self):
+        """
+        The rate of the recent requests let through.
+        """
+        if len(self._recent) < 2:
+            return 0.0
+        t = self._recent[-1] - self._recent[0]
+        if t <= 0:
+            return 0.0
+        return (len(self._recent) - 1) / t
+
+    def _refill(self, now):
+        if now > self.last_time:
+            self.tokens = min(self.burst, self.tokens + (now - self.last_time) * self.rate)
+            self.last_time = now
+
+
+class RateLimitMiddleware(Extension):
+    """
+    Limit the rate of requests by token buckets, globally, per host and per tag.
+
+    ``rate`` is the global number of requests per second, ``host_rate`` is the default rate of each host,
+    ``host_rates`` overrides the rates of some hosts, and ``tag_rates`` gives the rates of the requests tagged
+    by ``meta['rate_limit_tag']``. The crawl delay of robots.txt in ``meta['crawl_delay']`` further limits the
+    rate of the host, which is set when the bucket of the host is created or when the crawl delay changes,
+    and the requests without the crawl delay are limited by the same rate. The middleware is enabled by
+    ``robots_obey`` as well, so that the crawl delay is honored even if no rate is given.
+
+    A request waits cooperatively for its slot if the wait is no longer than ``max_wait``, otherwise the slot is
+    reserved and the request is put back to the queue, so that the worker is free to make requests to other
+    hosts.
+    """
+
+    def __init__(self, rate=None, host_rate=None, host_rates=None, tag_rates=None, burst=1, max_wait=1.0,
+                 max_hosts=10000):
+        self.rate = rate
+        self.host_rate = host_rate
+        self.host_rates = {k.lower(): v for k, v in (host_rates or {}).items()}
+        self.tag_rates = dict(tag_rates or {})
+        self.burst = burst
+        self.max_wait = max_wait
+        self.max_hosts = max_hosts
+        self.waited_count = 0
+        self.deferred_count = 0
+        self._global = TokenBucket(rate, burst=burst) if rate else None
+        self._hosts = {}
+        self._tags = {}
+
+    def __repr__(self):
+        cls_name = self.__class__.__name__
+        return '{}(rate={}, host_rate={}, burst={})' \
+            .format(cls_name, repr(self.rate), repr(self.host_rate), repr(self.burst))
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        config = crawler.config
+        kwargs = {}
+        rate = config.getfloat('rate_limit')
+        if rate is not None:
+            assert rate > 0, 'rate limit should > 0'
+            kwargs['rate'] = rate
+        host_rate = config.getfloat('rate_limit_per_host')
+        if host_rate is not None:
+            assert host_rate > 0, 'rate limit per host should > 0'
+            kwargs['host_rate'] = host_rate
+        host_rates = config.get('rate_limit_hosts')
+        if host_rates:
+            kwargs['host_rates'] = host_rates
+        tag_rates = config.get('rate_limit_tags')
+        if tag_rates:
+            kwargs['tag_rates'] = tag_rates
+        # the crawl delay of robots.txt is honored even if no rate is given
+        if not kwargs and not config.getbool('robots_obey'):
+            raise NotEnabled
+        burst = config.getint('rate_limit_burst')
+        if burst is not None:
+            assert burst > 0, 'rate limit burst should > 0'
+            kwargs['burst'] = burst
+        return cls(**kwargs)
+
+    def close(self):
+        if self._global is not None:
+            log.info('Rate limit: %s requests, %.2f/s recently, %s waited, %s deferred', self._global.count,
+                     self._global.observed_rate, self.waited_count, self.deferred_count)
+        else:
+            log.info('Rate limit: %s waited, %s deferred', self.waited_count, self.deferred_count)
+        for name, buckets in (('host', self._hosts), ('tag', self._tags)):
+            for k, b in sorted(buckets.items(), key=lambda x: x[1].count, reverse=True)[:5]:
+                log.info('Rate limit of %s %s: %s requests, %.2f/s recently, limited to %.2f/s', name, k,
+                         b.count, b.observed_rate, b.rate)
+
+    def get_observed_rate(self, host=None, tag=None):
+        """
+        The recent rate of the requests let through, globally if neither ``host`` nor ``tag`` is given.
+        """
+        if host is not None:
+            b = self._hosts.get(host.lower())
+        elif tag is not None:
+            b = self._tags.get(tag)
+        else:
+            b = self._global
+        if b is None:
+            return 0.0
+        return b.observed_rate
+
+    def handle_request(self, request):
+        buckets = self._get_buckets(request)
+        if not buckets:
+            return
+        slot = request.meta.pop('rate_limit_slot', None)
+        now = time.monotonic()
+        if slot is None:
+            wait = max(b.delay(now) for b in buckets)
+            # reserve the slot in all the buckets
+            for b in buckets:
+                b.consume(now)
+            if wait > self.max_wait:
+                self.deferred_count += 1
+                request.meta['rate_limit_slot'] = now + wait
+                raise DeferRequest('Rate limited', delay=wait)
+        else:
+            wait = slot - now
+        if wait > 0:
+            self.waited_count += 1
+            gevent.sleep(wait)
+            now = time.monotonic()
+        for b in buckets:
+            b.record(now)
+
+    def _get_buckets(self, request):
+        buckets = []
+        if self._global is not None:
+            buckets.append(self._global)
+        b = self._get_host_bucket(request)
+        if b is not None:
+            buckets.append(b)
+        tag = request.meta.get('rate_limit_tag')
+        if tag is not None:
+            b = self._tags.get(tag)
+            if b is None:
+                rate = self.tag_rates.get(tag)
+                if rate:
+                    b = self._tags[tag] = TokenBucket(rate, burst=self.burst)
+            if b is not None:
+                buckets.append(b)
+        return buckets
+
+    def _get_host_bucket(self, request):
+        host = urlsplit(request.url).netloc.lower()
+        crawl_delay = request.meta.get('crawl_delay') or None
+        b = self._hosts.get(host)
+        if b is None:
+            rate = self._get_host_rate(host, crawl_delay)
+            if not rate:
+                return
+            if len(self._hosts) >= self.max_hosts:
+                self._remove_idle_hosts()
+            b = self._hosts[host] = TokenBucket(rate, burst=self.burst, crawl_delay=crawl_delay)
+        elif crawl_delay is not None and crawl_delay != b.crawl_delay:
+            # the robots rules of the host have changed
+            b.crawl_delay = crawl_delay
+            b.rate = self._get_host_rate(host, crawl_delay)
+        return b
+
+    def _get_host_rate(self, host, crawl_delay):
+        rate = self.host_rates.get(host, self.host_rate)
+        if crawl_delay:
+            rate = min(rate, 1.0 / crawl_delay) if rate else 1.0 / crawl_delay
+        return rate
+
+    def _remove_idle_hosts(self):
+        # the full buckets are the same as the new ones, the crawl delay comes with the next request of the host
+        now = time.monotonic()
+        for host in [h for h, b in self._hosts.items() if b.delay(now) <= 0 and b.is_idle]:
+            del self._hosts[host]
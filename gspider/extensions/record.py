@@ -0,0 +1,52 @@
+# coding=utf-8
+
+import logging
+
+from gspider.errors import NotEnabled, HttpError
+from gspider.extension import Extension
+from gspider.replay import ArchiveWriter
+
+log = logging.getLogger(__name__)
+
+__all__ = ['RecordMiddleware']
+
+
+class RecordMiddleware(Extension):
+    """
+    Record the responses into an archive, which can be replayed by ``ReplayFetcher``.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._writer = None
+
+    def __repr__(self):
+        cls_name = self.__class__.__name__
+        return '{}(path={})'.format(cls_name, repr(self.path))
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        path = crawler.config.get('record_file')
+        if not path:
+            raise NotEnabled
+        return cls(path)
+
+    def open(self):
+        self._writer = ArchiveWriter(self.path)
+
+    def close(self):
+        if self._writer is not None:
+            log.info('Recorded %s responses into %s', self._writer.count, self.path)
+            self._writer.close()
+            self._writer = None
+
+    def handle_response(self, request, response):
+        self._record(request, response)
+
+    def handle_error(self, request, error):
+        if isinstance(error, HttpError) and error.response is not None:
+            self._record(request, error.response)
+
+    def _record(self, request, response):
+        if self._writer is not None and response.response is not None:
+            self._writer.write(request, response)
@@ -0,0 +1,213 @@
+# coding=utf-8
+
+import re
+import time
+import logging
+from urllib.parse import urlsplit
+
+from gevent.event import AsyncResult
+
+from gspider.http import HttpRequest
+from gspider.errors import NotEnabled, IgnoreRequest, HttpError, StopCrawler
+from gspider.extension import Extension
+
+log = logging.getLogger(__name__)
+
+__all__ = ['RobotsTxtMiddleware', 'RobotsRules']
+
+
+class RobotsRules:
+    """
+    The rules of robots.txt applying to a user agent.
+    """
+
+    __slots__ = ('rules', 'crawl_delay', 'expire_time')
+
+    def __init__(self, rules=(), crawl_delay=None, expire_time=None):
+        # (pattern length, allow, prefix or compiled pattern), ordered by the precedence
+        self.rules = tuple(sorted(rules, key=lambda r: (-r[0], not r[1])))
+        self.crawl_delay = crawl_delay
+        self.expire_time = expire_time
+
+    @classmethod
+    def disallow_all(cls, expire_time=None):
+        return cls([(0, False, '')], expire_time=expire_time)
+
+    def allowed(self, path):
+        for _, allow, pattern in self.rules:
+            if isinstance(pattern, str):
+                if path.startswith(pattern):
+                    return allow
+            elif pattern.match(path):
+                return allow
+        return True
+
+    @classmethod
+    def parse(cls, text, user_agent='*', expire_time=None):
+        """
+        Parse robots.txt, the longest matching rule wins and ``Allow`` wins if the rules are equivalent.
+        The groups are matched by the product token of the user agent, e.g. ``gspider`` of ``gspider/0.1``,
+        case-insensitively.
+        """
+        ua_token = user_agent.split('/')[0].strip().lower()
+        groups = []
+        agents = []
+        rules = []
+        delay = None
+        in_rules = False
+        for line in text.splitlines():
+            i = line.find('#')
+            if i >= 0:
+                line = line[:i]
+            if ':' not in line:
+                continue
+            key, value = line.split(':', 1)
+            key = key.strip().lower()
+            value = value.strip()
+            if key == 'user-agent':
+                if in_rules:
+                    groups.append((agents, rules, delay))
+                    agents, rules, delay, in_rules = [], [], None, False
+                agents.append(value.lower())
+            elif key in ('allow', 'disallow'):
+                in_rules = True
+                if value:
+                    rules.append((key == 'allow', value))
+            elif key == 'crawl-delay':
+                in_rules = True
+                try:
+                    delay = float(value)
+                except ValueError:
+                    pass
+        if agents:
+            groups.append((agents, rules, delay))
+        matched = [g for g in groups if ua_token in g[0] and ua_token != '*']
+        if not matched:
+            matched = [g for g in groups if '*' in g[0]]
+        compiled = []
+        crawl_delay = None
+        for _, group_rules, group_delay in matched:
+            for allow, path in group_rules:
+                compiled.append((len(path), allow, cls._compile_path(path)))
+            if group_delay is not None:
+                crawl_delay = group_delay
+        return cls(compiled, crawl_delay=crawl_delay, expire_time=expire_time)
+
+    @staticmethod
+    def _compile_path(path):
+        if '*' not in path and not path.endswith('$'):
+            return path
+        end = path.endswith('$')
+        if end:
+            path = path[:-1]
+        pattern = '.*'.join(re.escape(p) for p in path.split('*'))
+        if end:
+            pattern += '$'
+        return re.compile(pattern)
+
+
+class RobotsTxtMiddleware(Extension):
+    """
+    Ignore the requests disallowed by robots.txt.
+
+    As RFC 9309 requires, all requests are allowed if robots.txt is unavailable, i.e. the response is 4xx,
+    and all requests are disallowed if it is unreachable, i.e. the response is 5xx or the request fails.
+    The rules of unreachable robots.txt are cached for ``unreachable_ttl`` seconds, then it is fetched again.
+    """
+
+    def __init__(self, fetcher, user_agent='*', cache_ttl=86400, unreachable_ttl=60, timeout=10):
+        self._fetcher = fetcher
+        self._user_agent = user_agent
+        self._cache_ttl = cache_ttl
+        self._unreachable_ttl = unreachable_ttl
+        self._timeout = timeout
+        self._rules = {}
+        self._pending = {}
+
+    def __repr__(self):
+        cls_name = self.__class__.__name__
+        return '{}(user_agent={}, cache_ttl={})'.format(cls_name, repr(self._user_agent), repr(self._cache_ttl))
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        config = crawler.config
+        if not config.getbool('robots_obey'):
+            raise NotEnabled
+        kwargs = {}
+        user_agent = config.get('robots_user_agent')
+        if user_agent is None:
+            user_agent = (config.get('default_headers') or {}).get('User-Agent')
+        if user_agent is not None:
+            kwargs['user_agent'] = user_agent
+        cache_ttl = config.getfloat('robots_cache_ttl')
+        if cache_ttl is not None:
+            kwargs['cache_ttl'] = cache_ttl
+        unreachable_ttl = config.getfloat('robots_unreachable_ttl')
+        if unreachable_ttl is not None:
+            kwargs['unreachable_ttl'] = unreachable_ttl
+        return cls(crawler.fetcher, **kwargs)
+
+    def handle_request(self, request):
+        if request.meta.get('dont_obey_robots'):
+            return
+        res = urlsplit(request.url)
+        rules = self.get_rules('{}://{}'.format(res.scheme, res.netloc))
+        path = res.path or '/'
+        if res.query:
+            path = '{}?{}'.format(path, res.query)
+        if not rules.allowed(path):
+            raise IgnoreRequest('Forbidden by robots.txt')
+        if rules.crawl_delay is not None and 'crawl_delay' not in request.meta:
+            request.meta['crawl_delay'] = rules.crawl_delay
+
+    def get_crawl_delay(self, url):
+        res = urlsplit(url)
+        rules = self._rules.get('{}://{}'.format(res.scheme, res.netloc))
+        if rules is not None:
+            return rules.crawl_delay
+
+    def get_rules(self, origin):
+        rules = self._rules.get(origin)
+        if rules is not None and rules.expire_time > time.time():
+            return rules
+        pending = self._pending.get(origin)
+        if pending is not None:
+            # only the requests of the same host wait for robots.txt
+            return pending.get()
+        pending = self._pending[origin] = AsyncResult()
+        # allow all requests without caching the rules if the crawler is stopped while fetching robots.txt
+        rules = RobotsRules(expire_time=0)
+        try:
+            rules = self._fetch_rules(origin)
+            self._rules[origin] = rules
+        finally:
+            del self._pending[origin]
+            pending.set(rules)
+        return rules
+
+    def _fetch_rules(self, origin):
+        expire_time = time.time() + self._cache_ttl
+        url = origin + '/robots.txt'
+        try:
+            resp = self._fetcher.fetch(HttpRequest(url, timeout=self._timeout))
+        except StopCrawler:
+            raise
+        except IgnoreRequest as e:
+            # the response is rejected by the settings of the fetcher, e.g. the allowed content types
+            log.warning('Failed to fetch %s: %s', url, e)
+            return RobotsRules(expire_time=expire_time)
+        except HttpError as e:
+            status = e.response.status if e.response is not None else None
+            if status is not None and 400 <= status < 500:
+                log.debug('Failed to fetch %s: %s', url, e)
+                return RobotsRules(expire_time=expire_time)
+            log.info('Failed to fetch %s, disallow all: %s', url, e)
+            return RobotsRules.disallow_all(expire_time=time.time() + self._unreachable_ttl)
+        except Exception as e:
+            log.info('Failed to fetch %s, disallow all: %s', url, e)
+            return RobotsRules.disallow_all(expire_time=time.time() + self._unreachable_ttl)
+        try:
+            return RobotsRules.parse(resp.text, user_agent=self._user_agent, expire_time=expire_time)
+        except Exception:
+            log.warning('Failed to parse %s', url, exc_info=True)
+            return RobotsRules(expire_time=expire_time)
@@ -1,12 +1,17 @@
 # coding=utf-8
 
 import logging
+import io
+import tempfile
+from fnmatch import fnmatch
+
+from . import _patch
 
 import requests
 from requests import HTTPError, Response
 import gevent
 
-from .errors import ClientError, HttpError
+from .errors import ClientError, HttpError, IgnoreRequest, StopCrawler
 from .http import HttpRequest, HttpResponse
 
 log = logging.getLogger(__name__)
@@ -14,11 +19,18 @@ log = logging.getLogger(__name__)
 
 class Fetcher:
     default_session_id = '0'
+    chunk_size = 64 * 1024
 
-    def __init__(self, default_headers=None, verify_ssl=None, proxies=None):
+    def __init__(self, default_headers=None, verify_ssl=None, proxies=None, stream=False,
+                 max_body_size=None, allowed_content_types=None, spool_body_size=None):
         self.default_headers = default_headers
         self.verify_ssl = verify_ssl
         self.proxies = proxies
+        self.max_body_size = max_body_size
+        self.allowed_content_types = allowed_content_types
+        self.spool_body_size = spool_body_size
+        self.stream = stream or max_body_size is not None or allowed_content_types is not None \
+                      or spool_body_size is not None
         self.sessions = {}
 
     def new_session(self):
@@ -38,16 +50,29 @@ class Fetcher:
 
     @classmethod
     def from_crawler(cls, crawler):
-        config = crawler.config
+        return cls(**cls._kwargs_from_config(crawler.config))
+
+    @staticmethod
+    def _kwargs_from_config(config):
         kwargs = {}
         if config['verify_ssl'] is not None:
             kwargs['verify_ssl'] = config['verify_ssl']
         if config['proxies'] is not None:
             kwargs['proxies'] = config['proxies']
-        return cls(**kwargs)
+        if config.getbool('stream_response'):
+            kwargs['stream'] = True
+        if config['max_body_size'] is not None:
+            kwargs['max_body_size'] = config.getint('max_body_size')
+        if config['allowed_content_types'] is not None:
+            kwargs['allowed_content_types'] = config.getlist('allowed_content_types')
+        if config['spool_body_size'] is not None:
+            kwargs['spool_body_size'] = config.getint('spool_body_size')
+        return kwargs
 
     def fetch(self, request: HttpRequest):
-        log.debug("HTTP request: %s", request)
+        debug = log.isEnabledFor(logging.DEBUG)
+        if debug:
+            log.debug("HTTP request: %s", request)
         try:
             session = self._get_session()
             kwargs = {}
@@ -69,20 +94,101 @@ class Fetcher:
                 kwargs['proxies'] = request.proxies
             if request.verify_ssl is not None:
                 kwargs['verify'] = request.verify_ssl
+            # the body of a request can be spooled by meta['spool_body_size']
+            stream = self.stream or request.meta.get('spool_body_size') is not None
+            if stream:
+                kwargs['stream'] = True
             resp = session.request(request.method, request.url, **kwargs)
             resp.raise_for_status()
-            response = self._make_response(resp, request)
+            if stream:
+                response = self._make_streamed_response(resp, request)
+            else:
+                response = self._make_response(resp, request)
         except HTTPError as e:
             raise HttpError('{}'.format(e.response),
-                            response=self._make_response(e.response, request))
+                            response=self._make_error_response(e.response, request))
+        except (IgnoreRequest, StopCrawler):
+            raise
         except Exception as e:
             raise ClientError(e)
-        log.debug("HTTP response: %s", response)
+        if debug:
+            log.debug("HTTP response: %s", response)
         return response
 
     def _make_response(self, response: Response, request: HttpRequest):
         return HttpResponse(request=request, response=response)
 
+    def _make_error_response(self, response: Response, request: HttpRequest):
+        if not (self.stream or request.meta.get('spool_body_size') is not None):
+            return self._make_response(response, request)
+        try:
+            return self._make_streamed_response(response, request, check_content_type=False)
+        except IgnoreRequest as e:
+            # the body of the error response is too large
+            log.debug('Drop the body of %s: %s', response, e)
+            response._content = b''
+            return self._make_response(response, request)
+        except Exception as e:
+            raise ClientError(e)
+
+    def _make_streamed_response(self, response: Response, request: HttpRequest, check_content_type=True):
+        try:
+            if check_content_type:
+                self._check_content_type(response)
+            self._check_content_length(response)
+            body_file = self._download_body(response, request)
+        except Exception:
+            # abort the connection without reading the rest of the body
+            response.close()
+            raise
+        if isinstance(body_file, io.BytesIO):
+            response._content = body_file.getvalue()
+            body_file = None
+        else:
+            # the body is spooled to a temporary file and loaded only when accessed
+            response.raw = body_file
+            response._content = False
+            response._content_consumed = False
+        return HttpResponse(request=request, response=response, body_file=body_file)
+
+    def _check_content_type(self, response: Response):
+        if self.allowed_content_types is None:
+            return
+        content_type = response.headers.get('Content-Type', '').split(';', 1)[0].strip().lower()
+        for pattern in self.allowed_content_types:
+            if fnmatch(content_type, pattern.lower()):
+                return
+        raise IgnoreRequest('Content-Type is not allowed: {}'.format(content_type or None))
+
+    def _check_content_length(self, response: Response):
+        if self.max_body_size is None:
+            return
+        try:
+            length = int(response.headers.get('Content-Length'))
+        except (ValueError, TypeError):
+            return
+        if length > self.max_body_size:
+            raise IgnoreRequest('Content-Length {} > {}'.format(length, self.max_body_size))
+
+    def _download_body(self, response: Response, request: HttpRequest):
+        spool_body_size = request.meta.get('spool_body_size', self.spool_body_size)
+        if spool_body_size is not None:
+            body_file = tempfile.SpooledTemporaryFile(max_size=spool_body_size)
+        else:
+            body_file = io.BytesIO()
+        size = 0
+        try:
+            for chunk in response.iter_content(self.chunk_size):
+                size += len(chunk)
+                if self.max_body_size is not None and size > self.max_body_size:
+                    raise IgnoreRequest('Body size > {}'.format(self.max_body_size))
+                body_file.write(chunk)
+        except Exception:
+            body_file.close()
+            raise
+        body_file.seek(0)
+        return body_file
+
     def _get_session(self):
         try:
             g = gevent.getcurrent().minimal_ident
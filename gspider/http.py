@@ -1,11 +1,19 @@
 # coding=utf-8
 
-import inspect
-
-from requests.models import Response
+import io
+from types import MethodType
+from typing import TYPE_CHECKING
 
 from gspider.utils import get_encoding_from_content, get_encoding_from_content_type
 
+if TYPE_CHECKING:
+    from requests.models import Response
+
+
+_request_fields = frozenset(["url", "method", "params", "body", "json", "headers", "proxies",
+                             "timeout", "verify_ssl", "allow_redirects", "auth",
+                             "priority", "dont_filter", "callback", "errback"])
+
 
 class HttpRequest:
     def __init__(self, url, method="GET", params=None, body=None, json=None, headers=None, proxies=None,
@@ -44,35 +52,54 @@ class HttpRequest:
         return self.replace()
 
     def replace(self, **kwargs):
-        for i in ["url", "method", "params", "body", "json", "headers", "proxies",
-                  "timeout", "verify_ssl", "allow_redirects", "auth",
-                  "priority", "dont_filter", "callback", "errback", "meta"]:
-            kwargs.setdefault(i, getattr(self, i))
-        return type(self)(**kwargs)
+        """
+        Return a copy of the request with the given fields replaced.
+
+        The attributes are cloned directly rather than calling ``__init__``, and the meta is a shallow copy.
+        The subclasses overriding ``__init__`` are constructed by ``__init__`` with the fields of the request
+        instead.
+        """
+        for k in kwargs:
+            if k not in _request_fields and k != 'meta':
+                raise TypeError("replace() got an unexpected keyword argument '{}'".format(k))
+        cls = type(self)
+        if cls.__init__ is not HttpRequest.__init__:
+            for k in _request_fields:
+                kwargs.setdefault(k, getattr(self, k))
+            kwargs.setdefault('meta', self.meta)
+            return cls(**kwargs)
+        r = object.__new__(cls)
+        d = r.__dict__
+        d.update(self.__dict__)
+        meta = kwargs.pop('meta') if 'meta' in kwargs else self._meta
+        d['_meta'] = dict(meta) if meta else {}
+        d.update(kwargs)
+        return r
 
     def to_dict(self):
         callback = self.callback
-        if inspect.ismethod(callback):
+        if isinstance(callback, MethodType):
             callback = callback.__name__
         errback = self.errback
-        if inspect.ismethod(errback):
+        if isinstance(errback, MethodType):
             errback = errback.__name__
         d = {
             'url': self.url,
             'method': self.method,
+            'params': self.params,
             'body': self.body,
+            'json': self.json,
             'headers': self.headers,
-            'proxy': self.proxy,
+            'proxies': self.proxies,
             'timeout': self.timeout,
             'verify_ssl': self.verify_ssl,
             'allow_redirects': self.allow_redirects,
             'auth': self.auth,
-            'proxy_auth': self.proxy_auth,
             'priority': self.priority,
             'dont_filter': self.dont_filter,
             'callback': callback,
             'errback': errback,
-            'meta': self.meta
+            'meta': dict(self.meta)
         }
         return d
 
@@ -82,12 +109,13 @@ class HttpRequest:
 
 
 class HttpResponse:
-    def __init__(self, request=None, response: Response = None):
+    def __init__(self, request=None, response: 'Response' = None, body_file=None):
         """
         Construct an HTTP response.
         """
         self.request = request
         self.response = response
+        self._body_file = body_file
         self._encoding = None
 
     def __str__(self):
@@ -97,25 +125,45 @@ class HttpResponse:
 
     @property
     def url(self):
-        if self.response:
+        if self.response is not None:
             return self.response.url
 
     @property
     def status(self):
-        if self.response:
+        if self.response is not None:
             return self.response.status_code
 
     @property
     def body(self):
-        if self.response:
+        if self.response is not None:
+            if self._body_file is not None and self.response._content is False:
+                self._body_file.seek(0)
             return self.response.content
 
+    @property
+    def body_file(self):
+        """
+        A file object of the body, which avoids loading the spooled body into memory.
+        """
+        if self._body_file is not None and self.response._content is False:
+            self._body_file.seek(0)
+            return self._body_file
+        return io.BytesIO(self.body or b'')
+
+    def close(self):
+        """
+        Close the spooled body, which is not available afterwards unless it has been loaded.
+        """
+        if self._body_file is not None:
+            self._body_file.close()
+            self._body_file = None
+
     @property
     def text(self):
         if self._encoding is None:
             encoding = get_encoding_from_content_type(self.response.headers.get("Content-Type"))
-            if not encoding and self.response.content:
-                encoding = get_encoding_from_content(self.response.content)
+            if not encoding and self.body:
+                encoding = get_encoding_from_content(self.body)
             encoding = encoding or 'utf-8'
             self._encoding = encoding
             self.response.encoding = encoding
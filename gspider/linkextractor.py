@@ -0,0 +1,141 @@
+# coding=utf-8
+
+import re
+from urllib.parse import urljoin, urlsplit
+
+try:
+    from lxml import etree
+except ImportError:
+    _no_lxml = True
+else:
+    _no_lxml = False
+
+from .http import HttpRequest
+from .utils import canonicalize_url
+
+
+def _compile_patterns(patterns):
+    if patterns is None:
+        return []
+    if isinstance(patterns, (str, type(re.compile('')))):
+        patterns = [patterns]
+    return [re.compile(p) if isinstance(p, str) else p for p in patterns]
+
+
+def _to_list(v):
+    if v is None:
+        return []
+    if isinstance(v, str):
+        return [v]
+    return list(v)
+
+
+def _make_url_joiner(base_url):
+    res = urlsplit(base_url)
+    origin = '{}://{}'.format(res.scheme, res.netloc)
+
+    # urljoin is much slower than parsing the page, so handle the common cases directly
+    def join(href):
+        if '/.' not in href:
+            if href.startswith(('http://', 'https://')):
+                return href
+            if href.startswith('/') and not href.startswith('//'):
+                return origin + href
+        return urljoin(base_url, href)
+
+    return join
+
+
+class LinkExtractor:
+    def __init__(self, allow=None, deny=None, allow_domains=None, deny_domains=None,
+                 tags=('a', 'area'), attrs=('href',), canonicalize=False, unique=True):
+        """
+        Extract links from HTML responses.
+
+        :param allow: regular expressions that the absolute URLs must match, any of them
+        :param deny: regular expressions that the absolute URLs must not match
+        :param allow_domains: domains (including their subdomains) that the links must belong to
+        :param deny_domains: domains (including their subdomains) that the links must not belong to
+        :param tags: tags to extract links from
+        :param attrs: attributes of the tags containing the links
+        :param canonicalize: canonicalize the URLs, otherwise only the fragments are removed
+        :param unique: remove duplicated links of the same page
+        """
+        if _no_lxml:
+            raise RuntimeError('Please run "pip install gspider[selector]" before to use link extractor')
+        self.allow = _compile_patterns(allow)
+        self.deny = _compile_patterns(deny)
+        self.allow_domains = {d.lower() for d in _to_list(allow_domains)}
+        self.deny_domains = {d.lower() for d in _to_list(deny_domains)}
+        self.tags = tuple(_to_list(tags))
+        self.attrs = tuple(_to_list(attrs))
+        self.canonicalize = canonicalize
+        self.unique = unique
+
+    def extract_links(self, response):
+        return self.extract_links_from_text(response.text, response.url)
+
+    def extract_requests(self, response, **kwargs):
+        """
+        Extract links and make requests, ``kwargs`` are passed to :class:`HttpRequest`.
+        """
+        return [HttpRequest(url, **kwargs) for url in self.extract_links(response)]
+
+    def extract_links_from_text(self, text, base_url):
+        if not text:
+            return []
+        root = etree.fromstring(text, parser=etree.HTMLParser())
+        if root is None:
+            return []
+        base = root.find('.//base[@href]')
+        if base is not None:
+            base_url = urljoin(base_url, base.get('href').strip())
+        join = _make_url_joiner(base_url)
+        links = []
+        seen = set()
+        for el in root.iter(*self.tags):
+            for attr in self.attrs:
+                href = el.get(attr)
+                if not href:
+                    continue
+                url = self._process_url(join(href.strip()))
+                if url is None:
+                    continue
+                if self.unique:
+                    if url in seen:
+                        continue
+                    seen.add(url)
+                links.append(url)
+        return links
+
+    def _process_url(self, url):
+        if not url.startswith(('http://', 'https://')):
+            return None
+        if self.canonicalize:
+            url = canonicalize_url(url)
+        else:
+            i = url.find('#')
+            if i >= 0:
+                url = url[:i]
+        if self.allow_domains or self.deny_domains:
+            host = urlsplit(url).hostname or ''
+            if self.allow_domains and not self._match_domain(host, self.allow_domains):
+                return None
+            if self.deny_domains and self._match_domain(host, self.deny_domains):
+                return None
+        if self.allow and not any(p.search(url) for p in self.allow):
+            return None
+        if self.deny and any(p.search(url) for p in self.deny):
+            return None
+        return url
+
+    @staticmethod
+    def _match_domain(host, domains):
+        if host in domains:
+            return True
+        i = host.find('.')
+        while i >= 0:
+            if host[i + 1:] in domains:
+                return True
+            i = host.find('.', i + 1)
+        return False
@@ -5,6 +5,8 @@ import logging
 from collections import deque
 from heapq import heappush, heappop
 
+from . import _patch
+
 from gevent.lock import Semaphore
 
 from .utils import cmp
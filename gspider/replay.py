@@ -0,0 +1,169 @@
+# coding=utf-8
+
+import zlib
+import json
+import struct
+import logging
+from datetime import timedelta
+
+from . import _patch
+
+import gevent
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+
+from .fetcher import Fetcher
+from .errors import ClientError, HttpError
+from .http import HttpRequest
+from .utils import request_fingerprint
+
+log = logging.getLogger(__name__)
+
+MAGIC = b'GSPA'
+VERSION = 2
+
+_LENGTH = struct.Struct('>I')
+# the size of the hex digest of SHA-1
+_FINGERPRINT_SIZE = 40
+
+
+class ArchiveWriter:
+    """
+    Append the request and response pairs to an archive.
+
+    The archive starts with the magic bytes and the version, followed by the records, each of which is the
+    length of the data, the fingerprint of the request, and the compressed data. The data is the length of the
+    JSON array of the method and URL of the request, and the status, URL, headers and elapsed time of the
+    response, followed by the array and the raw body, thus loading the records never executes code.
+    """
+
+    def __init__(self, path, compress_level=6):
+        self.path = path
+        self.compress_level = compress_level
+        self.count = 0
+        self._file = open(path, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(MAGIC + bytes((VERSION,)))
+
+    def write(self, request, response):
+        resp = response.response
+        elapsed = getattr(resp, 'elapsed', None)
+        meta = json.dumps([request.method, request.url, resp.status_code, resp.url, list(resp.headers.items()),
+                           None if elapsed is None else elapsed.total_seconds()],
+                          separators=(',', ':')).encode('utf-8')
+        data = zlib.compress(_LENGTH.pack(len(meta)) + meta + (response.body or b''), self.compress_level)
+        fp = request_fingerprint(request).encode('ascii')
+        self._file.write(_LENGTH.pack(len(data)) + fp + data)
+        self.count += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_archive(path):
+    """
+    Iterate the fingerprints of requests and the compressed data of the records in the archive.
+    """
+    with open(path, 'rb') as f:
+        header = f.read(len(MAGIC) + 1)
+        if header[:len(MAGIC)] != MAGIC or len(header) <= len(MAGIC):
+            raise ValueError('Not an archive of gspider: {}'.format(path))
+        if header[len(MAGIC)] != VERSION:
+            raise ValueError('Unsupported version of archive: {}'.format(header[len(MAGIC)]))
+        while True:
+            b = f.read(_LENGTH.size)
+            if len(b) < _LENGTH.size:
+                break
+            n, = _LENGTH.unpack(b)
+            fp = f.read(_FINGERPRINT_SIZE)
+            data = f.read(n)
+            if len(fp) < _FINGERPRINT_SIZE or len(data) < n:
+                log.warning('Archive %s is truncated', path)
+                break
+            yield fp.decode('ascii'), data
+
+
+def load_record(data):
+    """
+    Return the method and URL of the request, and the status, URL, headers, body and elapsed time of the response.
+    """
+    try:
+        data = zlib.decompress(data)
+        n, = _LENGTH.unpack_from(data)
+        meta = json.loads(data[_LENGTH.size:_LENGTH.size + n].decode('utf-8'))
+    except (zlib.error, struct.error, ValueError) as e:
+        raise ValueError('Invalid record of archive: {}'.format(e))
+    if not isinstance(meta, list) or len(meta) != 6:
+        raise ValueError('Invalid record of archive')
+    method, url, status, resp_url, headers, elapsed = meta
+    if not isinstance(status, int) or not isinstance(headers, list) \
+            or not all(isinstance(h, list) and len(h) == 2 for h in headers):
+        raise ValueError('Invalid record of archive')
+    return method, url, status, resp_url, headers, data[_LENGTH.size + n:], elapsed
+
+
+class ReplayFetcher(Fetcher):
+    """
+    Serve the responses recorded in the archive instead of making requests.
+
+    If a request was recorded several times, the responses are served in the recorded order, and the last one
+    is repeated. The responses are delayed by ``latency`` seconds, plus the recorded elapsed time if
+    ``recorded_latency`` is set. The requests not in the archive fail with ``ClientError``.
+    """
+
+    def __init__(self, archive=None, latency=0, recorded_latency=False, **kwargs):
+        super().__init__(**kwargs)
+        self.archive = archive
+        self.latency = latency
+        self.recorded_latency = recorded_latency
+        self._records = {}
+        self._served = {}
+        if archive is not None:
+            self.load(archive)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        config = crawler.config
+        archive = config.get('replay_file')
+        assert archive, 'replay file is not given'
+        kwargs = cls._kwargs_from_config(config)
+        latency = config.getfloat('replay_latency')
+        if latency is not None:
+            kwargs['latency'] = latency
+        kwargs['recorded_latency'] = config.getbool('replay_recorded_latency')
+        return cls(archive=archive, **kwargs)
+
+    def load(self, path):
+        n = 0
+        for fp, data in read_archive(path):
+            self._records.setdefault(fp, []).append(data)
+            n += 1
+        log.info('Loaded %s responses of %s requests from %s', n, len(self._records), path)
+
+    def fetch(self, request: HttpRequest):
+        fp = request_fingerprint(request)
+        records = self._records.get(fp)
+        if not records:
+            raise ClientError('Not found in archive: {}'.format(request))
+        i = self._served.get(fp, 0)
+        self._served[fp] = i + 1
+        _, _, status, url, headers, body, elapsed = load_record(records[min(i, len(records) - 1)])
+        delay = self.latency
+        if self.recorded_latency and elapsed is not None:
+            delay += elapsed
+        if delay > 0:
+            gevent.sleep(delay)
+        resp = Response()
+        resp.status_code = status
+        resp.url = url
+        resp.headers = CaseInsensitiveDict(headers)
+        resp._content = body
+        if elapsed is not None:
+            resp.elapsed = timedelta(seconds=elapsed)
+        if status >= 400:
+            raise HttpError('{}'.format(resp), response=self._make_response(resp, request))
+        self._check_content_type(resp)
+        self._check_content_length(resp)
+        return self._make_response(resp, request)
@@ -6,10 +6,17 @@ from os.path import join, isfile
 import sys
 import signal
 
+from . import _patch
+
+import gevent
+from gevent.queue import Queue
+from gevent.lock import Semaphore
+
 from .config import Config, DEFAULT_CONFIG
-from .crawler import CrawlerRunner, Crawler
+from .crawler import CrawlerRunner, MultiCrawlerRunner, Crawler
 from .utils import configure_logger, daemonize, load_config, iter_settings
 from .spider import RequestsSpider
+from .extensions.control import MultiControlServer
 
 log = logging.getLogger(__name__)
 
@@ -20,14 +27,11 @@ def run_spider(spider, **kwargs):
 
 
 def run_crawler(proj_dir=None, config=None):
-    _c = Config(DEFAULT_CONFIG)
-    _c.update(load_project_config(proj_dir))
-    _c.update(config)
-    config = _c
-
-    configure_logger('gspider', level=config.get('log_level'), file=config.get('log_file'))
+    config = _make_config(proj_dir, config)
     if config.getbool('daemon'):
         daemonize()
+    # the handlers may start threads which do not survive daemonizing
+    _configure_logger(config)
     pid_file = config.get('pid_file')
     _write_pid_file(pid_file)
     try:
@@ -36,7 +40,7 @@ def run_crawler(proj_dir=None, config=None):
         log.error('Failed to create crawler', exc_info=True)
         _remove_pid_file(pid_file)
         raise
-    default_signal_handlers = _set_signal_handlers(crawler_runner)
+    default_signal_handlers = _set_signal_handlers(crawler_runner, config)
     try:
         crawler_runner.run()
     finally:
@@ -44,7 +48,58 @@ def run_crawler(proj_dir=None, config=None):
         _recover_signal_handlers(default_signal_handlers)
 
 
-def make_requests(requests, **kwargs):
+def run_spiders(spiders, **kwargs):
+    """
+    Run multiple spiders in one process, sharing the fetcher and the workers.
+
+    Each item of ``spiders`` is a spider class, or a dict of the config of a spider in which ``spider`` is the
+    spider class, e.g. ``{'spider': NewsSpider, 'spider_weight': 2}``. ``kwargs`` is the config shared by all
+    the spiders. The fetcher is shared, thus the settings of the fetcher should be given in ``kwargs``.
+    The control socket is shared as well, and the stats of each spider are reported by its ``status`` command.
+    Return the stats of each spider when the spiders are finished.
+    """
+    config = _make_config(None, kwargs)
+    _configure_logger(config)
+    crawlers = []
+    fetcher = None
+    for s in spiders:
+        c = dict(kwargs)
+        if isinstance(s, dict):
+            c.update(s)
+        else:
+            c['spider'] = s
+        # the control socket is bound by the runner
+        c['control_socket'] = None
+        crawler = Crawler(_make_config(None, c), fetcher=fetcher)
+        fetcher = crawler.fetcher
+        crawlers.append(crawler)
+    crawler_runner = MultiCrawlerRunner(crawlers, max_workers=config.getint('max_workers'))
+    control_server = None
+    control_socket = config.get('control_socket')
+    if control_socket:
+        control_server = MultiControlServer(crawler_runner, control_socket)
+        control_server.open()
+    default_signal_handlers = _set_signal_handlers(crawler_runner, config)
+    try:
+        crawler_runner.run()
+    finally:
+        _recover_signal_handlers(default_signal_handlers)
+        if control_server is not None:
+            control_server.close()
+    return crawler_runner.get_stats()
+
+
+def make_requests(requests, callback=None, **kwargs):
+    """
+    Make requests and return the results in order, each result is an HttpResponse or an exception.
+
+    If ``callback`` is given, it is called with ``(index, result)`` as soon as each request completes
+    instead of collecting the results.
+    """
+    if callback is not None:
+        for index, result in iter_requests(requests, **kwargs):
+            callback(index, result)
+        return
     if 'log_level' not in kwargs:
         kwargs['log_level'] = 'WARNING'
     start_requests = [r for r in requests]
@@ -53,6 +108,47 @@ def make_requests(requests, **kwargs):
     return results
 
 
+def iter_requests(requests, max_pending=None, **kwargs):
+    """
+    Make requests and yield ``(index, result)`` in order of completion.
+
+    At most ``max_pending`` requests are in flight or waiting to be consumed, which defaults to twice
+    the maximum number of workers, so that memory usage is bounded no matter how many requests are given.
+    """
+    if 'log_level' not in kwargs:
+        kwargs['log_level'] = 'WARNING'
+    config = _make_config(None, kwargs)
+    if max_pending is None:
+        max_pending = 2 * config.getint('max_workers')
+    assert max_pending > 0, 'max pending should > 0'
+    results = Queue()
+    semaphore = Semaphore(max_pending)
+    config['spider'] = RequestsSpider
+    config['start_requests'] = requests
+    config['request_semaphore'] = semaphore
+    config['result_callback'] = lambda index, result: results.put((index, result))
+    _configure_logger(config)
+    crawler_runner = CrawlerRunner(Crawler(config))
+
+    def _run():
+        try:
+            crawler_runner.run()
+        finally:
+            results.put(StopIteration)
+
+    g = gevent.spawn(_run)
+    try:
+        while True:
+            item = results.get()
+            if item is StopIteration:
+                break
+            semaphore.release()
+            yield item
+    finally:
+        crawler_runner.stop()
+        g.join()
+
+
 def load_project_config(proj_dir):
     if proj_dir is not None and proj_dir not in sys.path:
         # add project path
@@ -67,6 +163,18 @@ def load_project_config(proj_dir):
     return config
 
 
+def _make_config(proj_dir, config):
+    c = Config(DEFAULT_CONFIG)
+    c.update(load_project_config(proj_dir))
+    c.update(config)
+    return c
+
+
+def _configure_logger(config):
+    configure_logger('gspider', level=config.get('log_level'), file=config.get('log_file'),
+                     buffered=config.getbool('log_buffered'), json_format=config.getbool('log_json'))
+
+
 def _write_pid_file(pid_file):
     if pid_file is not None:
         with open(pid_file, 'w') as f:
@@ -81,15 +189,30 @@ def _remove_pid_file(pid_file):
             log.error('Cannot remove PID file %s: %s', pid_file, e)
 
 
-def _set_signal_handlers(crawler):
+def _set_signal_handlers(crawler, config):
     def _exit(signum, frame):
         log.info('Received exit signal: %s', signum)
         crawler.stop()
 
+    def _resize(signum, frame):
+        n = crawler.num_workers
+        step = config.getint('resize_step') or max(1, n // 10)
+        if signum == signal.SIGUSR1:
+            n += step
+        else:
+            n = max(1, n - step)
+        log.info('Received resize signal: %s', signum)
+        crawler.resize(n)
+
     default_signal_handlers = [(signal.SIGINT, signal.getsignal(signal.SIGINT)),
                                (signal.SIGTERM, signal.getsignal(signal.SIGTERM))]
     signal.signal(signal.SIGINT, _exit)
     signal.signal(signal.SIGTERM, _exit)
+    # SIGUSR1 adds workers and SIGUSR2 removes workers
+    if hasattr(signal, 'SIGUSR1'):
+        for signum in (signal.SIGUSR1, signal.SIGUSR2):
+            default_signal_handlers.append((signum, signal.getsignal(signum)))
+            signal.signal(signum, _resize)
     return default_signal_handlers
 
 
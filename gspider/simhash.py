@@ -0,0 +1,104 @@
+# coding=utf-8
+
+import re
+from hashlib import blake2b
+from collections import deque
+
+_TAG_RE = re.compile(r'<(script|style)\b.*?</\1\s*>|<!--.*?-->|<[^>]*>', re.I | re.S)
+_WORD_RE = re.compile(r'\w+')
+
+# the tables mapping each byte to one of its bits
+_BIT_TABLES = [bytes((b >> j) & 1 for b in range(256)) for j in range(8)]
+
+
+def html_to_text(html):
+    """
+    Strip the tags, scripts, styles and comments of HTML.
+    """
+    return _TAG_RE.sub(' ', html)
+
+
+def shingles(text, size=4):
+    """
+    The overlapping sequences of ``size`` words in the text.
+    """
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= size:
+        return [' '.join(words)] if words else []
+    return [' '.join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+
+def simhash(features):
+    """
+    Compute the 64-bit SimHash of the features, the similar sets of features have fingerprints differing in
+    only a few bits.
+    """
+    data = b''.join(blake2b(f.encode('utf-8'), digest_size=8).digest() for f in features)
+    n = len(data) // 8
+    if n == 0:
+        return 0
+    fp = 0
+    # count the set bits of each position at once
+    for k in range(8):
+        column = data[k::8]
+        for j in range(8):
+            if column.translate(_BIT_TABLES[j]).count(1) * 2 > n:
+                fp |= 1 << ((7 - k) * 8 + j)
+    return fp
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+class SimHashIndex:
+    """
+    Find the fingerprints within ``max_distance`` bits from a fingerprint.
+
+    The fingerprints are split into ``max_distance + 1`` blocks, two fingerprints within the distance must have
+    at least one identical block, thus only the fingerprints sharing a block are compared. The oldest
+    fingerprints are removed if there are more than ``max_size``.
+    """
+
+    def __init__(self, max_distance=3, max_size=None, bits=64):
+        self.max_distance = max_distance
+        self.max_size = max_size
+        n = max_distance + 1
+        assert n <= bits, 'max distance should < bits'
+        self._blocks = []
+        start = 0
+        for i in range(n):
+            width = bits // n + (1 if i < bits % n else 0)
+            self._blocks.append((start, (1 << width) - 1))
+            start += width
+        self._tables = [{} for _ in range(n)]
+        self._fingerprints = deque()
+
+    def __len__(self):
+        return len(self._fingerprints)
+
+    def find(self, fp):
+        """
+        Return a fingerprint within the distance, or None.
+        """
+        for (shift, mask), table in zip(self._blocks, self._tables):
+            candidates = table.get((fp >> shift) & mask)
+            if candidates:
+                for c in candidates:
+                    if hamming_distance(fp, c) <= self.max_distance:
+                        return c
+
+    def add(self, fp):
+        for (shift, mask), table in zip(self._blocks, self._tables):
+            table.setdefault((fp >> shift) & mask, []).append(fp)
+        self._fingerprints.append(fp)
+        if self.max_size is not None and len(self._fingerprints) > self.max_size:
+            self._remove(self._fingerprints.popleft())
+
+    def _remove(self, fp):
+        for (shift, mask), table in zip(self._blocks, self._tables):
+            key = (fp >> shift) & mask
+            candidates = table[key]
+            candidates.remove(fp)
+            if not candidates:
+                del table[key]
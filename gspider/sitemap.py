@@ -0,0 +1,134 @@
+# coding=utf-8
+
+import re
+import gzip
+import logging
+from datetime import datetime, timedelta, timezone
+
+try:
+    from lxml import etree
+except ImportError:
+    _no_lxml = True
+else:
+    _no_lxml = False
+
+from .http import HttpRequest
+from .spider import Spider
+
+log = logging.getLogger(__name__)
+
+_w3c_datetime = re.compile(r'^(\d{4})(?:-(\d{2})(?:-(\d{2})'
+                           r'(?:[T ](\d{2}):(\d{2})(?::(\d{2})(?:\.\d+)?)?\s*(Z|[+-]\d{2}:?\d{2})?)?)?)?$')
+
+
+def parse_w3c_datetime(s):
+    """
+    Parse a W3C datetime, e.g. ``2020-03-20`` or ``2020-03-20T08:00:00+08:00``, return the naive UTC datetime.
+    """
+    m = _w3c_datetime.match(s.strip())
+    if m is None:
+        return None
+    year, month, day, hour, minute, second, tz = m.groups()
+    dt = datetime(int(year), int(month or 1), int(day or 1), int(hour or 0), int(minute or 0), int(second or 0))
+    if tz and tz != 'Z':
+        sign = -1 if tz[0] == '-' else 1
+        tz = tz[1:].replace(':', '')
+        dt -= sign * timedelta(hours=int(tz[:2]), minutes=int(tz[2:]))
+    return dt
+
+
+def iter_sitemap(fileobj):
+    """
+    Parse a sitemap or sitemap index incrementally, yield ``(type, loc, lastmod)`` where type is ``url`` or
+    ``sitemap``.
+    """
+    if _no_lxml:
+        raise RuntimeError('Please run "pip install gspider[selector]" before to use sitemap')
+    head = fileobj.read(2)
+    fileobj.seek(0)
+    if head == b'\x1f\x8b':
+        fileobj = gzip.GzipFile(fileobj=fileobj)
+    for _, el in etree.iterparse(fileobj, events=('end',), tag=('{*}url', '{*}sitemap'),
+                                 resolve_entities=False, no_network=True, recover=True):
+        loc = lastmod = None
+        for child in el:
+            if not isinstance(child.tag, str):
+                continue
+            name = child.tag.rsplit('}', 1)[-1]
+            if name == 'loc':
+                loc = (child.text or '').strip()
+            elif name == 'lastmod':
+                lastmod = (child.text or '').strip()
+        kind = el.tag.rsplit('}', 1)[-1]
+        # release the parsed elements so that the memory usage does not grow with the size of sitemap
+        el.clear()
+        parent = el.getparent()
+        if parent is not None:
+            while el.getprevious() is not None:
+                del parent[0]
+        if loc:
+            yield kind, loc, lastmod
+
+
+class SitemapSpider(Spider):
+    """
+    Crawl the URLs of sitemaps.
+
+    ``sitemap_urls`` are the URLs of sitemaps, sitemap indexes or robots.txt files.
+    ``sitemap_rules`` is a list of ``(regex, callback)``, a URL is handled by the callback of the first
+    matching rule.
+    ``sitemap_follow`` is a list of regular expressions of the sitemaps in sitemap indexes to follow.
+    ``sitemap_lastmod_after`` is a datetime or W3C datetime string, URLs not modified since then are skipped.
+    ``sitemap_spool_body_size`` is the size in bytes beyond which the body of a sitemap is spooled to a temporary
+    file rather than kept in memory, ``None`` keeps the ``spool_body_size`` of the fetcher.
+
+    The URLs are parsed incrementally from the spooled body and scheduled as soon as they are parsed, thus the
+    memory usage does not grow with the size of sitemaps.
+    """
+
+    sitemap_urls = ()
+    sitemap_rules = [('', 'parse')]
+    sitemap_follow = ['']
+    sitemap_lastmod_after = None
+    sitemap_spool_body_size = 1024 * 1024
+
+    def start_requests(self):
+        for url in self.sitemap_urls:
+            yield self._sitemap_request(url)
+
+    def parse_sitemap(self, response):
+        if response.url.endswith('/robots.txt'):
+            for line in response.text.splitlines():
+                if line.lower().startswith('sitemap:'):
+                    yield self._sitemap_request(line.split(':', 1)[1].strip())
+            return
+        rules = [(re.compile(r), c) for r, c in self.sitemap_rules]
+        follow = [re.compile(r) for r in self.sitemap_follow]
+        lastmod_after = self._lastmod_after()
+        for kind, loc, lastmod in iter_sitemap(response.body_file):
+            if lastmod_after is not None and lastmod:
+                dt = parse_w3c_datetime(lastmod)
+                if dt is not None and dt <= lastmod_after:
+                    continue
+            if kind == 'sitemap':
+                if any(r.search(loc) for r in follow):
+                    yield self._sitemap_request(loc)
+            else:
+                for r, c in rules:
+                    if r.search(loc):
+                        yield HttpRequest(loc, callback=c)
+                        break
+
+    def _sitemap_request(self, url):
+        meta = None
+        if self.sitemap_spool_body_size is not None:
+            meta = {'spool_body_size': self.sitemap_spool_body_size}
+        return HttpRequest(url, callback=self.parse_sitemap, meta=meta)
+
+    def _lastmod_after(self):
+        t = self.sitemap_lastmod_after
+        if isinstance(t, str):
+            return parse_w3c_datetime(t)
+        if isinstance(t, datetime) and t.tzinfo is not None:
+            return t.astimezone(timezone.utc).replace(tzinfo=None)
+        return t
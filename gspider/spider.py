@@ -4,7 +4,8 @@ import logging
 from abc import ABCMeta, abstractmethod
 
 from . import events
-from .http import HttpRequest
+from .http import HttpRequest, HttpResponse
+from .errors import HttpError
 
 log = logging.getLogger(__name__)
 
@@ -16,6 +17,9 @@ class Spider(metaclass=ABCMeta):
         cls.crawler = crawler
         cls.config = crawler.config
         spider = cls()
+        # the same spider class may be run by several crawlers
+        spider.crawler = crawler
+        spider.config = crawler.config
         crawler.event_bus.subscribe(spider.open, events.crawler_start)
         crawler.event_bus.subscribe(spider.close, events.crawler_shutdown)
         return spider
@@ -67,6 +71,7 @@ class Spider(metaclass=ABCMeta):
 class RequestsSpider(Spider):
     def start_requests(self):
         requests = self.config.get('start_requests')
+        semaphore = self.config.get('request_semaphore')
         i = 0
         for r in requests:
             if isinstance(r, str):
@@ -76,15 +81,50 @@ class RequestsSpider(Spider):
                 r.dont_filter = True
                 r.callback = self.parse
                 r.errback = self.handle_error
+                if semaphore is not None:
+                    semaphore.acquire()
                 yield r
             else:
                 self.logger.warning('Requests must be str or HttpRequest, got %s', type(r).__name__)
             i += 1
 
     def parse(self, response):
-        results = self.config.get('results')
-        results[response.meta['request_index']] = response
+        self._set_result(response.meta['request_index'], response)
 
     def handle_error(self, request, err):
-        results = self.config.get('results')
-        results[request.meta['request_index']] = err
+        self._set_result(request.meta['request_index'], err)
+
+    def _set_result(self, index, result):
+        _load_body(result)
+        callback = self.config.get('result_callback')
+        if callback is not None:
+            callback(index, result)
+        else:
+            results = self.config.get('results')
+            results[index] = result
+
+
+class ClientSpider(Spider):
+    def start_requests(self):
+        request_feed = self.config.get('request_feed')
+        while True:
+            r = request_feed.get()
+            if r is None:
+                break
+            yield r
+
+    def parse(self, response):
+        _load_body(response)
+        self.config.get('result_callback')(response.request, response)
+
+    def handle_error(self, request, err):
+        _load_body(err)
+        self.config.get('result_callback')(request, err)
+
+
+def _load_body(result):
+    # the results outlive the spooled bodies which are closed once the responses are handled
+    if isinstance(result, HttpError):
+        result = result.response
+    if isinstance(result, HttpResponse):
+        result.body
@@ -0,0 +1,135 @@
+# coding=utf-8
+
+import json
+import time
+import random
+import logging
+
+from . import events
+from .errors import NotEnabled
+
+log = logging.getLogger(__name__)
+
+# stage name, start stamp, end stamp
+STAGES = (
+    ('queue', 'enqueue', 'dequeue'),
+    ('request_hooks', 'dequeue', 'fetch_start'),
+    ('fetch', 'fetch_start', 'fetch_end'),
+    ('response_hooks', 'fetch_end', 'parse_start'),
+    ('parse', 'parse_start', 'parse_end'),
+    ('total', 'enqueue', 'finish'),
+)
+
+
+class StageStats:
+    def __init__(self, max_samples=10000):
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.max_samples = max_samples
+        self._samples = []
+
+    def add(self, value):
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+        # reservoir sampling keeps the percentiles unbiased with bounded memory
+        if len(self._samples) < self.max_samples:
+            self._samples.append(value)
+        else:
+            i = random.randrange(self.count)
+            if i < self.max_samples:
+                self._samples[i] = value
+
+    def percentile(self, p):
+        if not self._samples:
+            return 0.0
+        samples = sorted(self._samples)
+        return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'mean': self.sum / self.count if self.count else 0.0,
+            'p50': self.percentile(0.5),
+            'p90': self.percentile(0.9),
+            'p99': self.percentile(0.99),
+            'max': self.max,
+        }
+
+
+class RequestTracer:
+    def __init__(self, trace_file, sample_rate=0.01, max_traces=1000):
+        self.trace_file = trace_file
+        self.sample_rate = sample_rate
+        self.max_traces = max_traces
+        self.stages = {name: StageStats() for name, _, _ in STAGES}
+        self.traces = []
+        self._stamps = {}
+
+    def __repr__(self):
+        cls_name = self.__class__.__name__
+        return '{}(trace_file={}, sample_rate={})'.format(cls_name, repr(self.trace_file), repr(self.sample_rate))
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        config = crawler.config
+        trace_file = config.get('trace_file')
+        if not trace_file:
+            raise NotEnabled
+        kwargs = {}
+        sample_rate = config.getfloat('trace_sample_rate')
+        if sample_rate is not None:
+            kwargs['sample_rate'] = sample_rate
+        max_traces = config.getint('trace_max_traces')
+        if max_traces is not None:
+            kwargs['max_traces'] = max_traces
+        obj = cls(trace_file, **kwargs)
+        crawler.event_bus.subscribe(obj.close, events.crawler_shutdown)
+        return obj
+
+    def stamp(self, request, name):
+        stamps = self._stamps.get(request)
+        if stamps is None:
+            stamps = self._stamps[request] = {}
+        stamps[name] = time.perf_counter()
+
+    def finish(self, request):
+        stamps = self._stamps.pop(request, None)
+        if stamps is None:
+            return
+        stamps['finish'] = time.perf_counter()
+        for name, start, end in STAGES:
+            if start in stamps and end in stamps:
+                self.stages[name].add(stamps[end] - stamps[start])
+        if len(self.traces) < self.max_traces and random.random() < self.sample_rate:
+            self.traces.append(self._make_trace(request, stamps))
+
+    @staticmethod
+    def _make_trace(request, stamps):
+        t0 = min(stamps.values())
+        return {
+            'method': request.method,
+            'url': request.url,
+            'start_time': time.time() - (time.perf_counter() - t0),
+            'stamps': {k: v - t0 for k, v in sorted(stamps.items(), key=lambda x: x[1])},
+        }
+
+    def report(self):
+        return {
+            'stages': {name: self.stages[name].to_dict() for name, _, _ in STAGES},
+            'traces': self.traces,
+        }
+
+    def close(self):
+        report = self.report()
+        for name, _, _ in STAGES:
+            s = report['stages'][name]
+            log.info('Stage %s: count=%s, mean=%.3fs, p50=%.3fs, p99=%.3fs, max=%.3fs',
+                     name, s['count'], s['mean'], s['p50'], s['p99'], s['max'])
+        try:
+            with open(self.trace_file, 'w') as f:
+                json.dump(report, f, indent=2)
+        except Exception:
+            log.error('Failed to write traces to %s', self.trace_file, exc_info=True)
@@ -1,14 +1,17 @@
 # coding=utf-8
 
 import os
+import json
 import hashlib
 import logging
+from collections import deque
 from importlib import import_module
 from os.path import isfile
 import re
-import cgi
 
-from urllib.parse import urlsplit, parse_qsl, urlencode
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from .canonicalize import normalize_netloc, normalize_query
 
 
 def load_object(path):
@@ -23,30 +26,153 @@ def load_object(path):
 default_log_level = 'info'
 default_log_format = '%(asctime)s %(name)s [%(levelname)s] %(message)s'
 default_log_date_format = '[%Y-%m-%d %H:%M:%S %z]'
+default_json_log_date_format = '%Y-%m-%dT%H:%M:%S%z'
 
 
-def configure_logger(name, level=None, format=None, date_format=None, file=None):
+def configure_logger(name, level=None, format=None, date_format=None, file=None, buffered=False,
+                     json_format=False):
     if level is None:
         level = default_log_level
     if format is None:
         format = default_log_format
     if date_format is None:
-        date_format = default_log_date_format
+        date_format = default_json_log_date_format if json_format else default_log_date_format
 
     level = level.upper()
     logger = logging.getLogger(name)
     logger.setLevel(level)
-    if file:
+    if buffered:
+        if file:
+            handler = BufferedStreamHandler(open(file, 'a', encoding='utf-8'), close_stream=True)
+        else:
+            handler = BufferedStreamHandler()
+    elif file:
         handler = logging.FileHandler(file)
     else:
         handler = logging.StreamHandler()
-    formatter = logging.Formatter(format, date_format)
+    if json_format:
+        formatter = JsonFormatter(datefmt=date_format)
+    else:
+        formatter = logging.Formatter(format, date_format)
     handler.setFormatter(formatter)
+    for h in logger.handlers:
+        h.close()
     logger.handlers.clear()
     logger.addHandler(handler)
     return logger
 
 
+class BufferedStreamHandler(logging.StreamHandler):
+    """
+    Buffer log records and write them in batches from a native thread, so that the gevent hub is not blocked
+    by I/O and formatting.
+
+    The writer thread is started on the first record emitted in the current process, so the handler keeps
+    working after ``os.fork()``. If more than ``max_buffer_size`` records are waiting, the oldest are dropped,
+    and the number of dropped records is written with the next batch.
+    """
+
+    def __init__(self, stream=None, flush_interval=0.1, max_buffer_size=100000, close_stream=False):
+        super().__init__(stream)
+        # use the original thread and lock, which are not affected by monkey patching
+        from gevent.monkey import get_original
+
+        self.flush_interval = flush_interval
+        self.max_buffer_size = max_buffer_size
+        self.close_stream = close_stream
+        self.dropped = 0
+        self._reported_dropped = 0
+        self._buffer = deque(maxlen=max_buffer_size)
+        self._allocate_lock = get_original('_thread', 'allocate_lock')
+        self._start_new_thread = get_original('_thread', 'start_new_thread')
+        self._write_lock = self._allocate_lock()
+        self._sleep = get_original('time', 'sleep')
+        self._closed = False
+        self._pid = None
+
+    def emit(self, record):
+        if self._pid != os.getpid():
+            self._start()
+        # the traceback may not be available later, other arguments are formatted in the background
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        if len(self._buffer) >= self.max_buffer_size:
+            self.dropped += 1
+        self._buffer.append(record)
+
+    def flush(self):
+        self._write()
+
+    def close(self):
+        self._closed = True
+        with self._write_lock:
+            self._write_buffer()
+            if self.close_stream and self.stream is not None:
+                self.stream.close()
+            self.stream = None
+        logging.Handler.close(self)
+
+    def _start(self):
+        # the writer thread and the lock held by it do not survive fork
+        self._pid = os.getpid()
+        self._write_lock = self._allocate_lock()
+        self._start_new_thread(self._run, ())
+
+    def _run(self):
+        pid = self._pid
+        while not self._closed and self._pid == pid:
+            self._sleep(self.flush_interval)
+            self._write()
+
+    def _write(self):
+        with self._write_lock:
+            self._write_buffer()
+
+    def _write_buffer(self):
+        if self.stream is None:
+            return
+        msgs = []
+        record = None
+        dropped = self.dropped - self._reported_dropped
+        if dropped > 0:
+            self._reported_dropped += dropped
+            record = logging.LogRecord('gspider', logging.WARNING, __file__, 0,
+                                       'Dropped %s log records since the log buffer is full', (dropped,), None)
+            msgs.append(self.format(record) + self.terminator)
+        if not self._buffer and not msgs:
+            return
+        while self._buffer:
+            record = self._buffer.popleft()
+            try:
+                msgs.append(self.format(record) + self.terminator)
+            except Exception:
+                self.handleError(record)
+        try:
+            self.stream.write(''.join(msgs))
+            self.stream.flush()
+        except Exception:
+            self.handleError(record)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        d = {
+            'time': self.formatTime(record, self.datefmt),
+            'name': record.name,
+            'level': record.levelname,
+            'message': record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            d['exc_info'] = record.exc_text
+        if record.stack_info:
+            d['stack_info'] = self.formatStack(record.stack_info)
+        return json.dumps(d, ensure_ascii=False)
+
+
 def to_bytes(data, encoding=None):
     if isinstance(data, bytes):
         return data
@@ -123,8 +249,23 @@ def request_fingerprint(request):
     return sha1.hexdigest()
 
 
+def canonicalize_url(url, keep_fragment=False):
+    """
+    Lowercase the scheme and host, remove the default port, sort the query and remove the fragment.
+    """
+    res = urlsplit(url)
+    path = res.path or '/'
+    query = res.query
+    if query:
+        query = normalize_query(query)
+    fragment = res.fragment if keep_fragment else ''
+    return urlunsplit((res.scheme.lower(), normalize_netloc(res), path, query, fragment))
+
+
 def get_encoding_from_content_type(content_type):
     if content_type:
+        import cgi
+
         content_type, params = cgi.parse_header(content_type)
         if "charset" in params:
             return params["charset"]
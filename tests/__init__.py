@@ -1 +1,5 @@
 # coding=utf-8
+
+# gspider patches the standard library when the crawler is imported, thus the patch is applied before the tests
+# import requests
+from gspider import _patch  # noqa
@@ -0,0 +1,50 @@
+# coding=utf-8
+
+import gevent
+from requests.models import Response
+
+from gspider.http import HttpResponse
+from gspider.extension import Extension
+from gspider.errors import IgnoreRequest, StopCrawler, ClientError
+
+
+class LocalResponseMiddleware(Extension):
+    """
+    Respond to the requests locally with the last segment of the path as the body.
+
+    The responses are delayed by ``local_response_delay`` seconds, or by the milliseconds given by the path if it
+    is ``'path'``. The paths ``ignore``, ``stop`` and ``error`` raise ``IgnoreRequest``, ``StopCrawler`` and
+    ``ClientError``. If ``fetched`` is given, ``(name, url)`` of the requests are appended to it.
+    """
+
+    def __init__(self, delay=0, fetched=None, name=None):
+        self.delay = delay
+        self.fetched = fetched
+        self.name = name
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        config = crawler.config
+        return cls(delay=config.get('local_response_delay', 0), fetched=config.get('fetched'),
+                   name=config.get('name'))
+
+    def handle_request(self, request):
+        if self.fetched is not None:
+            self.fetched.append((self.name, request.url))
+        name = request.url.rsplit('/', 1)[-1]
+        if name == 'ignore':
+            raise IgnoreRequest('ignored')
+        if name == 'stop':
+            gevent.sleep(0.01)
+            raise StopCrawler
+        if name == 'error':
+            raise ClientError('failed')
+        if self.delay == 'path':
+            gevent.sleep(int(name) / 1000)
+        elif self.delay:
+            gevent.sleep(self.delay)
+        resp = Response()
+        resp.status_code = 200
+        resp.url = request.url
+        resp._content = name.encode()
+        return HttpResponse(request=request, response=resp)
@@ -0,0 +1,14 @@
+# coding=utf-8
+
+from gspider.bench import run_bench, format_report
+
+
+def test_run_bench():
+    report = run_bench(pages=100, links=5, page_size=1024, max_workers=10)
+    assert report['pages'] == 100
+    assert report['responses'] == 100
+    assert report['errors'] == 0
+    assert report['requests_per_second'] > 0
+    assert 0 < report['latency_p50'] <= report['latency_p99']
+    assert report['peak_rss'] > 0
+    assert 'Responses:      100 / 100 pages (0 errors)' in format_report(report)
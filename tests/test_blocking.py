@@ -0,0 +1,39 @@
+# coding=utf-8
+
+import time
+import logging
+
+from gspider.spider import Spider
+from gspider.http import HttpRequest
+from gspider.run import run_spider
+
+from .helpers import LocalResponseMiddleware
+
+
+class BlockingSpider(Spider):
+    def start_requests(self):
+        yield HttpRequest('http://localhost/')
+
+    def parse(self, response):
+        self.block(0.3)
+
+    @staticmethod
+    def block(seconds):
+        t = time.perf_counter() + seconds
+        while time.perf_counter() < t:
+            pass
+
+
+def test_blocking_monitor(caplog):
+    with caplog.at_level(logging.WARNING, logger='gspider.extensions.blocking'):
+        run_spider(BlockingSpider, max_blocking_time=0.05, extensions=[LocalResponseMiddleware],
+                   log_level='WARNING')
+    records = [r for r in caplog.records if r.name == 'gspider.extensions.blocking']
+    blocked = [r for r in records if r.getMessage().startswith('The event loop was blocked for')]
+    assert len(blocked) == 1
+    msg = blocked[0].getMessage()
+    assert 'by BlockingSpider.parse' in msg
+    # the stack of the hub is sampled while it is blocked
+    assert 'in block' in msg
+    assert float(msg.split('blocked for ', 1)[1].split('s', 1)[0]) >= 0.2
+    assert any(r.getMessage().startswith('Blocked by BlockingSpider.parse: 1 times') for r in records)
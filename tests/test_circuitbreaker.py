@@ -0,0 +1,63 @@
+# coding=utf-8
+
+import time
+
+import pytest
+
+from gspider.http import HttpRequest, HttpResponse
+from gspider.errors import ClientError, IgnoreRequest, DeferRequest
+from gspider.extensions.circuitbreaker import CircuitBreakerMiddleware
+
+
+def fail(cb, url):
+    req = HttpRequest(url)
+    cb.handle_request(req)
+    cb.handle_error(req, ClientError('Connection refused'))
+
+
+def test_open_circuit():
+    cb = CircuitBreakerMiddleware(failure_threshold=3, recovery_time=60)
+    for _ in range(3):
+        assert cb.get_state('example.com') == 'closed'
+        fail(cb, 'http://example.com/')
+    assert cb.get_state('example.com') == 'open'
+    with pytest.raises(IgnoreRequest):
+        cb.handle_request(HttpRequest('http://example.com/a'))
+    assert cb.handle_request(HttpRequest('http://example.org/')) is None
+
+
+def test_success_resets_failures():
+    cb = CircuitBreakerMiddleware(failure_threshold=2)
+    fail(cb, 'http://example.com/')
+    req = HttpRequest('http://example.com/')
+    cb.handle_response(req, HttpResponse(request=req))
+    fail(cb, 'http://example.com/')
+    assert cb.get_state('example.com') == 'closed'
+
+
+def test_half_open():
+    cb = CircuitBreakerMiddleware(failure_threshold=1, recovery_time=0.05, max_probes=1)
+    fail(cb, 'http://example.com/')
+    time.sleep(0.06)
+    assert cb.get_state('example.com') == 'half-open'
+    probe = HttpRequest('http://example.com/probe')
+    cb.handle_request(probe)
+    with pytest.raises(IgnoreRequest):
+        cb.handle_request(HttpRequest('http://example.com/'))
+    # the probe fails, so the circuit is opened for a longer time
+    cb.handle_error(probe, ClientError('Timeout'))
+    assert cb.get_state('example.com') == 'open'
+    time.sleep(0.11)
+    probe = HttpRequest('http://example.com/probe')
+    cb.handle_request(probe)
+    cb.handle_response(probe, HttpResponse(request=probe))
+    assert cb.get_state('example.com') == 'closed'
+    assert cb.handle_request(HttpRequest('http://example.com/')) is None
+
+
+def test_park_requests():
+    cb = CircuitBreakerMiddleware(failure_threshold=1, recovery_time=30, park=True)
+    fail(cb, 'http://example.com/')
+    with pytest.raises(DeferRequest) as e:
+        cb.handle_request(HttpRequest('http://example.com/'))
+    assert 29 < e.value.delay <= 30
@@ -0,0 +1,61 @@
+# coding=utf-8
+
+import json
+
+import gevent
+
+from gspider.errors import IgnoreRequest, StopCrawler
+from gspider.client import Client
+
+from .helpers import LocalResponseMiddleware
+
+
+def test_client_batches():
+    with Client(max_workers=4, extensions=[LocalResponseMiddleware], local_response_delay='path') as client:
+        results = client.make_requests(['http://localhost/20', 'http://localhost/ignore', 'http://localhost/0'])
+        assert results[0].body == b'20' and results[2].body == b'0'
+        assert isinstance(results[1], IgnoreRequest)
+        # the meta keeps plain values
+        assert json.loads(json.dumps(results[0].request.to_dict()))['meta']['request_batch'] == 0
+
+        # concurrent batches
+        def run_batch(n):
+            return list(client.iter_requests(['http://localhost/{}'.format(i % 5) for i in range(n)],
+                                             max_pending=3))
+
+        a = gevent.spawn(run_batch, 30)
+        b = gevent.spawn(run_batch, 20)
+        gevent.joinall([a, b], raise_error=True)
+        assert sorted(i for i, _ in a.value) == list(range(30))
+        assert sorted(i for i, _ in b.value) == list(range(20))
+        assert all(r.body == str(i % 5).encode() for i, r in a.value + b.value)
+    assert not client._batches
+
+
+def test_client_stopped_by_crawler():
+    client = Client(max_workers=2, extensions=[LocalResponseMiddleware], local_response_delay='path')
+    with gevent.Timeout(5):
+        results = list(client.iter_requests(['http://localhost/0', 'http://localhost/stop', 'http://localhost/100',
+                                             'http://localhost/100', 'http://localhost/100'], max_pending=2))
+    assert results[0][0] == 0 and results[0][1].body == b'0'
+    # the requests fed to the crawler are failed, the rest are not made
+    assert [i for i, _ in results[1:]] == [1, 2]
+    assert all(isinstance(r, StopCrawler) for _, r in results[1:])
+    try:
+        client.make_requests(['http://localhost/0'])
+    except RuntimeError:
+        pass
+    else:
+        assert False, 'the crawler is stopped'
+    client.close()
+
+
+def test_close_client_while_iterating():
+    client = Client(max_workers=2, extensions=[LocalResponseMiddleware], local_response_delay='path')
+    it = client.iter_requests(['http://localhost/0'] + ['http://localhost/1000'] * 3)
+    assert next(it)[0] == 0
+    gevent.spawn_later(0.01, client.close)
+    with gevent.Timeout(5):
+        rest = list(it)
+    assert [i for i, _ in rest] == [1, 2, 3]
+    assert all(isinstance(r, StopCrawler) for _, r in rest)
@@ -0,0 +1,127 @@
+# coding=utf-8
+
+import zlib
+import pickle
+import marshal
+
+import pytest
+
+from gspider.http import HttpRequest
+from gspider.spider import Spider
+from gspider.codec import RequestCodec
+
+
+class MySpider(Spider):
+    def start_requests(self):
+        pass
+
+    def parse(self, response):
+        pass
+
+    def handle_error(self, request, error):
+        pass
+
+
+def make_request(spider):
+    return HttpRequest('http://example.com/search', method='POST', params={'q': 'gspider'}, body=b'data',
+                       headers={'User-Agent': 'gspider'}, proxies={'http': 'http://127.0.0.1:8080'},
+                       timeout=5, verify_ssl=False, allow_redirects=False, auth=('user', 'passwd'),
+                       priority=3, dont_filter=True, callback=spider.parse, errback=spider.handle_error,
+                       meta={'depth': 2, 'tags': ['a', 'b']})
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_encode_decode(compress):
+    spider = MySpider()
+    codec = RequestCodec(spider=spider, compress=compress)
+    req = make_request(spider)
+    r = codec.decode(codec.encode(req))
+    for k in ('url', 'method', 'params', 'body', 'json', 'headers', 'proxies', 'timeout', 'verify_ssl',
+              'allow_redirects', 'auth', 'priority', 'dont_filter'):
+        assert getattr(r, k) == getattr(req, k)
+    assert r.callback == spider.parse
+    assert r.errback == spider.handle_error
+    assert r.auth == ('user', 'passwd')
+    assert r.meta == {'depth': 2, 'tags': ['a', 'b']}
+    r.meta['depth'] = 3
+    assert req.meta['depth'] == 2
+
+
+def test_callback_names():
+    spider = MySpider()
+    req = make_request(spider)
+    r = RequestCodec().decode(RequestCodec().encode(req))
+    assert r.callback == 'parse'
+    assert r.errback == 'handle_error'
+    with pytest.raises(ValueError):
+        RequestCodec().encode(HttpRequest('http://example.com/', callback=lambda resp: None))
+    with pytest.raises(ValueError):
+        RequestCodec(spider=spider).decode(RequestCodec().encode(HttpRequest('http://example.com/',
+                                                                             callback='parse_item')))
+
+
+def test_invalid_data():
+    codec = RequestCodec()
+    data = codec.encode(HttpRequest('http://example.com/'))
+    with pytest.raises(ValueError):
+        codec.decode(b'invalid data')
+    with pytest.raises(ValueError):
+        codec.decode(data[:2] + b'\x00' + data[3:])
+
+
+class TaggedRequest(HttpRequest):
+    def __init__(self, url, tag=None, **kwargs):
+        super().__init__(url, **kwargs)
+        self.tag = tag
+
+
+def test_request_subclass():
+    codec = RequestCodec(request_classes=[TaggedRequest])
+    r = codec.decode(codec.encode(TaggedRequest('http://example.com/', tag=('a', 1), meta={'depth': 1})))
+    assert type(r) is TaggedRequest
+    assert r.url == 'http://example.com/' and r.tag == ('a', 1) and r.meta == {'depth': 1}
+    with pytest.raises(ValueError):
+        RequestCodec().encode(TaggedRequest('http://example.com/'))
+    with pytest.raises(ValueError):
+        RequestCodec().decode(codec.encode(TaggedRequest('http://example.com/')))
+
+
+class Exploit:
+    def __reduce__(self):
+        return exec, ('raise RuntimeError("executed")',)
+
+
+def test_decode_untrusted_data():
+    codec = RequestCodec()
+    header = codec.encode(HttpRequest('http://example.com/'))[:4]
+    with pytest.raises(ValueError):
+        codec.decode(header + pickle.dumps(Exploit()))
+    with pytest.raises(ValueError):
+        codec.decode(header[:3] + bytes((1,)) + zlib.compress(pickle.dumps(Exploit())))
+    fields = (None,) * 15
+    code = compile('raise RuntimeError("executed")', '<string>', 'exec')
+    with pytest.raises(ValueError):
+        codec.decode(header + marshal.dumps(('gspider.http.HttpRequest', fields, {'code': code}, None)))
+    with pytest.raises(ValueError):
+        codec.encode(HttpRequest('http://example.com/', meta={'obj': Exploit()}))
+
+
+def test_limit_size():
+    codec = RequestCodec(max_size=1024)
+    assert codec.decode(codec.encode(HttpRequest('http://example.com/', meta={'a': 'x' * 512}))).meta['a'] == 'x' * 512
+    with pytest.raises(ValueError):
+        codec.decode(codec.encode(HttpRequest('http://example.com/', meta={'a': 'x' * 2048})))
+    # limit the size after decompression
+    compressed = RequestCodec(compress=True)
+    data = compressed.encode(HttpRequest('http://example.com/', meta={'a': 'x' * 100000}))
+    assert len(data) < 1024
+    with pytest.raises(ValueError):
+        codec.decode(data)
+    assert RequestCodec().decode(data).meta['a'] == 'x' * 100000
+    # too deeply nested
+    nested = []
+    for _ in range(1500):
+        nested = [nested]
+    header = codec.encode(HttpRequest('http://example.com/'))[:4]
+    with pytest.raises(ValueError):
+        RequestCodec().decode(header + marshal.dumps(('gspider.http.HttpRequest', (None,) * 15, {'a': nested}, None)))
@@ -0,0 +1,119 @@
+# coding=utf-8
+
+import gevent
+import pytest
+
+from gspider import events
+from gspider.spider import Spider
+from gspider.http import HttpRequest, HttpResponse
+from gspider.errors import ClientError
+from gspider.eventbus import EventBus
+from gspider.extensions import ControlServer
+from gspider.run import run_spider, run_spiders
+from gspider.control import send_command, format_status, ControlError
+
+from .helpers import LocalResponseMiddleware
+
+
+class EndlessSpider(Spider):
+    def start_requests(self):
+        yield HttpRequest('http://localhost/0')
+
+    def parse(self, response):
+        n = int(response.url.rsplit('/', 1)[1])
+        for i in range(n * 3 + 1, n * 3 + 4):
+            yield HttpRequest('http://localhost/{}'.format(i))
+
+
+def test_control_socket(tmpdir):
+    path = str(tmpdir.join('control.sock'))
+    results = {}
+
+    def control():
+        gevent.sleep(0.2)
+        results['status'] = send_command(path, 'status')
+        results['pause'] = send_command(path, 'pause')
+        gevent.sleep(0.1)
+        results['paused'] = send_command(path, 'status')
+        gevent.sleep(0.1)
+        results['still_paused'] = send_command(path, 'status')
+        results['resize'] = send_command(path, 'resize', workers=2)
+        with pytest.raises(ControlError):
+            send_command(path, 'resize', workers=0)
+        results['drain'] = send_command(path, 'drain')
+
+    g = gevent.spawn(control)
+    run_spider(EndlessSpider, max_workers=4, extensions=[LocalResponseMiddleware], local_response_delay=0.01,
+               control_socket=path, log_level='WARNING')
+    g.get()
+    assert results['status']['spider'] == 'EndlessSpider'
+    assert results['status']['workers'] == 4
+    assert results['status']['responses'] > 0
+    assert results['status']['hosts'][0]['host'] == 'localhost'
+    # the requests answered by the extensions before the control server are counted as well
+    assert results['status']['hosts'][0]['requests'] >= results['status']['hosts'][0]['responses'] > 0
+    assert results['pause']['paused'] is True
+    assert results['paused']['in_flight'] == 0
+    assert results['paused']['responses'] == results['still_paused']['responses']
+    assert results['resize']['workers'] == 2
+    assert results['drain']['draining'] is True
+    assert not tmpdir.join('control.sock').exists()
+
+
+class CountSpider(Spider):
+    def start_requests(self):
+        for i in range(self.config['count']):
+            yield HttpRequest('http://localhost/{}'.format(i))
+
+    def parse(self, response):
+        pass
+
+
+def test_multi_control_socket(tmpdir):
+    path = str(tmpdir.join('control.sock'))
+    results = {}
+
+    def control():
+        gevent.sleep(0.1)
+        results['status'] = send_command(path, 'status')
+        results['drain'] = send_command(path, 'drain')
+
+    g = gevent.spawn(control)
+    stats = run_spiders([{'spider': CountSpider, 'count': 5}, {'spider': EndlessSpider}], max_workers=4,
+                        extensions=[LocalResponseMiddleware], local_response_delay=0.01, control_socket=path,
+                        log_level='WARNING')
+    g.get()
+    status = results['status']
+    assert status['spider'] == 'CountSpider, EndlessSpider'
+    assert [s['spider'] for s in status['spiders']] == ['CountSpider', 'EndlessSpider']
+    assert status['spiders'][0]['finished'] is True and status['spiders'][0]['responses'] == 5
+    assert status['spiders'][1]['finished'] is False and status['spiders'][1]['responses'] > 0
+    assert status['responses'] == sum(s['responses'] for s in status['spiders'])
+    assert 'EndlessSpider' in format_status(status)
+    assert results['drain']['draining'] is True
+    assert stats[1]['finished'] is True and stats[1]['draining'] is True
+    assert not tmpdir.join('control.sock').exists()
+
+
+class EventCrawler:
+    def __init__(self):
+        self.event_bus = EventBus()
+
+
+def test_collect_stats_from_events():
+    crawler = EventCrawler()
+    server = ControlServer(crawler, 'control.sock', max_stats_hosts=2)
+    bus = crawler.event_bus
+    req = HttpRequest('http://a.com/')
+    bus.send(events.request_started, request=req)
+    bus.send(events.request_deferred, request=req, delay=1.0)
+    bus.send(events.request_started, request=req)
+    bus.send(events.response_received, response=HttpResponse(request=req))
+    for host in ('b.com', 'c.com'):
+        r = HttpRequest('http://{}/'.format(host))
+        bus.send(events.request_started, request=r)
+        bus.send(events.request_failed, request=r, error=ClientError('failed'))
+    assert (server.requests, server.responses, server.errors) == (3, 1, 2)
+    # the least recently active host is dropped
+    assert list(server.hosts) == ['b.com', 'c.com']
+    assert (server.hosts['c.com'].requests, server.hosts['c.com'].errors) == (1, 1)
@@ -1,9 +1,16 @@
 # coding=utf-8
 
+import gevent
+from requests.models import Response
+
 from gspider.spider import Spider
-from gspider.http import HttpRequest
-from gspider.run import run_spider
+from gspider.http import HttpRequest, HttpResponse
+from gspider.run import run_spider, run_spiders
 from gspider.extension import Extension
+from gspider.errors import DeferRequest
+from gspider.extensions import ProxyPoolMiddleware, ControlServer
+
+from .helpers import LocalResponseMiddleware
 
 
 class FooError(Exception):
@@ -82,3 +89,136 @@ def test_spider_handlers():
     assert 'func_parse' in data
     assert 'return_list_parse' in data
     assert 'return_none_parse' in data
+
+
+class SlowResponseMiddleware(Extension):
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.concurrency = crawler.config['concurrency']
+        self.active = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def handle_request(self, request):
+        self.active += 1
+        self.concurrency.append((request.meta['n'], self.active))
+        gevent.sleep(0.01)
+        self.active -= 1
+        if request.meta['n'] == 50:
+            self.crawler.runner.resize(2)
+        elif request.meta['n'] == 150:
+            self.crawler.runner.resize(8)
+        resp = Response()
+        resp.status_code = 200
+        resp.url = request.url
+        resp._content = b''
+        return HttpResponse(request=request, response=resp)
+
+
+class ResizeSpider(Spider):
+    def start_requests(self):
+        for i in range(300):
+            yield HttpRequest('http://localhost/{}'.format(i), meta={'n': i})
+
+    def parse(self, response):
+        self.config['data'].add(response.meta['n'])
+
+
+def test_resize_workers():
+    data = set()
+    concurrency = []
+    run_spider(ResizeSpider, max_workers=4, extensions=[SlowResponseMiddleware], queue='gspider.queue.FifoQueue',
+               data=data, concurrency=concurrency)
+    assert data == set(range(300))
+    assert max(c for n, c in concurrency if n < 50) == 4
+    assert max(c for n, c in concurrency if 60 <= n < 150) == 2
+    assert max(c for n, c in concurrency if n >= 160) == 8
+
+
+class CountSpider(Spider):
+    def start_requests(self):
+        for i in range(self.config['count']):
+            yield HttpRequest('http://localhost/{}'.format(i))
+        # duplicated requests are filtered by each spider
+        yield HttpRequest('http://localhost/0')
+
+    def parse(self, response):
+        self.config['data'].append((self.config['name'], response.url))
+
+
+def test_run_spiders():
+    data = []
+    fetched = []
+    stats = run_spiders([{'spider': CountSpider, 'name': 'a', 'count': 300, 'spider_weight': 3},
+                         {'spider': CountSpider, 'name': 'b', 'count': 100},
+                         {'spider': CountSpider, 'name': 'c', 'count': 0}],
+                        max_workers=4, extensions=[LocalResponseMiddleware], local_response_delay=0.001,
+                        data=data, fetched=fetched, log_level='WARNING')
+    assert len([d for d in data if d[0] == 'a']) == 300
+    assert len([d for d in data if d[0] == 'b']) == 100
+    assert [d for d in data if d[0] == 'c'] == [('c', 'http://localhost/0')]
+    # the spiders are scheduled by their weights
+    first = [f[0] for f in fetched[10:210]]
+    assert 140 <= first.count('a') <= 160
+    # the stats of each spider
+    assert [(s['spider'], s['weight'], s['finished']) for s in stats] == [('CountSpider', 3, True),
+                                                                           ('CountSpider', 1, True),
+                                                                           ('CountSpider', 1, True)]
+    assert [(s['scheduled'], s['requests'], s['responses'], s['errors']) for s in stats] == \
+        [(300, 300, 300, 0), (100, 100, 100, 0), (1, 1, 1, 0)]
+    assert all(s['queue'] == 0 and s['in_flight'] == 0 for s in stats)
+
+
+class VariantUrlSpider(Spider):
+    def start_requests(self):
+        yield HttpRequest('http://Example.com:80/a/./b?x=1&utm_source=feed#top')
+        yield HttpRequest('http://example.com/a/b?x=1')
+        yield HttpRequest('http://example.com/a/c/../b?x=1&fbclid=abc')
+        yield HttpRequest('http://example.com/a/%62')
+
+    def parse(self, response):
+        pass
+
+
+def test_canonicalize_urls():
+    fetched = []
+    run_spider(VariantUrlSpider, url_canonicalizer='gspider.canonicalize.UrlCanonicalizer', max_workers=1,
+               extensions=[LocalResponseMiddleware], name='variant', fetched=fetched, log_level='WARNING')
+    assert fetched == [('variant', 'http://example.com/a/b?x=1'), ('variant', 'http://example.com/a/b')]
+
+
+class DeferOnceMiddleware(Extension):
+    def __init__(self, crawler):
+        crawler.config['crawlers'].append(crawler)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def handle_request(self, request):
+        if not request.meta.get('deferred'):
+            request.meta['deferred'] = True
+            raise DeferRequest('Deferred once', delay=0.01)
+
+
+def test_resume_deferred_request(tmpdir):
+    crawlers = []
+    data = []
+    extensions = ['gspider.extensions.ProxyPoolMiddleware', 'gspider.extensions.ControlServer', DeferOnceMiddleware,
+                  LocalResponseMiddleware]
+    run_spider(CountSpider, default_extensions=extensions, proxy_pool=['http://127.0.0.1:8080'],
+               control_socket=str(tmpdir.join('control.sock')), trace_file=str(tmpdir.join('trace.json')),
+               crawlers=crawlers, name='a', count=3, data=data, log_level='WARNING')
+    assert len(data) == 3
+    crawler = crawlers[0]
+    exts = {type(e): e for e in crawler.extension.extensions}
+    # the extensions before the deferring one handle each request once
+    assert exts[ProxyPoolMiddleware].get_stats()[0]['requests'] == 3
+    assert exts[ControlServer].requests == 3
+    assert crawler.tracer.stages['total'].count == 3
+
+    stats = run_spiders([{'spider': CountSpider, 'name': 'a', 'count': 3}], default_extensions=extensions,
+                        proxy_pool=['http://127.0.0.1:8080'], crawlers=[], data=[], log_level='WARNING')
+    assert (stats[0]['requests'], stats[0]['responses']) == (3, 3)
@@ -0,0 +1,110 @@
+# coding=utf-8
+
+import socket
+
+import gevent
+import pytest
+
+from gspider.dns import DnsCache
+from gspider.http import HttpRequest
+from gspider.spider import Spider
+from gspider.run import run_spiders
+
+from .helpers import LocalResponseMiddleware
+
+
+class StubResolver:
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.calls = []
+
+    def __call__(self, host, port, family=0, type=0, proto=0, flags=0):
+        self.calls.append(host)
+        if self.delay:
+            gevent.sleep(self.delay)
+        if host.endswith('.invalid'):
+            raise socket.gaierror(socket.EAI_NONAME, 'Name or service not known')
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('10.0.0.1', port))]
+
+
+def test_cache_hit():
+    resolver = StubResolver()
+    cache = DnsCache(resolver=resolver)
+    res = cache.getaddrinfo('example.com', 80, 0, socket.SOCK_STREAM)
+    assert res == [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('10.0.0.1', 80))]
+    res = cache.getaddrinfo('example.com', 443, 0, socket.SOCK_STREAM)
+    assert res == [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('10.0.0.1', 443))]
+    assert resolver.calls == ['example.com']
+    assert cache.hits == 1 and cache.misses == 1
+
+
+def test_negative_cache():
+    resolver = StubResolver()
+    cache = DnsCache(resolver=resolver)
+    for _ in range(2):
+        with pytest.raises(socket.gaierror):
+            cache.getaddrinfo('example.invalid', 80)
+    assert resolver.calls == ['example.invalid']
+    assert cache.negative_hits == 1
+
+
+def test_expire():
+    resolver = StubResolver()
+    cache = DnsCache(resolver=resolver, ttl=0, negative_ttl=0)
+    cache.getaddrinfo('example.com', 80)
+    cache.getaddrinfo('example.com', 80)
+    assert resolver.calls == ['example.com', 'example.com']
+
+
+def test_prefetch():
+    resolver = StubResolver(delay=0.05)
+    cache = DnsCache(resolver=resolver)
+    g = cache.prefetch('example.com', 0, socket.SOCK_STREAM)
+    assert cache.prefetch('example.com', 0, socket.SOCK_STREAM) is None
+    # wait for the pending resolution
+    cache.getaddrinfo('example.com', 80, 0, socket.SOCK_STREAM)
+    g.join()
+    assert cache.is_cached('example.com', 0, socket.SOCK_STREAM)
+    assert cache.prefetch('example.com', 0, socket.SOCK_STREAM) is None
+    assert resolver.calls == ['example.com']
+
+
+def test_install():
+    getaddrinfo = socket.getaddrinfo
+    cache = DnsCache(resolver=StubResolver())
+    cache.install()
+    try:
+        assert socket.getaddrinfo('example.com', 80)[0][4] == ('10.0.0.1', 80)
+    finally:
+        cache.uninstall()
+    assert socket.getaddrinfo is getaddrinfo
+
+    # installed by several crawlers
+    cache.install()
+    cache.install()
+    cache.uninstall()
+    assert socket.getaddrinfo == cache.getaddrinfo
+    cache.uninstall()
+    assert socket.getaddrinfo is getaddrinfo
+
+
+class ResolverSpider(Spider):
+    def start_requests(self):
+        for i in range(self.config['count']):
+            yield HttpRequest('http://localhost/{}'.format(i))
+
+    def parse(self, response):
+        self.config['resolvers'].append(socket.getaddrinfo)
+
+
+def test_share_cache_between_crawlers():
+    getaddrinfo = socket.getaddrinfo
+    resolvers = []
+    # the crawlers are closed one after another
+    run_spiders([{'spider': ResolverSpider, 'count': 1}, {'spider': ResolverSpider, 'count': 20}], dns_cache=True,
+                max_workers=2, extensions=[LocalResponseMiddleware], local_response_delay=0.01,
+                resolvers=resolvers, log_level='WARNING')
+    assert len(resolvers) == 21
+    assert all(r == resolvers[0] for r in resolvers)
+    assert isinstance(resolvers[0].__self__, DnsCache)
+    assert socket.getaddrinfo is getaddrinfo
@@ -6,7 +6,10 @@ import pytest
 
 from gspider.http import HttpRequest
 from gspider.fetcher import Fetcher
-from gspider.errors import HttpError
+from gspider.errors import HttpError, IgnoreRequest
+from gspider.spider import Spider
+from gspider.bench import BenchServer
+from gspider.run import run_spider, make_requests
 
 
 def test_basic_auth():
@@ -87,3 +90,89 @@ def test_allow_redirects():
                                      params={'url': 'http://python.org'},
                                      allow_redirects=False))
     assert resp.status // 100 == 3
+
+
+def test_stream_response():
+    def max_body_size():
+        fetcher = Fetcher(max_body_size=1024)
+        resp = fetcher.fetch(HttpRequest('http://httpbin.org/bytes/1024'))
+        assert len(resp.body) == 1024
+        with pytest.raises(IgnoreRequest):
+            fetcher.fetch(HttpRequest('http://httpbin.org/bytes/1025'))
+        with pytest.raises(IgnoreRequest):
+            fetcher.fetch(HttpRequest('http://httpbin.org/stream-bytes/2048', params={'chunk_size': 256}))
+
+    def allowed_content_types():
+        fetcher = Fetcher(allowed_content_types=['application/json'])
+        resp = fetcher.fetch(HttpRequest('http://httpbin.org/get'))
+        assert resp.status == 200
+        with pytest.raises(IgnoreRequest):
+            fetcher.fetch(HttpRequest('http://httpbin.org/html'))
+
+    def spool_body():
+        fetcher = Fetcher(spool_body_size=512)
+        resp = fetcher.fetch(HttpRequest('http://httpbin.org/bytes/1024'))
+        assert len(resp.body_file.read()) == 1024
+        assert len(resp.body) == 1024
+
+    max_body_size()
+    allowed_content_types()
+    spool_body()
+
+
+class ErrorBodyServer(BenchServer):
+    def application(self, environ, start_response):
+        if environ['PATH_INFO'].endswith('/large_error'):
+            start_response('500 Internal Server Error', [('Content-Type', 'text/plain')])
+            return [b'x' * 4096]
+        return super().application(environ, start_response)
+
+
+def test_spooled_error_response():
+    server = ErrorBodyServer(pages=1, page_size=2048)
+    server.start()
+    try:
+        fetcher = Fetcher(max_body_size=1024, spool_body_size=512)
+        with pytest.raises(HttpError) as e:
+            fetcher.fetch(HttpRequest(server.url + '/large_error'))
+        assert e.value.response.status == 500
+        # the body exceeding the limit is dropped
+        assert e.value.response.body == b''
+        with pytest.raises(HttpError) as e:
+            fetcher.fetch(HttpRequest(server.url + '/missing'))
+        assert e.value.response.body == b'Not Found'
+
+        fetcher = Fetcher(spool_body_size=512)
+        resp = fetcher.fetch(HttpRequest(server.url))
+        body_file = resp.body_file
+        assert len(body_file.read()) == 2048
+        resp.close()
+        assert body_file.closed
+    finally:
+        server.stop()
+
+
+def test_close_spooled_body_after_parsing():
+    bodies = []
+
+    class SpoolSpider(Spider):
+        def start_requests(self):
+            yield HttpRequest(self.config['server_url'])
+
+        def parse(self, response):
+            bodies.append(response.body_file)
+
+    server = BenchServer(pages=1, page_size=2048)
+    server.start()
+    try:
+        run_spider(SpoolSpider, server_url=server.url, spool_body_size=512, log_level='WARNING')
+    finally:
+        server.stop()
+    assert len(bodies) == 1 and bodies[0].closed
+    # the results of make_requests are loaded before the bodies are closed
+    server.start()
+    try:
+        resp, = make_requests([server.url], spool_body_size=512)
+        assert len(resp.body) == 2048
+    finally:
+        server.stop()
@@ -0,0 +1,107 @@
+# coding=utf-8
+
+import json
+import pickle
+
+import pytest
+from requests.models import Response
+
+from gspider.http import HttpRequest, HttpResponse
+
+
+def test_copy_request():
+    req = HttpRequest('http://example.com/', headers={'User-Agent': 'gspider'}, priority=1,
+                      callback='parse', meta={'depth': 1})
+    r = req.copy()
+    assert type(r) is HttpRequest
+    assert r is not req
+    for k in ('url', 'method', 'headers', 'priority', 'callback'):
+        assert getattr(r, k) == getattr(req, k)
+    assert r.meta == {'depth': 1}
+
+
+def test_replace_request():
+    req = HttpRequest('http://example.com/', priority=1, meta={'depth': 1})
+    r = req.replace(url='http://example.com/a', dont_filter=True)
+    assert r.url == 'http://example.com/a' and r.dont_filter is True and r.priority == 1
+    assert req.url == 'http://example.com/' and req.dont_filter is False
+    r = req.replace(meta={'retry_times': 1})
+    assert r.meta == {'retry_times': 1}
+    with pytest.raises(TypeError):
+        req.replace(foo=1)
+
+
+def test_copy_meta():
+    meta = {'depth': 1}
+    req = HttpRequest('http://example.com/', meta=meta)
+    req.meta['a'] = 1
+    assert meta == {'depth': 1}
+    r = req.copy()
+    assert r.meta is not req.meta
+    r.meta['retry_times'] = 1
+    assert r.meta == {'depth': 1, 'a': 1, 'retry_times': 1}
+    assert req.meta == {'depth': 1, 'a': 1}
+    assert HttpRequest('http://example.com/', meta=req.meta).meta == req.meta
+
+
+def test_meta_reference_not_shared():
+    req = HttpRequest('http://a/', meta={'k': 1})
+    m = req.meta
+    r = req.replace(url='http://b/')
+    m['k'] = 2
+    assert r.meta == {'k': 1}
+    assert req.meta == {'k': 2}
+
+
+def test_meta_is_dict():
+    req = HttpRequest('http://example.com/', meta={'depth': 1})
+    r = req.copy()
+    assert type(r.meta) is dict and type(req.meta) is dict
+    assert json.dumps(r.meta) == '{"depth": 1}'
+    assert {'a': 1, **r.meta} == {'a': 1, 'depth': 1}
+
+
+class MyRequest(HttpRequest):
+    def __init__(self, url, tag=None, **kwargs):
+        super().__init__(url, **kwargs)
+        self.tag = tag
+
+
+def test_replace_subclass():
+    req = MyRequest('http://example.com/', tag='a', meta={'depth': 1})
+    r = req.replace(url='http://example.com/a')
+    assert type(r) is MyRequest
+    assert r.url == 'http://example.com/a' and r.meta == {'depth': 1}
+    # constructed by __init__ of the subclass
+    assert r.tag is None
+    r.meta['depth'] = 2
+    assert req.meta['depth'] == 1
+
+
+def test_pickle_meta():
+    req = HttpRequest('http://example.com/', meta={'depth': 1})
+    meta = pickle.loads(pickle.dumps(req.meta))
+    assert meta == {'depth': 1}
+    meta['depth'] = 2
+    assert req.meta['depth'] == 1
+
+
+def test_request_to_dict():
+    req = HttpRequest('http://example.com/', params={'q': 'gspider'}, json={'a': 1},
+                      proxies={'http': 'http://127.0.0.1:8080'}, callback='parse', meta={'depth': 1})
+    d = req.to_dict()
+    assert d['proxies'] == {'http': 'http://127.0.0.1:8080'}
+    assert type(d['meta']) is dict
+    r = HttpRequest.from_dict(d)
+    assert r.to_dict() == d
+
+
+def test_error_response_status():
+    resp = Response()
+    resp.status_code = 503
+    resp.url = 'http://example.com/'
+    resp._content = b'unavailable'
+    response = HttpResponse(response=resp)
+    assert response.status == 503
+    assert response.url == 'http://example.com/'
+    assert response.body == b'unavailable'
@@ -0,0 +1,55 @@
+# coding=utf-8
+
+import sys
+import json
+import subprocess
+
+
+def _run_python(code):
+    out = subprocess.check_output([sys.executable, '-W', 'error::Warning:gspider._patch', '-c', code])
+    return json.loads(out.decode())
+
+
+def _import_time(statement, repeat=5):
+    # the best of several runs in fresh interpreters
+    code = """
+import time, json
+t = time.perf_counter()
+{}
+print(json.dumps(time.perf_counter() - t))
+""".format(statement)
+    return min(_run_python(code) for _ in range(repeat))
+
+
+def test_import_http_request():
+    res = _run_python("""
+import sys, json, socket
+from gspider import HttpRequest
+print(json.dumps({'modules': [m for m in ('requests', 'lxml', 'gevent') if m in sys.modules],
+                  'patched': 'gevent' in type(socket.socket()).__module__}))
+""")
+    assert res['modules'] == []
+    assert res['patched'] is False
+
+
+def test_import_time_budget():
+    # compared with importing requests rather than an absolute time, so that the budget does not depend on
+    # the machine, monkey-patching alone costs more than importing requests
+    assert _import_time('from gspider import HttpRequest') < _import_time('import requests')
+
+
+def test_lazy_objects():
+    res = _run_python("""
+import sys, json
+import gspider
+from gspider import run_spider
+# patched by the crawler before requests is imported
+import socket, ssl, threading
+patched = ['gevent' in type(socket.socket()).__module__, 'gevent' in ssl.SSLContext.__module__,
+           'gevent' in threading.local.__module__]
+from gspider import Fetcher, Spider
+print(json.dumps({'patched': patched,
+                  'all': all(getattr(gspider, name) is not None for name in gspider.__all__)}))
+""")
+    assert res['patched'] == [True, True, True]
+    assert res['all'] is True
@@ -0,0 +1,134 @@
+# coding=utf-8
+
+import pytest
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+from gspider.http import HttpRequest, HttpResponse
+from gspider.spider import Spider
+from gspider.run import run_spider
+from gspider.extensions.incremental import IncrementalMiddleware
+from gspider.utils import request_fingerprint
+
+from .helpers import LocalResponseMiddleware
+
+
+def fetch(ext, url, status=200, body=b'', headers=None, links=()):
+    req = HttpRequest(url)
+    ext.handle_request_scheduled(req)
+    ext.handle_request(req)
+    resp = Response()
+    resp.status_code = status
+    resp.url = url
+    resp._content = body
+    resp.headers = CaseInsensitiveDict(headers or {})
+    response = HttpResponse(request=req, response=resp)
+    ext.handle_response(req, response)
+    ext.handle_spider_input(response)
+    if req.meta.get('not_modified'):
+        return req, list(ext.handle_spider_output(response, ()))
+    result = [HttpRequest(u, callback='parse') for u in links]
+    list(ext.handle_spider_output(response, result))
+    return req, True
+
+
+def test_incremental_crawl(tmp_path):
+    path = str(tmp_path / 'incremental.json')
+    ext = IncrementalMiddleware(path)
+    ext.open()
+    req, parsed = fetch(ext, 'http://example.com/a', body=b'a', headers={'ETag': '"1"'})
+    assert parsed and req.priority == 10 and req.headers is None
+    _, parsed = fetch(ext, 'http://example.com/b', body=b'b',
+                      headers={'Last-Modified': 'Mon, 19 Oct 2026 00:00:00 GMT'})
+    assert parsed
+    _, parsed = fetch(ext, 'http://example.com/c', body=b'c')
+    assert parsed
+    ext.close()
+
+    # the next run
+    ext = IncrementalMiddleware(path)
+    ext.open()
+    req, parsed = fetch(ext, 'http://example.com/a', status=304)
+    assert req.headers == {'If-None-Match': '"1"'}
+    assert parsed == [] and req.meta['not_modified']
+    req, parsed = fetch(ext, 'http://example.com/b', body=b'b2')
+    assert req.headers == {'If-Modified-Since': 'Mon, 19 Oct 2026 00:00:00 GMT'}
+    assert parsed
+    # the same digest
+    req, parsed = fetch(ext, 'http://example.com/c', body=b'c')
+    assert parsed == []
+    assert ext.stats == {'new': 0, 'changed': 1, 'unchanged': 1, 'not_modified': 1}
+    ext.close()
+
+    # the pages changed more frequently are crawled earlier
+    ext = IncrementalMiddleware(path)
+    ext.open()
+    assert ext.get_change_rate(HttpRequest('http://example.com/a')) == pytest.approx(1 / 3)
+    assert ext.get_change_rate(HttpRequest('http://example.com/b')) == pytest.approx(2 / 3)
+    assert ext.get_change_rate(HttpRequest('http://example.com/new')) == 1.0
+    req = HttpRequest('http://example.com/b', priority=1)
+    ext.handle_request_scheduled(req)
+    assert req.priority == 8
+    # not prioritized again when retried
+    retry_req = req.copy()
+    ext.handle_request_scheduled(retry_req)
+    assert retry_req.priority == 8
+
+
+def test_schedule_links_of_unchanged_pages(tmp_path):
+    path = str(tmp_path / 'incremental.json')
+    ext = IncrementalMiddleware(path)
+    ext.open()
+    fetch(ext, 'http://example.com/', body=b'index', headers={'ETag': '"1"'},
+          links=['http://example.com/a', 'http://example.com/b'])
+    fetch(ext, 'http://example.com/hub', body=b'hub', links=['http://example.com/c'])
+    ext.close()
+
+    ext = IncrementalMiddleware(path)
+    ext.open()
+    _, result = fetch(ext, 'http://example.com/', status=304)
+    assert [(r.url, r.callback) for r in result] == [('http://example.com/a', 'parse'),
+                                                      ('http://example.com/b', 'parse')]
+    _, result = fetch(ext, 'http://example.com/hub', body=b'hub')
+    assert [r.url for r in result] == ['http://example.com/c']
+    # the links of the changed pages are replaced
+    _, parsed = fetch(ext, 'http://example.com/', body=b'index2', links=['http://example.com/d'])
+    assert parsed is True
+    assert [d['url'] for d in ext.records[request_fingerprint(HttpRequest('http://example.com/'))]['links']] \
+        == ['http://example.com/d']
+
+
+def test_keep_store_failed_to_load(tmp_path):
+    path = tmp_path / 'incremental.json'
+    path.write_text('{"broken', encoding='utf-8')
+    ext = IncrementalMiddleware(str(path))
+    with pytest.raises(ValueError):
+        ext.open()
+    fetch(ext, 'http://example.com/', body=b'a')
+    ext.close()
+    assert path.read_text(encoding='utf-8') == '{"broken'
+
+
+class RecrawlSpider(Spider):
+    def start_requests(self):
+        yield HttpRequest('http://localhost/index', errback=self.handle_request_error)
+
+    def parse(self, response):
+        self.config['parsed'].append(response.url)
+        if response.url.endswith('/index'):
+            yield HttpRequest('http://localhost/page', errback=self.handle_request_error)
+
+    def handle_request_error(self, request, error):
+        self.config['errors'].append((request.url, error))
+
+
+def test_skip_spider_for_unchanged_pages(tmp_path):
+    path = str(tmp_path / 'incremental.json')
+    for parsed in (['http://localhost/index', 'http://localhost/page'], []):
+        fetched, results, errors = [], [], []
+        run_spider(RecrawlSpider, extensions=[LocalResponseMiddleware], incremental_store=path, fetched=fetched,
+                   parsed=results, errors=errors, log_level='WARNING')
+        # the page linked from the unchanged index is still crawled
+        assert [url for _, url in fetched] == ['http://localhost/index', 'http://localhost/page']
+        assert results == parsed
+        assert errors == []
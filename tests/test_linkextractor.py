@@ -0,0 +1,75 @@
+# coding=utf-8
+
+from requests.models import Response
+
+from gspider.http import HttpResponse, HttpRequest
+from gspider.linkextractor import LinkExtractor
+
+HTML = """<html>
+<head><title>links</title></head>
+<body>
+<a href="/a.html">a</a>
+<a href="/a.html#top">a again</a>
+<a href="b.html?y=2&x=1">b</a>
+<a href="../c.html">c</a>
+<a href="http://sub.example.com/d.html">d</a>
+<a href="http://other.org/e.html">e</a>
+<a href="javascript:void(0)">js</a>
+<a href="mailto:user@example.com">mail</a>
+<a>no href</a>
+<area href="/f.html">
+<img src="/g.png">
+</body>
+</html>"""
+
+
+def make_response(text, url):
+    resp = Response()
+    resp._content = text.encode('utf-8')
+    resp.url = url
+    resp.status_code = 200
+    resp.headers['Content-Type'] = 'text/html; charset=utf-8'
+    return HttpResponse(response=resp)
+
+
+def test_extract_links():
+    response = make_response(HTML, 'http://www.example.com/dir/index.html')
+    assert LinkExtractor().extract_links(response) == [
+        'http://www.example.com/a.html',
+        'http://www.example.com/dir/b.html?y=2&x=1',
+        'http://www.example.com/c.html',
+        'http://sub.example.com/d.html',
+        'http://other.org/e.html',
+        'http://www.example.com/f.html',
+    ]
+    assert len(LinkExtractor(unique=False).extract_links(response)) == 7
+    assert LinkExtractor(tags='img', attrs='src').extract_links(response) == ['http://www.example.com/g.png']
+
+
+def test_filter_links():
+    response = make_response(HTML, 'http://www.example.com/dir/index.html')
+    assert LinkExtractor(allow_domains='example.com', deny_domains='sub.example.com',
+                         deny=r'/[bc]\.html').extract_links(response) == [
+        'http://www.example.com/a.html',
+        'http://www.example.com/f.html',
+    ]
+    assert LinkExtractor(allow=[r'\.org/', r'/d\.html$']).extract_links(response) == [
+        'http://sub.example.com/d.html',
+        'http://other.org/e.html',
+    ]
+
+
+def test_canonicalize_and_base_url():
+    html = '<html><head><base href="http://EXAMPLE.com:80/base/"></head>' \
+           '<body><a href="x?b=1&a=2#frag">x</a></body></html>'
+    response = make_response(html, 'http://www.example.com/')
+    assert LinkExtractor(canonicalize=True).extract_links(response) == ['http://example.com/base/x?a=2&b=1']
+
+
+def test_extract_requests():
+    response = make_response(HTML, 'http://www.example.com/')
+    requests = LinkExtractor(allow_domains='other.org').extract_requests(response, callback='parse_item')
+    assert len(requests) == 1
+    assert isinstance(requests[0], HttpRequest)
+    assert requests[0].url == 'http://other.org/e.html'
+    assert requests[0].callback == 'parse_item'
@@ -0,0 +1,91 @@
+# coding=utf-8
+
+import io
+import os
+import json
+import logging
+
+from gevent.monkey import get_original
+
+from gspider.utils import BufferedStreamHandler, JsonFormatter
+
+
+def make_record(msg, *args, level=logging.INFO, exc_info=None):
+    return logging.LogRecord('gspider.test', level, __file__, 1, msg, args, exc_info)
+
+
+def test_buffered_handler_flush_on_close():
+    stream = io.StringIO()
+    handler = BufferedStreamHandler(stream, flush_interval=60)
+    handler.setFormatter(logging.Formatter('%(levelname)s %(message)s'))
+    for i in range(3):
+        handler.handle(make_record('message %s', i))
+    assert stream.getvalue() == ''
+    handler.close()
+    assert stream.getvalue().splitlines() == ['INFO message 0', 'INFO message 1', 'INFO message 2']
+
+
+def test_buffered_handler_overflow():
+    stream = io.StringIO()
+    handler = BufferedStreamHandler(stream, flush_interval=60, max_buffer_size=3)
+    handler.setFormatter(logging.Formatter('%(levelname)s %(message)s'))
+    for i in range(5):
+        handler.handle(make_record('message %s', i))
+    assert handler.dropped == 2
+    handler.flush()
+    assert stream.getvalue().splitlines() == ['WARNING Dropped 2 log records since the log buffer is full',
+                                              'INFO message 2', 'INFO message 3', 'INFO message 4']
+    # the dropped records are reported once
+    handler.handle(make_record('message 5'))
+    handler.close()
+    assert stream.getvalue().splitlines()[4:] == ['INFO message 5']
+
+
+def test_buffered_handler_after_fork(tmp_path):
+    path = str(tmp_path / 'log')
+    handler = BufferedStreamHandler(open(path, 'a'), flush_interval=0.01, close_stream=True)
+    handler.setFormatter(logging.Formatter('%(process)d %(message)s'))
+    handler.handle(make_record('parent'))
+    pid = os.fork()
+    if pid == 0:
+        try:
+            handler.handle(make_record('child'))
+            # written by the writer thread without closing the handler
+            get_original('time', 'sleep')(0.2)
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+    handler.close()
+    with open(path) as f:
+        lines = f.read().splitlines()
+    assert '{} child'.format(pid) in lines
+    assert '{} parent'.format(os.getpid()) in lines
+
+
+def test_json_formatter():
+    formatter = JsonFormatter(datefmt='%Y-%m-%d')
+    d = json.loads(formatter.format(make_record('hello %s', 'world', level=logging.WARNING)))
+    assert set(d) == {'time', 'name', 'level', 'message'}
+    assert d['name'] == 'gspider.test'
+    assert d['level'] == 'WARNING'
+    assert d['message'] == 'hello world'
+    assert len(d['time']) == 10
+    try:
+        raise ValueError('bad value')
+    except ValueError as e:
+        record = make_record('failed', level=logging.ERROR, exc_info=(type(e), e, e.__traceback__))
+    d = json.loads(formatter.format(record))
+    assert d['exc_info'].startswith('Traceback') and 'ValueError: bad value' in d['exc_info']
+
+
+def test_buffered_json_log_with_traceback():
+    stream = io.StringIO()
+    handler = BufferedStreamHandler(stream, flush_interval=60)
+    handler.setFormatter(JsonFormatter())
+    try:
+        raise ValueError('bad value')
+    except ValueError as e:
+        handler.handle(make_record('failed', level=logging.ERROR, exc_info=(type(e), e, e.__traceback__)))
+    handler.close()
+    d = json.loads(stream.getvalue())
+    assert d['message'] == 'failed' and 'ValueError: bad value' in d['exc_info']
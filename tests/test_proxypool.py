@@ -0,0 +1,142 @@
+# coding=utf-8
+
+import time
+from datetime import timedelta
+from collections import Counter
+
+import pytest
+from requests.models import Response
+
+from gspider.http import HttpRequest, HttpResponse
+from gspider.errors import ClientError, HttpError, DeferRequest
+from gspider.extensions.proxypool import ProxyPoolMiddleware
+
+PROXIES = ['http://p1:8080', 'http://p2:8080', 'http://p3:8080']
+
+
+def respond(ext, req, latency=0.1, status=200):
+    resp = Response()
+    resp.status_code = status
+    resp.elapsed = timedelta(seconds=latency)
+    response = HttpResponse(request=req, response=resp)
+    if status >= 400:
+        ext.handle_error(req, HttpError(response=response))
+    else:
+        ext.handle_response(req, response)
+
+
+def test_assign_proxy():
+    ext = ProxyPoolMiddleware(PROXIES)
+    req = HttpRequest('http://example.com/')
+    ext.handle_request(req)
+    assert req.proxies['http'] in PROXIES
+    assert req.proxies['https'] == req.proxies['http']
+    assert req.meta['assigned_proxy'] == req.proxies['http']
+    assert req.meta['assigned_proxy_retry_times'] == 0
+    # the request having its own proxies
+    req = HttpRequest('http://example.com/', proxies={'http': 'http://mine:8080'})
+    ext.handle_request(req)
+    assert req.proxies == {'http': 'http://mine:8080'}
+    # the proxy given in meta
+    req = HttpRequest('http://example.com/', meta={'proxy': 'http://p2:8080'})
+    ext.handle_request(req)
+    assert req.proxies['http'] == 'http://p2:8080'
+
+
+def test_prefer_fast_proxies():
+    ext = ProxyPoolMiddleware(PROXIES)
+    latencies = {'http://p1:8080': 0.05, 'http://p2:8080': 0.5, 'http://p3:8080': 1.0}
+    counter = Counter()
+    for i in range(2000):
+        req = HttpRequest('http://example.com/{}'.format(i))
+        ext.handle_request(req)
+        url = req.proxies['http']
+        counter[url] += 1
+        respond(ext, req, latency=latencies[url])
+    assert counter['http://p1:8080'] > counter['http://p2:8080'] > counter['http://p3:8080']
+    assert counter['http://p1:8080'] > 1500
+
+
+def test_evict_and_retest():
+    ext = ProxyPoolMiddleware(PROXIES[:2], max_failures=2, retest_time=0.05)
+    for _ in range(2):
+        req = HttpRequest('http://example.com/', meta={'proxy': 'http://p1:8080'})
+        ext.handle_request(req)
+        ext.handle_error(req, ClientError('Connection refused'))
+    for _ in range(10):
+        req = HttpRequest('http://example.com/')
+        ext.handle_request(req)
+        assert req.proxies['http'] == 'http://p2:8080'
+    # wait for the proxies to be re-tested if all are evicted
+    for _ in range(2):
+        req = HttpRequest('http://example.com/', meta={'proxy': 'http://p2:8080'})
+        ext.handle_request(req)
+        ext.handle_error(req, ClientError('Connection refused'))
+    with pytest.raises(DeferRequest):
+        ext.handle_request(HttpRequest('http://example.com/'))
+    time.sleep(0.06)
+    stats = {s['proxy']: s for s in ext.get_stats()}
+    assert stats['http://p1:8080']['available'] is True
+    req = HttpRequest('http://example.com/', meta={'proxy': 'http://p1:8080'})
+    ext.handle_request(req)
+    ext.handle_error(req, ClientError('Connection refused'))
+    # evicted again at the first failure of re-test with doubled time
+    stats = {s['proxy']: s for s in ext.get_stats()}
+    assert stats['http://p1:8080']['available'] is False
+    assert ext.proxies['http://p1:8080'].evict_time == pytest.approx(0.1)
+
+
+def test_proxy_auth_failure():
+    ext = ProxyPoolMiddleware(PROXIES[:1], max_failures=1)
+    req = HttpRequest('http://example.com/')
+    ext.handle_request(req)
+    respond(ext, req, status=404)
+    assert ext.get_stats()[0]['available'] is True
+    req = HttpRequest('http://example.com/')
+    ext.handle_request(req)
+    respond(ext, req, status=407)
+    assert ext.get_stats()[0]['available'] is False
+
+
+def test_sticky_hosts():
+    ext = ProxyPoolMiddleware(PROXIES, sticky=True)
+    req = HttpRequest('http://example.com/')
+    ext.handle_request(req)
+    url = req.proxies['http']
+    for i in range(20):
+        req = HttpRequest('http://example.com/{}'.format(i))
+        ext.handle_request(req)
+        assert req.proxies['http'] == url
+        respond(ext, req)
+    # switch to another proxy after failure
+    ext.handle_error(req, ClientError('Timeout'))
+    retry_req = req.copy()
+    retry_req.meta['retry_times'] = 1
+    ext.handle_request(retry_req)
+    assert retry_req.proxies['http'] != url
+    req = HttpRequest('http://example.com/')
+    ext.handle_request(req)
+    assert req.proxies['http'] == retry_req.proxies['http']
+
+
+def test_derived_request():
+    ext = ProxyPoolMiddleware(PROXIES[:2])
+    ext.proxies['http://p2:8080'].score = 0.0
+    req = HttpRequest('http://example.com/')
+    ext.handle_request(req)
+    assert req.proxies['http'] == 'http://p1:8080'
+    respond(ext, req)
+    # the derived requests are not regarded as retries
+    for i in range(5):
+        r = req.replace(url='http://example.com/{}'.format(i))
+        ext.handle_request(r)
+        assert r.proxies['http'] == 'http://p1:8080'
+    # the retry moves to another proxy
+    retry_req = req.copy()
+    retry_req.meta['retry_times'] = 1
+    ext.handle_request(retry_req)
+    assert retry_req.proxies['http'] == 'http://p2:8080'
+    assert retry_req.meta['assigned_proxy_retry_times'] == 1
+    r = retry_req.replace(url='http://example.com/a')
+    ext.handle_request(r)
+    assert r.proxies['http'] == 'http://p1:8080'
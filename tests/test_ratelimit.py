@@ -0,0 +1,92 @@
+# coding=utf-8
+
+import time
+
+import pytest
+import gevent
+
+from gspider.http import HttpRequest
+from gspider.errors import DeferRequest
+from gspider.extensions.ratelimit import RateLimitMiddleware
+
+
+def run_requests(ext, requests):
+    passed = []
+
+    def _run(req):
+        ext.handle_request(req)
+        passed.append((time.monotonic(), req))
+
+    gevent.joinall([gevent.spawn(_run, r) for r in requests])
+    return passed
+
+
+def test_host_rate():
+    ext = RateLimitMiddleware(host_rate=50)
+    t = time.monotonic()
+    passed = run_requests(ext, [HttpRequest('http://example.com/{}'.format(i)) for i in range(10)] +
+                          [HttpRequest('http://example.org/{}'.format(i)) for i in range(10)])
+    assert len(passed) == 20
+    # the first request of each host is not delayed
+    times = sorted(p[0] - t for p in passed if 'example.com' in p[1].url)
+    assert 0.17 <= times[-1] <= 0.3
+    for a, b in zip(times[1:], times[2:]):
+        assert b - a >= 0.015
+    assert 40 <= ext.get_observed_rate(host='example.com') <= 55
+
+
+def test_global_and_tag_rates():
+    ext = RateLimitMiddleware(rate=100, tag_rates={'api': 20})
+    t = time.monotonic()
+    reqs = [HttpRequest('http://example.com/{}'.format(i)) for i in range(10)]
+    for r in reqs[:5]:
+        r.meta['rate_limit_tag'] = 'api'
+    passed = run_requests(ext, reqs)
+    assert len(passed) == 10
+    tagged = max(p[0] - t for p in passed if p[1].meta.get('rate_limit_tag') == 'api')
+    assert 0.18 <= tagged <= 0.3
+    assert ext.get_observed_rate() > 0
+
+
+def test_crawl_delay():
+    ext = RateLimitMiddleware(host_rate=100)
+    t = time.monotonic()
+    reqs = [HttpRequest('http://example.com/{}'.format(i), meta={'crawl_delay': 0.05}) for i in range(3)]
+    run_requests(ext, reqs)
+    assert 0.09 <= time.monotonic() - t <= 0.2
+
+
+def test_crawl_delay_without_meta():
+    ext = RateLimitMiddleware(host_rate=100)
+    reqs = [HttpRequest('http://example.com/{}'.format(i), meta={'crawl_delay': 0.05} if i % 2 == 0 else None)
+            for i in range(4)]
+    t = time.monotonic()
+    run_requests(ext, reqs)
+    # the requests without the crawl delay do not reset the rate of the host
+    assert 0.14 <= time.monotonic() - t <= 0.3
+    assert ext._hosts['example.com'].rate == 20
+    ext.handle_request(HttpRequest('http://example.com/4', meta={'crawl_delay': 0.1}))
+    assert ext._hosts['example.com'].rate == 10
+
+
+def test_defer_long_wait():
+    ext = RateLimitMiddleware(host_rate=10, max_wait=0.05)
+    ext.handle_request(HttpRequest('http://example.com/0'))
+    req1 = HttpRequest('http://example.com/1')
+    with pytest.raises(DeferRequest) as e:
+        ext.handle_request(req1)
+    assert 0.05 < e.value.delay <= 0.1
+    req2 = HttpRequest('http://example.com/2')
+    with pytest.raises(DeferRequest) as e:
+        ext.handle_request(req2)
+    # the slots are reserved one after another
+    assert 0.15 < e.value.delay <= 0.2
+    # the requests are let through in their slots when they come back
+    time.sleep(0.1)
+    t = time.monotonic()
+    ext.handle_request(req1)
+    assert time.monotonic() - t < 0.02
+    ext.handle_request(req2)
+    assert 0.08 <= time.monotonic() - t <= 0.12
+    assert 'rate_limit_slot' not in req2.meta
+    assert ext.deferred_count == 2
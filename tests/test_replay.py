@@ -0,0 +1,113 @@
+# coding=utf-8
+
+import time
+import zlib
+import pickle
+
+import pytest
+from requests.models import Response
+
+from gspider.http import HttpRequest, HttpResponse
+from gspider.errors import ClientError, HttpError
+from gspider.replay import ArchiveWriter, ReplayFetcher, read_archive, load_record, MAGIC, VERSION
+from gspider.bench import BenchServer, BenchSpider
+from gspider.run import run_spider
+
+
+def make_response(request, status, body):
+    resp = Response()
+    resp.status_code = status
+    resp.url = request.url
+    resp.headers['Content-Type'] = 'text/plain'
+    resp._content = body
+    return HttpResponse(request=request, response=resp)
+
+
+def test_replay_fetcher(tmp_path):
+    path = str(tmp_path / 'archive')
+    writer = ArchiveWriter(path)
+    a = HttpRequest('http://example.com/a')
+    writer.write(a, make_response(a, 503, b'unavailable'))
+    writer.write(a, make_response(a, 200, b'a'))
+    b = HttpRequest('http://example.com/b?y=2&x=1')
+    writer.write(b, make_response(b, 404, b'not found'))
+    writer.close()
+    # append to the archive
+    writer = ArchiveWriter(path)
+    c = HttpRequest('http://example.com/c')
+    writer.write(c, make_response(c, 200, b'c'))
+    writer.close()
+    assert len(list(read_archive(path))) == 4
+
+    fetcher = ReplayFetcher(path, latency=0.05)
+    # the responses are served in the recorded order
+    with pytest.raises(HttpError) as e:
+        fetcher.fetch(HttpRequest('http://example.com/a'))
+    assert e.value.response.status == 503
+    t = time.monotonic()
+    for _ in range(2):
+        resp = fetcher.fetch(HttpRequest('http://example.com/a'))
+        assert resp.status == 200 and resp.body == b'a' and resp.response.headers['Content-Type'] == 'text/plain'
+    assert time.monotonic() - t >= 0.1
+    with pytest.raises(HttpError) as e:
+        fetcher.fetch(HttpRequest('http://example.com/b?x=1&y=2'))
+    assert e.value.response.body == b'not found'
+    assert fetcher.fetch(HttpRequest('http://example.com/c')).body == b'c'
+    with pytest.raises(ClientError):
+        fetcher.fetch(HttpRequest('http://example.com/d'))
+
+
+def test_invalid_archive(tmp_path):
+    path = tmp_path / 'archive'
+    path.write_bytes(b'not an archive')
+    with pytest.raises(ValueError):
+        ReplayFetcher(str(path))
+
+
+def test_record_and_replay(tmp_path):
+    path = str(tmp_path / 'archive')
+    server = BenchServer(pages=50, links=5, page_size=1024)
+    server.start()
+    try:
+        recorded = {}
+        run_spider(BenchSpider, bench_url=server.url, bench_stats=recorded, record_file=path,
+                   extensions=['gspider.bench.BenchStats'], max_workers=5, log_level='WARNING')
+    finally:
+        server.stop()
+    assert len(recorded['latencies']) == 50
+
+    replayed = {}
+    run_spider(BenchSpider, bench_url=server.url, bench_stats=replayed, fetcher='gspider.replay.ReplayFetcher',
+               replay_file=path, extensions=['gspider.bench.BenchStats'], max_workers=5, log_level='WARNING')
+    assert len(replayed['latencies']) == 50
+    assert replayed['errors'] == 0
+
+
+class Exploit:
+    def __reduce__(self):
+        return exec, ('raise RuntimeError("executed")',)
+
+
+def test_load_record(tmp_path):
+    path = str(tmp_path / 'archive')
+    writer = ArchiveWriter(path)
+    req = HttpRequest('http://example.com/a')
+    resp = make_response(req, 200, b'\x00\xffbody')
+    resp.response.headers['X-Test'] = '1'
+    writer.write(req, resp)
+    writer.close()
+    (fp, data), = read_archive(path)
+    method, url, status, resp_url, headers, body, elapsed = load_record(data)
+    assert (method, url, status, resp_url, body, elapsed) == \
+        ('GET', 'http://example.com/a', 200, 'http://example.com/a', b'\x00\xffbody', 0.0)
+    assert dict(headers) == {'Content-Type': 'text/plain', 'X-Test': '1'}
+
+    # the records are never unpickled
+    data = zlib.compress(pickle.dumps(Exploit()))
+    with pytest.raises(ValueError):
+        load_record(data)
+    with open(path, 'wb') as f:
+        f.write(MAGIC + bytes((VERSION,)) + len(data).to_bytes(4, 'big') + fp.encode('ascii') + data)
+    fetcher = ReplayFetcher(path)
+    with pytest.raises(ValueError):
+        fetcher.fetch(req)
@@ -0,0 +1,170 @@
+# coding=utf-8
+
+import time
+
+import gevent
+import pytest
+from requests.models import Response
+
+from gspider.http import HttpRequest, HttpResponse
+from gspider.errors import IgnoreRequest, HttpError, ClientError
+from gspider.extensions.robots import RobotsRules, RobotsTxtMiddleware
+from gspider.spider import Spider
+from gspider.bench import BenchServer
+from gspider.run import run_spider
+
+ROBOTS_TXT = """
+User-agent: gspider
+Disallow: /private/
+Allow: /private/public.html
+Disallow: /*.pdf$
+Crawl-delay: 2
+
+User-agent: *
+Disallow: /
+"""
+
+
+def test_parse_robots_txt():
+    rules = RobotsRules.parse(ROBOTS_TXT, user_agent='gspider/0.1')
+    assert rules.allowed('/index.html')
+    assert not rules.allowed('/private/data.html')
+    assert rules.allowed('/private/public.html')
+    assert not rules.allowed('/files/a.pdf')
+    assert rules.allowed('/files/a.pdf?download=1')
+    assert rules.crawl_delay == 2
+
+    rules = RobotsRules.parse(ROBOTS_TXT, user_agent='Mozilla/5.0')
+    assert not rules.allowed('/index.html')
+    assert rules.crawl_delay is None
+
+    assert RobotsRules.parse('', user_agent='gspider').allowed('/')
+
+
+def test_match_user_agent_exactly():
+    text = """
+User-agent: bot
+Disallow: /bot/
+
+User-agent: GoogleBot
+Disallow: /google/
+
+User-agent: *
+Disallow: /all/
+"""
+    rules = RobotsRules.parse(text, user_agent='googlebot/2.1')
+    assert rules.allowed('/bot/') and rules.allowed('/all/')
+    assert not rules.allowed('/google/')
+    rules = RobotsRules.parse(text, user_agent='Bot')
+    assert not rules.allowed('/bot/')
+    assert rules.allowed('/google/') and rules.allowed('/all/')
+    rules = RobotsRules.parse(text, user_agent='robot')
+    assert rules.allowed('/bot/') and rules.allowed('/google/')
+    assert not rules.allowed('/all/')
+
+
+class FakeFetcher:
+    def __init__(self, text=None, status=404, error=None):
+        self.text = text
+        self.status = status
+        self.error = error
+        self.urls = []
+
+    def fetch(self, request):
+        self.urls.append(request.url)
+        gevent.sleep(0.01)
+        if self.error is not None:
+            raise self.error
+        if self.text is None:
+            resp = Response()
+            resp.status_code = self.status
+            resp.url = request.url
+            resp._content = b''
+            raise HttpError('{}'.format(resp), response=HttpResponse(request=request, response=resp))
+
+        class TextResponse:
+            text = self.text
+
+        return TextResponse()
+
+
+def test_robots_middleware():
+    fetcher = FakeFetcher(ROBOTS_TXT)
+    middleware = RobotsTxtMiddleware(fetcher, user_agent='gspider')
+    requests = [HttpRequest('http://example.com/a.html'), HttpRequest('http://example.com/b.html')]
+    gevent.joinall([gevent.spawn(middleware.handle_request, r) for r in requests], raise_error=True)
+    assert fetcher.urls == ['http://example.com/robots.txt']
+    assert requests[0].meta['crawl_delay'] == 2
+    assert middleware.get_crawl_delay('http://example.com/c.html') == 2
+    with pytest.raises(IgnoreRequest):
+        middleware.handle_request(HttpRequest('http://example.com/private/data.html'))
+    middleware.handle_request(HttpRequest('http://example.com/private/data.html', meta={'dont_obey_robots': True}))
+    assert len(fetcher.urls) == 1
+
+
+def test_robots_not_found():
+    fetcher = FakeFetcher()
+    middleware = RobotsTxtMiddleware(fetcher)
+    middleware.handle_request(HttpRequest('http://example.com/private/data.html'))
+    assert middleware.get_crawl_delay('http://example.com/') is None
+
+
+@pytest.mark.parametrize('status, error', [(500, None), (503, None), (None, ClientError('Connection refused'))])
+def test_robots_unreachable(status, error):
+    fetcher = FakeFetcher(status=status, error=error)
+    middleware = RobotsTxtMiddleware(fetcher, unreachable_ttl=0.05)
+    with pytest.raises(IgnoreRequest):
+        middleware.handle_request(HttpRequest('http://example.com/a.html'))
+    with pytest.raises(IgnoreRequest):
+        middleware.handle_request(HttpRequest('http://example.com/b.html'))
+    assert len(fetcher.urls) == 1
+    # fetched again soon
+    time.sleep(0.05)
+    fetcher.error = None
+    fetcher.text = ROBOTS_TXT
+    middleware.handle_request(HttpRequest('http://example.com/a.html', meta={'dont_obey_robots': True}))
+    with pytest.raises(IgnoreRequest):
+        middleware.handle_request(HttpRequest('http://example.com/a.html'))
+    assert len(fetcher.urls) == 2
+    middleware = RobotsTxtMiddleware(FakeFetcher(ROBOTS_TXT), user_agent='gspider')
+    middleware.handle_request(HttpRequest('http://example.com/a.html'))
+
+
+def test_robots_unavailable():
+    fetcher = FakeFetcher(status=403)
+    middleware = RobotsTxtMiddleware(fetcher)
+    middleware.handle_request(HttpRequest('http://example.com/a.html'))
+    middleware.handle_request(HttpRequest('http://example.com/b.html'))
+    assert len(fetcher.urls) == 1
+
+
+class CrawlDelayServer(BenchServer):
+    def application(self, environ, start_response):
+        if environ['PATH_INFO'] == '/robots.txt':
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return [b'User-agent: *\nCrawl-delay: 0.1\n']
+        return super().application(environ, start_response)
+
+
+class CrawlDelaySpider(Spider):
+    def start_requests(self):
+        for i in range(4):
+            yield HttpRequest(self.config['server_url'].replace('/page/0', '/page/{}'.format(i)))
+
+    def parse(self, response):
+        self.config['fetched'].append(time.monotonic())
+
+
+def test_obey_crawl_delay():
+    server = CrawlDelayServer(pages=4, links=0, page_size=100)
+    server.start()
+    fetched = []
+    try:
+        # no rate limit is given
+        run_spider(CrawlDelaySpider, robots_obey=True, max_workers=4, server_url=server.url, fetched=fetched,
+                   log_level='WARNING')
+    finally:
+        server.stop()
+    assert len(fetched) == 4
+    fetched.sort()
+    assert all(b - a >= 0.08 for a, b in zip(fetched, fetched[1:]))
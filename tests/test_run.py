@@ -0,0 +1,67 @@
+# coding=utf-8
+
+import gevent
+
+from gspider.http import HttpRequest
+from gspider.errors import ClientError
+from gspider.run import iter_requests, make_requests
+
+from .helpers import LocalResponseMiddleware
+
+
+def test_iter_requests_in_completion_order():
+    started = []
+    requests = ['http://localhost/60', 'http://localhost/30', HttpRequest('http://localhost/error'),
+                'http://localhost/0']
+    results = list(iter_requests(requests, max_workers=4, extensions=[LocalResponseMiddleware],
+                                 local_response_delay='path', fetched=started))
+    assert [i for i, _ in results] == [2, 3, 1, 0]
+    assert isinstance(results[0][1], ClientError)
+    assert [r.body for _, r in results[1:]] == [b'0', b'30', b'60']
+
+
+def test_iter_requests_max_pending():
+    started = []
+    consumed = 0
+    for _ in iter_requests(('http://localhost/1' for _ in range(100)), max_pending=5, max_workers=10,
+                           extensions=[LocalResponseMiddleware], local_response_delay='path', fetched=started):
+        # the consumer is slower than the crawler
+        gevent.sleep(0.005)
+        consumed += 1
+        assert len(started) - consumed <= 5
+    assert consumed == 100
+    assert len(started) == 100
+
+
+def test_close_iter_requests():
+    started = []
+    it = iter_requests(('http://localhost/1' for _ in range(1000)), max_pending=5, max_workers=2,
+                       extensions=[LocalResponseMiddleware], local_response_delay='path', fetched=started)
+    for _ in range(3):
+        next(it)
+    it.close()
+    n = len(started)
+    assert n <= 8
+    # the crawler is stopped
+    gevent.sleep(0.05)
+    assert len(started) == n
+
+
+def test_make_requests_with_callback():
+    started = []
+    results = {}
+    res = make_requests(['http://localhost/20', 'http://localhost/error', 'http://localhost/0'],
+                        callback=lambda index, result: results.setdefault(index, result),
+                        extensions=[LocalResponseMiddleware], local_response_delay='path', fetched=started)
+    assert res is None
+    assert list(results) == [1, 2, 0]
+    assert isinstance(results[1], ClientError)
+    assert results[0].body == b'20' and results[2].body == b'0'
+
+
+def test_make_requests():
+    started = []
+    results = make_requests(['http://localhost/20', 'http://localhost/error', 'http://localhost/0'],
+                            extensions=[LocalResponseMiddleware], local_response_delay='path', fetched=started)
+    assert results[0].body == b'20' and results[2].body == b'0'
+    assert isinstance(results[1], ClientError)
@@ -0,0 +1,100 @@
+# coding=utf-8
+
+import random
+
+import pytest
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+from gspider.http import HttpRequest, HttpResponse
+from gspider.errors import IgnoreRequest
+from gspider.simhash import SimHashIndex, simhash, shingles, html_to_text, hamming_distance
+from gspider.extensions.neardupe import NearDupeMiddleware
+
+WORDS = ['alpha', 'beta', 'gamma', 'delta', 'epsilon', 'zeta', 'eta', 'theta', 'iota', 'kappa', 'lambda', 'mu']
+
+
+def make_text(seed, n=300):
+    rand = random.Random(seed)
+    return ' '.join(rand.choice(WORDS) for _ in range(n))
+
+
+def test_html_to_text():
+    html = '<html><head><style>p {color: red}</style><script>var a = "<p>";</script></head>' \
+           '<body><!-- comment --><p>Hello</p> <b>world</b></body></html>'
+    assert html_to_text(html).split() == ['Hello', 'world']
+
+
+def test_shingles():
+    assert shingles('A b, c d e', size=3) == ['a b c', 'b c d', 'c d e']
+    assert shingles('a b', size=3) == ['a b']
+    assert shingles('', size=3) == []
+
+
+def test_simhash():
+    text = make_text(1, n=1000)
+    fp = simhash(shingles(text))
+    assert fp == simhash(shingles(text))
+    assert 0 < fp < 2 ** 64
+    # a word changed
+    words = text.split()
+    words[500] = 'changed'
+    assert hamming_distance(fp, simhash(shingles(' '.join(words)))) <= 3
+    assert hamming_distance(fp, simhash(shingles(make_text(2)))) > 10
+    assert simhash([]) == 0
+
+
+@pytest.mark.parametrize('max_distance', [0, 3, 7])
+def test_simhash_index(max_distance):
+    rand = random.Random(max_distance)
+    index = SimHashIndex(max_distance=max_distance)
+    fps = [rand.getrandbits(64) for _ in range(1000)]
+    for fp in fps:
+        index.add(fp)
+    for fp in fps[:100]:
+        near = fp
+        for i in rand.sample(range(64), max_distance):
+            near ^= 1 << i
+        assert index.find(near) == fp
+        far = near ^ (1 << rand.choice([i for i in range(64) if not (fp ^ near) >> i & 1]))
+        assert index.find(far) is None
+
+
+def test_simhash_index_max_size():
+    index = SimHashIndex(max_distance=3, max_size=2)
+    fps = [0, 2 ** 64 - 1, 2 ** 32 - 1]
+    for fp in fps:
+        index.add(fp)
+    assert len(index) == 2
+    assert index.find(fps[0]) is None
+    assert index.find(fps[1]) == fps[1]
+    assert index.find(fps[2] ^ 1) == fps[2]
+
+
+def respond(ext, url, text, content_type='text/html'):
+    req = HttpRequest(url)
+    resp = Response()
+    resp.status_code = 200
+    resp.url = url
+    resp._content = text.encode('utf-8')
+    resp.headers = CaseInsensitiveDict({'Content-Type': content_type})
+    ext.handle_response(req, HttpResponse(request=req, response=resp))
+    return req
+
+
+def test_near_dupe_middleware():
+    ext = NearDupeMiddleware()
+    text = make_text(1)
+    req = respond(ext, 'http://example.com/a', '<p>{}</p>'.format(text))
+    assert req.meta['simhash'] > 0
+    with pytest.raises(IgnoreRequest):
+        respond(ext, 'http://example.com/a?sid=1', '<div>{}</div><p>sid=1</p>'.format(text))
+    respond(ext, 'http://example.com/b', make_text(2))
+    # too short to be checked
+    respond(ext, 'http://example.com/c', 'hello world')
+    respond(ext, 'http://example.com/c?sid=1', 'hello world')
+    # not text
+    respond(ext, 'http://example.com/d', text, content_type='application/octet-stream')
+    respond(ext, 'http://example.com/d?sid=1', text, content_type='application/octet-stream')
+    assert ext.duplicates == 1
+    assert len(ext.index) == 2
@@ -0,0 +1,135 @@
+# coding=utf-8
+
+import io
+import gzip
+from datetime import datetime
+
+from requests.models import Response
+
+from gspider.http import HttpResponse
+from gspider.sitemap import SitemapSpider, iter_sitemap, parse_w3c_datetime
+from gspider.extension import Extension
+from gspider.run import run_spider
+from gspider import events
+
+SITEMAP = b"""<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <url><loc>http://example.com/news/1.html</loc><lastmod>2020-03-01</lastmod></url>
+  <url><loc>http://example.com/news/2.html</loc><lastmod>2020-03-21T08:00:00+08:00</lastmod></url>
+  <url><loc> http://example.com/about.html </loc></url>
+</urlset>"""
+
+SITEMAP_INDEX = b"""<?xml version="1.0" encoding="UTF-8"?>
+<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <sitemap><loc>http://example.com/sitemap-news.xml.gz</loc></sitemap>
+  <sitemap><loc>http://example.com/sitemap-video.xml</loc></sitemap>
+</sitemapindex>"""
+
+
+def make_response(body, url):
+    resp = Response()
+    resp._content = body
+    resp.url = url
+    resp.status_code = 200
+    return HttpResponse(response=resp)
+
+
+def test_parse_w3c_datetime():
+    assert parse_w3c_datetime('2020') == datetime(2020, 1, 1)
+    assert parse_w3c_datetime('2020-03-20') == datetime(2020, 3, 20)
+    assert parse_w3c_datetime('2020-03-20T08:30Z') == datetime(2020, 3, 20, 8, 30)
+    assert parse_w3c_datetime('2020-03-20T08:30:15.5+08:00') == datetime(2020, 3, 20, 0, 30, 15)
+    assert parse_w3c_datetime('not a date') is None
+
+
+def test_iter_sitemap():
+    expected = [('url', 'http://example.com/news/1.html', '2020-03-01'),
+                ('url', 'http://example.com/news/2.html', '2020-03-21T08:00:00+08:00'),
+                ('url', 'http://example.com/about.html', None)]
+    assert list(iter_sitemap(io.BytesIO(SITEMAP))) == expected
+    assert list(iter_sitemap(io.BytesIO(gzip.compress(SITEMAP)))) == expected
+
+
+class NewsSitemapSpider(SitemapSpider):
+    sitemap_urls = ['http://example.com/robots.txt']
+    sitemap_rules = [('/news/', 'parse_news')]
+    sitemap_follow = ['news']
+    sitemap_lastmod_after = '2020-03-20'
+
+    def parse(self, response):
+        pass
+
+    def parse_news(self, response):
+        pass
+
+
+def test_sitemap_spider():
+    spider = NewsSitemapSpider()
+    robots = make_response(b'User-agent: *\nSitemap: http://example.com/sitemap-index.xml\n',
+                           'http://example.com/robots.txt')
+    requests = list(spider.parse_sitemap(robots))
+    assert [r.url for r in requests] == ['http://example.com/sitemap-index.xml']
+
+    index = make_response(SITEMAP_INDEX, 'http://example.com/sitemap-index.xml')
+    requests = list(spider.parse_sitemap(index))
+    assert [r.url for r in requests] == ['http://example.com/sitemap-news.xml.gz']
+    assert requests[0].callback == spider.parse_sitemap
+    assert requests[0].meta['spool_body_size'] == 1024 * 1024
+
+    sitemap = make_response(gzip.compress(SITEMAP), 'http://example.com/sitemap-news.xml.gz')
+    requests = list(spider.parse_sitemap(sitemap))
+    assert [r.url for r in requests] == ['http://example.com/news/2.html']
+    assert requests[0].callback == 'parse_news'
+
+
+ITEMS_SITEMAP = b''.join([
+    b'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n',
+    b''.join(b'<url><loc>http://example.com/item/%d</loc></url>\n' % i for i in range(10000)),
+    b'</urlset>'])
+
+
+class LocalSitemapMiddleware(Extension):
+    def __init__(self, crawler):
+        self.body_file = io.BytesIO(ITEMS_SITEMAP)
+        self.scheduled = crawler.config['scheduled']
+        crawler.event_bus.subscribe(self.handle_request_scheduled, events.request_scheduled)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def handle_request_scheduled(self, request):
+        # how much of the sitemap has been read when the URLs are scheduled
+        if '/item/' in request.url:
+            self.scheduled.append((request.url, self.body_file.tell()))
+
+    def handle_request(self, request):
+        resp = Response()
+        resp.status_code = 200
+        resp.url = request.url
+        if request.url.endswith('/sitemap.xml'):
+            self.scheduled.append(('spool_body_size', request.meta['spool_body_size']))
+            resp._content = False
+            return HttpResponse(request=request, response=resp, body_file=self.body_file)
+        resp._content = b''
+        return HttpResponse(request=request, response=resp)
+
+
+class ItemSitemapSpider(SitemapSpider):
+    sitemap_urls = ['http://example.com/sitemap.xml']
+
+    def parse(self, response):
+        pass
+
+
+def test_schedule_sitemap_urls_incrementally():
+    scheduled = []
+    run_spider(ItemSitemapSpider, extensions=[LocalSitemapMiddleware], scheduled=scheduled, max_workers=1,
+               log_level='WARNING')
+    # the sitemaps are spooled by default
+    assert scheduled[0] == ('spool_body_size', 1024 * 1024)
+    urls = scheduled[1:]
+    assert len(urls) == 10000
+    assert urls[0][0] == 'http://example.com/item/0'
+    # the first URLs are scheduled before the whole sitemap is read
+    assert urls[0][1] < len(ITEMS_SITEMAP) // 2
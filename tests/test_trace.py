@@ -0,0 +1,59 @@
+# coding=utf-8
+
+import json
+import random
+
+from gspider.http import HttpRequest
+from gspider.trace import RequestTracer, STAGES
+from gspider.bench import BenchServer, BenchSpider
+from gspider.run import run_spider
+
+
+def test_trace_requests(tmp_path):
+    path = str(tmp_path / 'trace.json')
+    server = BenchServer(pages=20, links=3, page_size=1024)
+    server.start()
+    try:
+        run_spider(BenchSpider, bench_url=server.url, trace_file=path, trace_sample_rate=1, trace_max_traces=5,
+                   max_workers=2, log_level='WARNING')
+    finally:
+        server.stop()
+    with open(path) as f:
+        report = json.load(f)
+    assert set(report['stages']) == {name for name, _, _ in STAGES}
+    for name, _, _ in STAGES:
+        stage = report['stages'][name]
+        assert stage['count'] == 20
+        assert 0 <= stage['p50'] <= stage['p99'] <= stage['max']
+    assert len(report['traces']) == 5
+    for trace in report['traces']:
+        assert trace['method'] == 'GET' and trace['url'].startswith(server.url.rsplit('/', 1)[0])
+        assert list(trace['stamps']) == ['enqueue', 'dequeue', 'fetch_start', 'fetch_end', 'parse_start',
+                                         'parse_end', 'finish']
+        assert trace['stamps']['enqueue'] == 0
+
+
+def test_trace_sampling(tmp_path):
+    random.seed(0)
+    tracer = RequestTracer(str(tmp_path / 'trace.json'), sample_rate=0.2, max_traces=1000)
+    for i in range(1000):
+        req = HttpRequest('http://localhost/{}'.format(i))
+        tracer.stamp(req, 'enqueue')
+        tracer.stamp(req, 'dequeue')
+        tracer.finish(req)
+    assert tracer.stages['queue'].count == 1000
+    assert tracer.stages['total'].count == 1000
+    # the stages without both stamps are not counted
+    assert tracer.stages['fetch'].count == 0
+    assert 150 <= len(tracer.traces) <= 250
+    # the requests which are not stamped are ignored
+    tracer.finish(HttpRequest('http://localhost/'))
+    assert tracer.stages['total'].count == 1000
+
+    tracer = RequestTracer(str(tmp_path / 'trace.json'), sample_rate=1, max_traces=10)
+    for i in range(100):
+        req = HttpRequest('http://localhost/{}'.format(i))
+        tracer.stamp(req, 'enqueue')
+        tracer.finish(req)
+    assert len(tracer.traces) == 10
+    assert [t['url'] for t in tracer.traces] == ['http://localhost/{}'.format(i) for i in range(10)]